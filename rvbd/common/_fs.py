@@ -8,6 +8,10 @@
 
 import os
 import json
+import zlib
+import shutil
+import logging
+import tempfile
 import platform
 
 try:
@@ -15,6 +19,8 @@ try:
 except ImportError:
     import pickle
 
+logger = logging.getLogger(__name__)
+
 
 def ensure_dir(d):
     if not os.path.exists(d):
@@ -118,3 +124,111 @@ class FlyscriptData(FlyscriptFile):
     def write(self):
         with open(self.fullpath, 'w') as f:
             pickle.dump(self.data, f)
+
+
+class FlyscriptCache(object):
+    """Size limited on-disk cache stored in a flyscript directory
+
+    The cache holds entries identified by a string key, each entry
+    being a directory of pickled items, compressed with zlib if
+    `compress` is True.  When the total size of the cache exceeds
+    `max_size` bytes, the least recently used entries are removed.
+    """
+    def __init__(self, *components, **kwargs):
+        self.max_size = kwargs.pop('max_size')
+        self.compress = kwargs.pop('compress', False)
+        self.dir = FlyscriptDir(*components, **kwargs)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.dir.basedir, key)
+
+    def has(self, key):
+        """Return True if the entry `key` exists, marking it as recently used
+        """
+        path = self._entry_dir(key)
+        if not os.path.isdir(path):
+            return False
+        os.utime(path, None)
+        return True
+
+    def get(self, key, name):
+        """Return the item `name` of the entry `key`, raises KeyError
+        if it is not in the cache
+
+        An entry with an item that cannot be read back is removed.
+        """
+        try:
+            with open(os.path.join(self._entry_dir(key), name), 'rb') as f:
+                if self.compress:
+                    return pickle.loads(zlib.decompress(f.read()))
+                return pickle.load(f)
+        except IOError:
+            raise KeyError(name)
+        except (zlib.error, EOFError, ValueError, pickle.UnpicklingError), e:
+            logger.warning('removing corrupt cache entry %s: %s' % (key, e))
+            self.remove(key)
+            raise KeyError(name)
+
+    def put(self, key, name, data):
+        """Store `data` as the item `name` of the entry `key`
+
+        The item is written to a temporary file renamed once complete,
+        so that readers never see a partially written item.
+        """
+        path = self._entry_dir(key)
+        ensure_dir(path)
+        fd, tmp = tempfile.mkstemp(prefix='.' + name, dir=path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if self.compress:
+                    s = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+                    f.write(zlib.compress(s))
+                else:
+                    pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+            try:
+                os.rename(tmp, os.path.join(path, name))
+            except OSError:
+                # windows does not replace existing files
+                os.remove(os.path.join(path, name))
+                os.rename(tmp, os.path.join(path, name))
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.utime(path, None)
+        self.evict()
+
+    def remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def clear(self):
+        for key in self.dir.get_files():
+            self.remove(key)
+
+    def size(self):
+        """Return the total size in bytes of the cached items
+        """
+        return sum(size for mtime, size, key in self._entries())
+
+    def _entries(self):
+        entries = []
+        for key in self.dir.get_files():
+            path = self._entry_dir(key)
+            if not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, name))
+                       for name in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, key))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache
+        fits in `max_size`
+        """
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, key in entries)
+        for mtime, size, key in entries:
+            if total <= self.max_size:
+                break
+            self.remove(key)
+            total -= size
@@ -0,0 +1,270 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Admission control of the requests sent to an appliance.
+
+Scripts running many requests in parallel can overload the REST server
+of an appliance, slowing it down for every other user.  Limits are set
+per host and apply to all the connections of the process to that host:
+
+    set_limits('shark.example.com', max_inflight=8, rate=20,
+               heavy={'views': 2, 'downloads': Budget(max_inflight=1)})
+
+`max_inflight` is the number of requests sent at the same time and
+`rate` the number of requests started per second, allowing bursts of
+`burst` requests.  Requests to heavy endpoints (see HEAVY_ENDPOINTS)
+are also admitted by the budget of their class, if one is given in
+`heavy`, so that for instance only a couple of views are created at
+once while lighter requests keep flowing.
+
+Requests wait until they are admitted, the wait times are kept in
+histograms available from `AdmissionController.stats()` and in the
+Prometheus text format from `AdmissionController.to_prometheus()`.
+"""
+
+import re
+import time
+import thread
+import threading
+from contextlib import contextmanager
+
+from requests.packages.urllib3.util import parse_url
+
+from rvbd.common.instrumentation import Histogram, _format_labels
+
+__all__ = ['TokenBucket', 'Budget', 'AdmissionController', 'HEAVY_ENDPOINTS',
+           'set_limits', 'get_controller', 'remove_limits']
+
+
+# classes of expensive requests: (name, method, regular expression
+# matched against the path of the url)
+HEAVY_ENDPOINTS = [
+    ('views', 'POST', re.compile(r'/views$')),
+    ('exports', 'POST', re.compile(r'/exports$')),
+    ('downloads', 'GET', re.compile(r'/(packets|download)$')),
+    ]
+
+
+class TokenBucket(object):
+    """ Starts at most `rate` operations per second on average, with
+    bursts of up to `burst` operations (by default one second worth). """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self._tokens = self.burst
+        self._last = None
+        self._lock = threading.Lock()
+        self._clock = time.time
+        self._sleep = time.sleep
+
+    def acquire(self):
+        """ Wait until an operation can start, returns the number of
+        seconds waited. """
+        with self._lock:
+            now = self._clock()
+            if self._last is not None:
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # the token is reserved right away, so that waiting callers
+            # are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class Budget(object):
+    """ Limits on the requests of one class: at most `max_inflight`
+    at the same time and `rate` per second with bursts of `burst`,
+    None meaning unlimited. """
+    def __init__(self, max_inflight=None, rate=None, burst=None):
+        self.max_inflight = max_inflight
+        self.rate = rate
+        self._slots = threading.Semaphore(max_inflight) if max_inflight else None
+        self._bucket = TokenBucket(rate, burst) if rate else None
+        self._lock = threading.Lock()
+        self._clock = time.time
+        # number of admissions by thread ident, see acquire()
+        self._holders = {}
+
+        self.wait_time = Histogram()
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.admitted = 0
+
+    def acquire(self):
+        """ Wait until a request is admitted, returns the ticket to pass
+        to release() once it is complete.
+
+        A thread that is already admitted, for instance one sending a
+        request while reading a download, is admitted again without
+        waiting for a slot: the slot it would wait for may be its own,
+        which it only releases once the new request is complete.
+        """
+        ident = thread.get_ident()
+        with self._lock:
+            nested = ident in self._holders
+        start = self._clock()
+        if self._bucket is not None:
+            self._bucket.acquire()
+        if self._slots is not None and not nested:
+            self._slots.acquire()
+        waited = self._clock() - start
+        with self._lock:
+            self._holders[ident] = self._holders.get(ident, 0) + 1
+            self.wait_time.observe(waited)
+            self.admitted += 1
+            self.inflight += 1
+            if self.inflight > self.peak_inflight:
+                self.peak_inflight = self.inflight
+        return (ident, nested)
+
+    def release(self, ticket):
+        """ Release the admission `ticket` returned by acquire(), from
+        any thread. """
+        ident, nested = ticket
+        with self._lock:
+            self.inflight -= 1
+            count = self._holders[ident] - 1
+            if count:
+                self._holders[ident] = count
+            else:
+                del self._holders[ident]
+        if self._slots is not None and not nested:
+            self._slots.release()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'max_inflight': self.max_inflight,
+                'rate': self.rate,
+                'inflight': self.inflight,
+                'peak_inflight': self.peak_inflight,
+                'admitted': self.admitted,
+                'wait_time': self.wait_time.to_dict(),
+                }
+
+
+class AdmissionController(object):
+    """ Admits the requests to one appliance within the default budget
+    and, for heavy requests, the budget of their class.
+
+    `heavy` is a dictionary of budgets by name of the classes defined
+    by `endpoints`, values may also be a maximum number of requests in
+    flight.
+    """
+    def __init__(self, max_inflight=None, rate=None, burst=None,
+                 heavy=None, endpoints=HEAVY_ENDPOINTS):
+        self.default = Budget(max_inflight, rate, burst)
+        self.heavy = {}
+        for name, budget in (heavy or {}).iteritems():
+            if not isinstance(budget, Budget):
+                budget = Budget(max_inflight=budget)
+            self.heavy[name] = budget
+        self.endpoints = endpoints
+
+    def classify(self, method, url):
+        """ Return the name of the class of heavy requests of `url`,
+        or None. """
+        path = parse_url(url).path or ''
+        for name, m, pattern in self.endpoints:
+            if m == method and pattern.search(path):
+                return name
+        return None
+
+    def acquire(self, method, url):
+        """ Wait until the request is admitted, returns the admissions
+        to pass to release() once it is complete. """
+        budgets = []
+        name = self.classify(method, url)
+        if name in self.heavy:
+            budgets.append(self.heavy[name])
+        budgets.append(self.default)
+        return [(budget, budget.acquire()) for budget in budgets]
+
+    def release(self, admissions):
+        for budget, ticket in admissions:
+            budget.release(ticket)
+
+    @contextmanager
+    def admit(self, method, url):
+        """ Context manager admitting a request for its duration. """
+        budgets = self.acquire(method, url)
+        try:
+            yield
+        finally:
+            self.release(budgets)
+
+    def stats(self):
+        """ Return the statistics of the budgets by name, the default
+        budget being named 'default'. """
+        d = dict((name, budget.to_dict()) for name, budget in self.heavy.iteritems())
+        d['default'] = self.default.to_dict()
+        return d
+
+    def to_prometheus(self, prefix='flyscript', labels=None):
+        """ Return the wait times and requests in flight in the
+        Prometheus text exposition format. """
+        base = sorted((labels or {}).items())
+        budgets = sorted(self.heavy.items()) + [('default', self.default)]
+        lines = ['# HELP %s_admission_wait_seconds Time requests waited to be admitted.' % prefix,
+                 '# TYPE %s_admission_wait_seconds histogram' % prefix]
+        for name, budget in budgets:
+            with budget._lock:
+                hist = budget.wait_time
+                labels = base + [('budget', name)]
+                total = 0
+                for bound, count in zip(hist.bounds + [float('inf')], hist.counts):
+                    total += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_admission_wait_seconds_bucket%s %d' %
+                                 (prefix, _format_labels(labels + [('le', le)]), total))
+                lines.append('%s_admission_wait_seconds_sum%s %r' %
+                             (prefix, _format_labels(labels), hist.sum))
+                lines.append('%s_admission_wait_seconds_count%s %d' %
+                             (prefix, _format_labels(labels), hist.count))
+
+        lines.append('# HELP %s_admission_inflight Requests admitted and not complete.' % prefix)
+        lines.append('# TYPE %s_admission_inflight gauge' % prefix)
+        for name, budget in budgets:
+            lines.append('%s_admission_inflight%s %d' %
+                         (prefix, _format_labels(base + [('budget', name)]), budget.inflight))
+        return '\n'.join(lines) + '\n'
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def _host(host):
+    # accept urls as well as host names
+    return parse_url(host).host or host
+
+
+def set_limits(host, **kwargs):
+    """ Limit the requests sent to `host` by all the connections of
+    this process, see AdmissionController for the arguments.  Returns
+    the AdmissionController, replacing the previous one if any. """
+    controller = AdmissionController(**kwargs)
+    with _controllers_lock:
+        _controllers[_host(host)] = controller
+    return controller
+
+
+def get_controller(host):
+    """ Return the AdmissionController of `host`, or None if its
+    requests are not limited. """
+    return _controllers.get(_host(host))
+
+
+def remove_limits(host):
+    with _controllers_lock:
+        _controllers.pop(_host(host), None)
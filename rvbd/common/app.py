@@ -7,6 +7,7 @@
 
 
 from rvbd.common.service import UserAuth, OAuth
+from rvbd.common.sessioncache import SessionCache
 import rvbd.common.connection
 
 import optparse
@@ -43,6 +44,7 @@ class Application(object):
         self.options = None
         self.args = None
         self.auth = None
+        self.session_cache = None
 
     def _add_standard_options(self):
         group = optparse.OptionGroup(self.optparse, "Connection Parameters")
@@ -54,6 +56,9 @@ class Application(object):
                                          "username/password")
         group.add_option("-A", "--api_version", dest="api_version",
                          help="api version to use unconditionally")
+        group.add_option("--session-cache", action="store_true", default=False,
+                         help="reuse the authenticated session of previous "
+                              "runs, and keep it open for the next ones")
         self.optparse.add_option_group(group)
 
         group = optparse.OptionGroup(self.optparse, "Logging Parameters")
@@ -110,6 +115,9 @@ class Application(object):
 
         self.validate_args()
 
+        if self.options.session_cache:
+            self.session_cache = SessionCache()
+
         rvbd.common.connection.Connection.HTTPLIB_DEBUGLEVEL =\
             self.options.httplib_debuglevel
         rvbd.common.connection.Connection.DEBUG_MSG_BODY =\
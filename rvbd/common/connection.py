@@ -7,11 +7,15 @@
 
 import os
 import ssl
+import sys
 import json
+import time
+import Queue
 import httplib
 import logging
 import tempfile
 import urlparse
+import threading
 from xml.etree import ElementTree
 
 import requests
@@ -21,7 +25,10 @@ from requests.structures import CaseInsensitiveDict
 from requests.packages.urllib3.util import parse_url
 from requests.packages.urllib3.poolmanager import PoolManager
 
+from rvbd.common import admission, futures, jsonstream
 from rvbd.common.exceptions import RvbdException, RvbdHTTPException
+from rvbd.common.instrumentation import RequestRecord, RequestStats, url_template
+from rvbd.common.http_pool import PoolAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -42,12 +49,50 @@ class SSLAdapter(HTTPAdapter):
                                        ssl_version=self.ssl_version)
 
 
+class _JsonStream(object):
+    """ Iterator over the items of a streamed JSON response.  The
+    response is closed, releasing its connection, once the items are
+    exhausted, when close() is called or when the iterator is garbage
+    collected without having been consumed. """
+    def __init__(self, conn, r, it):
+        self._conn = conn
+        self._r = r
+        self._it = it
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        r, self._r = self._r, None
+        if r is not None:
+            self._it.close()
+            self._conn._close_response(r)
+
+    def __del__(self):
+        self.close()
+
+
 class Connection(object):
     """ Handle authentication and communication to remote machines. """
 
     HTTPLIB_DEBUGLEVEL = 0
     DEBUG_MSG_BODY = 0
 
+    # collect request statistics on every new connection,
+    # see enable_stats()
+    COLLECT_STATS = False
+
+    # share the response of identical GET requests sent at the same
+    # time by different threads
+    COALESCE_GETS = True
+
     def __init__(self, hostname, auth=None, port=None, verify=True,
                  reauthenticate_handler=None):
         """ Initialize new connection and setup authentication
@@ -90,6 +135,7 @@ class Connection(object):
 
         self.hostname = hostname
         self._ssladapter = False
+        self._pool_options = None
 
         if self.HTTPLIB_DEBUGLEVEL > 0:
             self.set_debuglevel()
@@ -98,10 +144,30 @@ class Connection(object):
         self.conn.auth = auth
         self.conn.verify = verify
         self._reauthenticate_handler = reauthenticate_handler
+        # incremented after every reauthentication, so that threads
+        # whose request was rejected at the same time only log in once
+        self._auth_generation = 0
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+        # GET requests in flight by key, and a counter incremented
+        # after every other request so that a GET sent after a change
+        # is never answered by one sent before it
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._write_generation = 0
+        # set once the server is found to send downloads that can only
+        # be read until the connection is closed
+        self._close_downloads = False
 
         # store last full response
         self.response = None
 
+        # callables called with a RequestRecord after every request
+        self.hooks = []
+        self.request_stats = None
+        if self.COLLECT_STATS:
+            self.enable_stats()
+
         logger.debug("Connection initialized for %s" % self.hostname)
 
     def __repr__(self):
@@ -126,21 +192,222 @@ class Connection(object):
         else:
             requests_logger.setLevel(logging.INFO)
 
+    def enable_stats(self, stats=None):
+        """ Start collecting per endpoint statistics of the requests
+        sent on this connection into `stats`, a RequestStats object
+        (a new one if unspecified).  Returns the RequestStats. """
+        if self.request_stats is None:
+            if stats is None:
+                stats = RequestStats(labels={'host': self.hostname})
+            self.request_stats = stats
+            self.hooks.append(stats)
+        return self.request_stats
+
+    def stats(self):
+        """ Return the RequestStats of this connection, or None if
+        statistics are not collected. """
+        return self.request_stats
+
+    def _record(self, method, url, body, r, start, stream):
+        latency = time.time() - start
+        if isinstance(body, basestring):
+            sent = len(body)
+        else:
+            sent = 0
+        if stream:
+            received = int(r.headers.get('content-length') or 0)
+        else:
+            received = len(r.content)
+        record = RequestRecord(method, url, url_template(url), r.status_code,
+                               sent, received, r.elapsed.total_seconds(),
+                               latency)
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:
+                logger.exception('request hook %r failed' % hook)
+
+    def mount_pool(self, pool_size=10, acquire_timeout=None, idle_timeout=60):
+        """ Send the requests of this connection through a bounded pool of
+        at most `pool_size` connections, so that threads sharing this
+        Connection reuse the same sockets.
+
+        When all the connections are busy, requests wait at most
+        `acquire_timeout` seconds (forever if None) for one to be
+        released before raising http_pool.NoFreeConnections.  Idle
+        connections are closed after `idle_timeout` seconds.
+        """
+        self._pool_options = {'pool_size': pool_size,
+                              'acquire_timeout': acquire_timeout,
+                              'idle_timeout': idle_timeout}
+        ssl_version = ssl.PROTOCOL_TLSv1 if self._ssladapter else None
+        for prefix in ('http://', 'https://'):
+            self.conn.mount(prefix, PoolAdapter(ssl_version=ssl_version,
+                                                **self._pool_options))
+
+    def set_limits(self, **kwargs):
+        """ Limit the requests sent to the host of this connection by
+        all the connections of the process, see
+        rvbd.common.admission.AdmissionController for the arguments.
+        Returns the AdmissionController. """
+        return admission.set_limits(self.hostname, **kwargs)
+
+    def admission_stats(self):
+        """ Return the statistics of the admission of requests to the
+        host of this connection by budget, see
+        rvbd.common.admission.AdmissionController.stats(), or None if
+        they are not limited. """
+        controller = admission.get_controller(self.hostname)
+        if controller is None:
+            return None
+        return controller.stats()
+
+    def pool_stats(self):
+        """ Return the utilisation statistics of the connection pool
+        mounted with mount_pool(), see http_pool.ConnectionPool.stats(),
+        or None if there is no pool or no request has been sent yet. """
+        if self._pool_options is None:
+            return None
+        pools = self.conn.get_adapter(self.hostname).pools()
+        if not pools:
+            return None
+        return pools[0].stats()
+
     def get_url(self, path):
         """ Returns a fully qualified URL given a path. """
         return urlparse.urljoin(self.hostname, path)
 
     def _request(self, method, path, body=None, params=None,
                  extra_headers=None, **kwargs):
+        generation = self._auth_generation
+        r = self._send_once(generation, method, path, body, params,
+                            extra_headers, **kwargs)
+
+        # check if good status response otherwise raise exception
+        if not r.ok:
+            exc = RvbdHTTPException(r, r.text, method, path)
+            self._release_admission(r)
+            if (self._reauthenticate_handler is not None and
+                exc.error_id in ('AUTH_INVALID_SESSION',
+                                 'AUTH_EXPIRED_TOKEN') and
+                not getattr(self._local, 'reauthenticating', False)):
+                self._reauthenticate(generation)
+                logger.debug('session reauthentication succeeded -- retrying')
+                r = self._send_once(self._auth_generation, method, path,
+                                    body, params, extra_headers, **kwargs)
+                if not r.ok:
+                    self._release_admission(r)
+                    raise RvbdHTTPException(r, r.text, method, path)
+            else:
+                raise exc
+
+        return r
+
+    def _reauthenticate(self, generation):
+        """ Call the reauthentication handler, unless another thread did
+        since `generation`, in which case its new session is used. """
+        with self._auth_lock:
+            if self._auth_generation != generation:
+                logger.debug('session already reauthenticated by another thread')
+                return
+            logger.debug('session timed out -- reauthenticating')
+            # requests sent by the handler are not retried
+            self._local.reauthenticating = True
+            try:
+                self._reauthenticate_handler()
+            finally:
+                self._local.reauthenticating = False
+            self._auth_generation += 1
+
+    def _send_once(self, generation, method, path, body, params,
+                   extra_headers, **kwargs):
+        """ Send a request, sharing the response of an identical GET
+        already in flight if there is one. """
+        if not (self.COALESCE_GETS and method == 'GET' and
+                not body and not kwargs):
+            try:
+                return self._send(method, path, body, params,
+                                  extra_headers, **kwargs)
+            finally:
+                if method != 'GET':
+                    with self._inflight_lock:
+                        self._write_generation += 1
+
+        if isinstance(params, dict):
+            key_params = sorted(params.items())
+        else:
+            key_params = params
+        key = (path, repr(key_params),
+               repr(sorted((k.lower(), v) for k, v in (extra_headers or {}).items())),
+               generation, self._write_generation)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = futures.Future()
+
+        if not leader:
+            logger.debug('Sharing the response of a GET request to %s', path)
+            return future.result()
+
+        try:
+            r = self._send(method, path, body, params, extra_headers)
+        except Exception:
+            future.set_exception(sys.exc_info())
+            raise
+        else:
+            future.set_result(r)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return r
+
+    def _send(self, method, path, body=None, params=None,
+              extra_headers=None, **kwargs):
+        controller = admission.get_controller(self.hostname)
+        if controller is None:
+            return self._send_request(method, path, body, params,
+                                      extra_headers, **kwargs)
+
+        admissions = controller.acquire(method, path)
+        try:
+            r = self._send_request(method, path, body, params,
+                                   extra_headers, **kwargs)
+        except Exception:
+            controller.release(admissions)
+            raise
+        if kwargs.get('stream'):
+            # the request is complete once the body is read, see
+            # _close_response()
+            r._admission = (controller, admissions)
+        else:
+            controller.release(admissions)
+        return r
+
+    def _release_admission(self, r):
+        admitted = getattr(r, '_admission', None)
+        if admitted is not None:
+            del r._admission
+            controller, admissions = admitted
+            controller.release(admissions)
+
+    def _send_request(self, method, path, body=None, params=None,
+                      extra_headers=None, **kwargs):
         p = parse_url(path)
         if not p.host:
             path = self.get_url(path)
 
+        if self.hooks:
+            start = time.time()
+
         try:
-            logger.debug('Issuing %s request to: %s' % (method, str(path)))
+            logger.debug('Issuing %s request to: %s', method, path)
             #logger.debug('Body: %s' % (body))
 
-            flag = body is not None and '"password":' in repr(body)
+            # the body is only written out by httplib debugging
+            flag = (self.HTTPLIB_DEBUGLEVEL > 0 and body is not None and
+                    '"password":' in repr(body))
 
             if flag:
                 self.set_debuglevel(0)
@@ -149,8 +416,13 @@ class Connection(object):
             r = self.conn.request(method, path, data=body, params=params,
                                   headers=extra_headers, **kwargs)
 
-            logger.debug('Response for %s request to %s: %s, %d' %
-                         (method, str(path), r.status_code, len(r.content)))
+            if kwargs.get('stream'):
+                # reading the content here would defeat streaming
+                length = r.headers.get('content-length', 'streamed')
+            else:
+                length = len(r.content)
+            logger.debug('Response for %s request to %s: %s, %s',
+                         method, path, r.status_code, length)
             if flag:
                 self.set_debuglevel()
 
@@ -162,31 +434,19 @@ class Connection(object):
 
             # Otherwise, mount adapter and retry the request
             # See #152536 - Versions of openssl cause handshake failures
-            self.conn.mount('https://', SSLAdapter(ssl.PROTOCOL_TLSv1))
+            if self._pool_options is not None:
+                self.conn.mount('https://', PoolAdapter(ssl_version=ssl.PROTOCOL_TLSv1,
+                                                        **self._pool_options))
+            else:
+                self.conn.mount('https://', SSLAdapter(ssl.PROTOCOL_TLSv1))
             self._ssladapter = True
             logger.debug('SSL error -- retrying with TLSv1')
             r = self.conn.request(method, path, data=body,
-                                  params=params, headers=extra_headers)
-
-        # check if good status response otherwise raise exception
-        if not r.ok:
-            exc = RvbdHTTPException(r, r.text, method, path)
-            if (self._reauthenticate_handler is not None and
-                exc.error_id in ('AUTH_INVALID_SESSION',
-                                 'AUTH_EXPIRED_TOKEN')):
-                logger.debug('session timed out -- reauthenticating')
-                handler = self._reauthenticate_handler
-                self._reauthenticate_handler = None
-                handler()
-                logger.debug('session reauthentication succeeded -- retrying')
-                r = self._request(method, path, body, params,
-                                  extra_headers, **kwargs)
-                # successful connection, reset token if previously unset
-                self._reauthenticate_handler = handler
-                return r
+                                  params=params, headers=extra_headers,
+                                  **kwargs)
 
-            else:
-                raise exc
+        if self.hooks:
+            self._record(method, path, body, r, start, kwargs.get('stream'))
 
         return r
 
@@ -203,8 +463,16 @@ class Connection(object):
             return res
 
     def json_request(self, method, path, body=None,
-                     params=None, extra_headers=None, raw_response=False):
-        """ Send a JSON request and receive JSON response. """
+                     params=None, extra_headers=None, raw_response=False,
+                     stream=None):
+        """ Send a JSON request and receive JSON response.
+
+        If `stream` is the name of a member of the top-level object of
+        the response holding an array, the response is decoded
+        incrementally as it is received and an iterator over the
+        elements of that array is returned instead of the whole
+        response.  The other members of the response are discarded.
+        """
         if extra_headers:
             extra_headers = CaseInsensitiveDict(extra_headers)
         else:
@@ -217,6 +485,21 @@ class Connection(object):
         else:
             body = ''
 
+        if stream is not None:
+            r = self._request(method, path, body, params, extra_headers,
+                              stream=True)
+            # the admission is released once the headers are received:
+            # callers commonly keep several streams open (see
+            # OutputMixer) or send requests while reading one, which
+            # would never be admitted if streams held their slot until
+            # they are consumed.  Only downloads, read to completion
+            # by the call that sent them, keep their slot.
+            self._release_admission(r)
+            it = _JsonStream(self, r, self._iter_json(r, stream))
+            if raw_response:
+                return it, r
+            return it
+
         r = self._request(method, path, body, params, extra_headers)
         if r.status_code == 204 or len(r.content) == 0:
             return None  # no data
@@ -225,6 +508,62 @@ class Connection(object):
             return json.loads(r.text),r
         return json.loads(r.text)
 
+    JSON_CHUNK_SIZE = 64 * 1024
+
+    def _iter_json(self, r, name):
+        try:
+            if r.status_code == 204:
+                return
+            chunks = r.iter_content(chunk_size=self.JSON_CHUNK_SIZE)
+            for item in jsonstream.iter_array(chunks, name):
+                yield item
+        finally:
+            self._close_response(r)
+
+    def _close_response(self, r):
+        """ Release the connection of the streamed response `r` to the
+        pool.  If the body has not been read completely, the connection
+        is closed first so that the rest of the body is not mistaken
+        for the response to the next request. """
+        if not r.raw.closed:
+            conn = getattr(r.raw, '_connection', None)
+            r.raw.close()
+            if conn is not None:
+                conn.close()
+        r.close()
+        self._release_admission(r)
+
+    def _is_unframed(self, r):
+        """ Return True if the end of the body of `r` is only marked by
+        the server closing the connection, although the connection is
+        supposed to be kept alive, in which case reading the body
+        blocks until the server times the connection out. """
+        return ('content-length' not in r.headers and
+                'chunked' not in r.headers.get('transfer-encoding', '').lower() and
+                r.headers.get('connection', '').lower() != 'close')
+
+    def _download_request(self, method, url, params, headers):
+        """ Send a streamed download request and return the response.
+
+        Connections are kept alive so that consecutive downloads reuse
+        them, unless the server has sent a response whose body cannot
+        be delimited, in which case the request is sent again with a
+        `Connection: Close` header, as are all the following downloads.
+        """
+        headers = CaseInsensitiveDict(headers or {})
+        if self._close_downloads:
+            headers['Connection'] = 'Close'
+
+        r = self._request(method, url, None, params, headers, stream=True)
+        if 'Connection' not in headers and self._is_unframed(r):
+            logger.info('%s sent a keep-alive response without length, '
+                        'closing connections after downloads' % self.hostname)
+            self._close_downloads = True
+            self._close_response(r)
+            headers['Connection'] = 'Close'
+            r = self._request(method, url, None, params, headers, stream=True)
+        return r
+
     def xml_request(self, method, path, body=None,
                     params=None, extra_headers=None, raw_response=False):
         """Send an XML request to the host.
@@ -284,8 +623,17 @@ class Connection(object):
             return {'Location-Header': r.headers.get('location', '')}
         return r.text
 
+    # size of the blocks in which files are downloaded
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    # size of the ranges downloaded by each request of parallel
+    # or resumable downloads
+    DOWNLOAD_SEGMENT_SIZE = 32 * 1024 * 1024
+    # number of times a dropped range request is retried
+    DOWNLOAD_RETRIES = 3
+
     def download(self, url, path=None, overwrite=False, method='GET',
-                 extra_headers=None, params=None):
+                 extra_headers=None, params=None, chunk_size=None,
+                 parallel=1, resume=False, progress=None):
         """Download a file from a remote URI and save it to a local path.
 
         `url` is the url of the file to download.
@@ -309,9 +657,31 @@ class Connection(object):
         `extra_headers` is a dictionary of headers to use for the request.
 
         `params` is a dictionary of parameters for the request.
+
+        `chunk_size` is the number of bytes read from the network at a
+            time, DOWNLOAD_CHUNK_SIZE by default.
+
+        `parallel` is the number of concurrent requests used to download
+            the file.  This requires the server to accept byte range
+            requests, which is checked by requesting the first byte of
+            the file.  The file is then preallocated and each request downloads a range of
+            DOWNLOAD_SEGMENT_SIZE bytes into it.
+
+        `resume` if True records the ranges that have been downloaded in
+            a `<path>.progress` file, so that a download that failed
+            can be resumed by calling download() again with the same
+            arguments.  Ranges interrupted by a dropped connection are
+            also retried DOWNLOAD_RETRIES times.  The progress file is
+            removed once the download is complete.  This requires the
+            server to accept byte range requests, otherwise the whole
+            file is downloaded again.
+
+        `progress` is called with the number of bytes downloaded and the
+            size of the file (None if unknown) after every chunk.
         """
 
         filename = None
+        chunk_size = chunk_size or self.DOWNLOAD_CHUNK_SIZE
 
         # try to determine the filename
         if path is None:
@@ -328,14 +698,13 @@ class Connection(object):
                 directory, filename = os.path.split(path)
 
         # Initiate the request
-        # XXX Handle cases where a Keep-Alive header is passed back in Response
-        # include "Connection: Close" as part of the request header
-        # otherwise a Keep-Alive response from the server will hang and block
-        # our connection until the system timeout (defaults to 100sec in one
-        # implementation)
-        #
-        extra_headers = CaseInsensitiveDict(Connection='Close')
-        r = self._request(method, url, None, params, extra_headers, stream=True)
+        if method == 'GET' and (parallel > 1 or resume):
+            r, size, ranges = self._download_probe(url, params, extra_headers)
+        else:
+            r = self._download_request(method, url, params, extra_headers)
+            size = r.headers.get('Content-Length')
+            size = int(size) if size else None
+            ranges = False
 
         # Check if the user specified a file name
         if filename is None:
@@ -345,22 +714,234 @@ class Connection(object):
                 filename = filename.split('=')[1]
 
         if not filename:
+            self._close_response(r)
             raise ValueError("{0} is not a valid path. Specify a full path "
                              "for the file to be created".format(path))
         # Compose the path
         path = os.path.join(directory, filename)
+        progress_path = path + '.progress'
 
         # Check if the local file already exists
-        if os.path.isfile(path) and not overwrite:
+        resuming = resume and os.path.isfile(progress_path)
+        if os.path.isfile(path) and not overwrite and not resuming:
+            self._close_response(r)
             raise RvbdException('the file %s already exists' % path)
 
+        if ranges:
+            # the ranges are requested separately
+            self._close_response(r)
+            validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+            self._download_ranges(url, path, params, size, validator,
+                                  chunk_size, parallel, resume, progress)
+            return path
+
+        if resume:
+            logger.debug('%s does not accept range requests, '
+                         'downloading the whole file' % url)
+
         # Stream the remote file to the local file
-        with open(path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
+        received = 0
+        try:
+            with open(path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        received += len(chunk)
+                        if progress is not None:
+                            progress(received, size)
+        finally:
+            self._close_response(r)
+
+        if os.path.isfile(progress_path):
+            os.remove(progress_path)
         return path
 
+    def _download_probe(self, url, params, headers):
+        """ Request the first byte of `url` to learn whether the server
+        accepts range requests, returns the response, the size of the
+        file and True if it does.
+
+        If the server ignores the range, the response is the whole
+        file, which is downloaded as usual.  If it does not tell the
+        size of the file, or cannot return a range of an empty file,
+        the whole file is requested again.
+        """
+        probe = CaseInsensitiveDict(headers or {})
+        probe['Range'] = 'bytes=0-0'
+        try:
+            r = self._download_request('GET', url, params, probe)
+        except RvbdHTTPException, e:
+            if e.status != 416:
+                raise
+            r = None
+        else:
+            if r.status_code != 206:
+                size = r.headers.get('Content-Length')
+                return r, int(size) if size else None, False
+
+            # Content-Range: bytes 0-0/<size of the file>
+            size = r.headers.get('Content-Range', '').rpartition('/')[2]
+            if size.isdigit() and int(size) > 0:
+                # read the byte so that the connection can be reused
+                r.content
+                return r, int(size), True
+            self._close_response(r)
+
+        r = self._download_request('GET', url, params, headers)
+        size = r.headers.get('Content-Length')
+        return r, int(size) if size else None, False
+
+    def _download_ranges(self, url, path, params, size, validator,
+                         chunk_size, parallel, resume, progress):
+        """ Download the `size` bytes of `url` into `path` with `parallel`
+        concurrent range requests. """
+        segment_size = self.DOWNLOAD_SEGMENT_SIZE
+        segments = [(start, min(start + segment_size, size))
+                    for start in xrange(0, size, segment_size)]
+        progress_path = path + '.progress'
+        state = {'url': url, 'size': size, 'validator': validator,
+                 'segment_size': segment_size, 'done': []}
+
+        done = set()
+        if resume and os.path.isfile(progress_path) and os.path.isfile(path):
+            try:
+                with open(progress_path) as f:
+                    saved = json.load(f)
+            except ValueError:
+                saved = None
+            # the file must not have changed since the download started
+            if saved is not None and all(saved.get(k) == state[k] for k in
+                                         ('url', 'size', 'validator', 'segment_size')):
+                done = set(saved['done'])
+                logger.debug('resuming download of %s, %d of %d ranges done' %
+                             (url, len(done), len(segments)))
+
+        if not done:
+            # preallocate the file so that the ranges can be written
+            # in any order
+            with open(path, 'wb') as f:
+                f.truncate(size)
+
+        lock = threading.Lock()
+        received = [sum(segments[i][1] - segments[i][0] for i in done)]
+        errors = []
+        pending = Queue.Queue()
+        for i in xrange(len(segments)):
+            if i not in done:
+                pending.put(i)
+
+        def save():
+            if not resume:
+                return
+            state['done'] = sorted(done)
+            tmp = progress_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.rename(tmp, progress_path)
+
+        def on_chunk(n):
+            with lock:
+                received[0] += n
+                if progress is not None:
+                    progress(received[0], size)
+
+        def work():
+            with open(path, 'r+b') as f:
+                while not errors:
+                    try:
+                        i = pending.get_nowait()
+                    except Queue.Empty:
+                        return
+                    start, end = segments[i]
+                    try:
+                        self._download_range(url, params, f, start, end,
+                                             chunk_size, on_chunk)
+                    except Exception:
+                        with lock:
+                            errors.append(sys.exc_info())
+                        return
+                    with lock:
+                        done.add(i)
+                        save()
+
+        save()
+        threads = [threading.Thread(target=work)
+                   for i in xrange(max(1, min(parallel, pending.qsize())))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+        if os.path.isfile(progress_path):
+            os.remove(progress_path)
+
+    def _download_range(self, url, params, f, start, end, chunk_size, on_chunk):
+        """ Write the bytes `start` to `end` (excluded) of `url` at the same
+        offset of the file object `f`. """
+        offset = start
+        retries = 0
+        while offset < end:
+            headers = {'Range': 'bytes=%d-%d' % (offset, end - 1)}
+            r = None
+            try:
+                r = self._download_request('GET', url, params, headers)
+                if r.status_code != 206:
+                    raise RvbdException('%s did not return the range %d-%d' %
+                                        (url, offset, end - 1))
+                f.seek(offset)
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        offset += len(chunk)
+                        on_chunk(len(chunk))
+                if offset < end:
+                    raise IOError('connection closed after %d bytes of range %d-%d' %
+                                  (offset - start, start, end - 1))
+            except (requests.exceptions.RequestException,
+                    httplib.HTTPException, IOError), e:
+                retries += 1
+                if retries > self.DOWNLOAD_RETRIES:
+                    raise
+                logger.warning('retrying range %d-%d of %s: %s' %
+                               (offset, end - 1, url, e))
+            finally:
+                if r is not None:
+                    self._close_response(r)
+
     def add_headers(self, headers):
         self.conn.headers.update(headers)
+
+    def del_headers(self, names):
+        for name in names:
+            self.conn.headers.pop(name, None)
+
+
+class AsyncConnection(object):
+    """ Asynchronous interface to a Connection.
+
+    The request methods take the same arguments as those of Connection
+    and return a rvbd.common.futures.Future for the result.  Requests
+    are run by `executor`, by default the executor shared by all the
+    asynchronous interfaces.
+    """
+    def __init__(self, conn, executor=None):
+        self.conn = conn
+        self.executor = executor or futures.default_executor()
+
+    def __repr__(self):
+        return '<{0} to {1}>'.format(self.__class__.__name__, self.conn.hostname)
+
+    def json_request(self, *args, **kwargs):
+        return self.executor.submit(self.conn.json_request, *args, **kwargs)
+
+    def xml_request(self, *args, **kwargs):
+        return self.executor.submit(self.conn.xml_request, *args, **kwargs)
+
+    def upload(self, *args, **kwargs):
+        return self.executor.submit(self.conn.upload, *args, **kwargs)
+
+    def download(self, *args, **kwargs):
+        return self.executor.submit(self.conn.download, *args, **kwargs)
@@ -9,10 +9,12 @@
 import xml.etree.ElementTree as ElementTree
 import json
 
-__all__ = [ 'RvbdException', 'RvbdHTTPException' ]
+__all__ = [ 'RvbdException', 'RvbdHTTPException', 'CompletionTimeout' ]
 
 class RvbdException(Exception): pass
 
+class CompletionTimeout(RvbdException): pass
+
 class RvbdHTTPException(RvbdException):
     def __init__(self, result, data, method, urlpath):
         RvbdException.__init__(self,
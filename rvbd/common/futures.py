@@ -0,0 +1,233 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+This module contains the Future and Executor classes used by the
+asynchronous interfaces (AsyncConnection, AsyncShark, AsyncProfiler).
+
+A Future holds the result of an operation that completes later.
+Requests are run by an Executor, a pool of worker threads whose size
+bounds the number of requests in flight rather than the number of
+appliances: a script talking to hundreds of appliances only needs
+as many threads as it has requests outstanding at the same time.
+"""
+
+import sys
+import Queue
+import logging
+import threading
+
+from rvbd.common.exceptions import CompletionTimeout
+
+__all__ = ['Future', 'Executor', 'default_executor', 'spawn', 'as_completed',
+           'wait_all']
+
+logger = logging.getLogger(__name__)
+
+
+class Future(object):
+    """ The result of an operation that completes later. """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def __repr__(self):
+        if not self._done:
+            state = 'pending'
+        elif self._exc_info is not None:
+            state = 'failed'
+        else:
+            state = 'done'
+        return '<Future %s>' % state
+
+    def done(self):
+        """ Return True if the operation is complete. """
+        return self._done
+
+    def result(self, timeout=None):
+        """ Wait for the operation to complete and return its result,
+        raising the exception of the operation if it failed.
+
+        Raises CompletionTimeout if it is not complete after `timeout`
+        seconds.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """ Wait for the operation to complete and return the exception
+        it raised, or None. """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def _wait(self, timeout):
+        with self._cond:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise CompletionTimeout('operation not complete after %s seconds' % timeout)
+
+    def add_done_callback(self, fn):
+        """ Call `fn` with the future when the operation is complete,
+        right away if it is already complete. """
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def then(self, fn):
+        """ Return a future for `fn(result)`, called once this future
+        completes successfully.  If `fn` returns a Future, the returned
+        future completes with it. """
+        future = Future()
+
+        def chain(f):
+            if f._exc_info is not None:
+                future.set_exception(f._exc_info)
+                return
+            try:
+                res = fn(f._result)
+            except Exception:
+                future.set_exception(sys.exc_info())
+                return
+            if isinstance(res, Future):
+                res.add_done_callback(future._copy)
+            else:
+                future.set_result(res)
+
+        self.add_done_callback(chain)
+        return future
+
+    def _copy(self, other):
+        if other._exc_info is not None:
+            self.set_exception(other._exc_info)
+        else:
+            self.set_result(other._result)
+
+    def set_result(self, result):
+        self._complete(result, None)
+
+    def set_exception(self, exc_info):
+        """ Complete the future with an exception, `exc_info` is either
+        an exception or a tuple as returned by sys.exc_info(). """
+        if not isinstance(exc_info, tuple):
+            exc_info = (type(exc_info), exc_info, None)
+        self._complete(None, exc_info)
+
+    def _complete(self, result, exc_info):
+        with self._cond:
+            if self._done:
+                raise RuntimeError('future already complete')
+            self._result = result
+            self._exc_info = exc_info
+            self._done = True
+            self._cond.notify_all()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.exception('exception in future callback')
+
+
+class Executor(object):
+    """ Runs functions on a pool of at most `max_workers` threads. """
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """ Run `fn(*args, **kwargs)` and return a Future for its result. """
+        future = Future()
+        with self._lock:
+            self._queue.put((future, fn, args, kwargs))
+            if self._idle > 0:
+                self._idle -= 1
+            elif len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._work)
+                t.daemon = True
+                self._threads.append(t)
+                t.start()
+        return future
+
+    def _work(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
+            with self._lock:
+                self._idle += 1
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def default_executor():
+    """ Return the executor shared by the asynchronous interfaces. """
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = Executor()
+        return _default_executor
+
+
+def spawn(fn, *args, **kwargs):
+    """ Run `fn(*args, **kwargs)` on a new thread and return a Future
+    for its result.
+
+    Unlike Executor.submit(), this never waits for a worker, so it can
+    be used by functions that may themselves be running on an executor.
+    """
+    future = Future()
+
+    def run():
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            future.set_exception(sys.exc_info())
+        else:
+            future.set_result(result)
+
+    t = threading.Thread(target=run)
+    t.daemon = True
+    t.start()
+    return future
+
+
+def as_completed(futures):
+    """ Iterate over `futures` in the order they complete. """
+    done = Queue.Queue()
+    futures = list(futures)
+    for f in futures:
+        f.add_done_callback(done.put)
+    for i in range(len(futures)):
+        yield done.get()
+
+
+def wait_all(futures):
+    """ Wait for all of `futures` and return the list of their results,
+    raising the exception of the first one that failed. """
+    return [f.result() for f in futures]
@@ -1,15 +1,45 @@
 # Copyright (c) 2013 Riverbed Technology, Inc.
 #
-# This software is licensed under the terms and conditions of the 
+# This software is licensed under the terms and conditions of the
 # MIT License set forth at:
-#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").  
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
 # This software is distributed "AS IS" as set forth in the License.
 
 
+"""
+A bounded pool of HTTP connections to one appliance that can be shared
+by several threads.
+
+ConnectionPool hands out at most `pool_size` connections at a time,
+callers wait for a connection to be released when all of them are busy.
+Connections are checked before being reused and closed after having
+been idle for `idle_timeout` seconds.
+
+The pool can be used directly, through its httplib.HTTPConnection-like
+interface, or by the requests sent by a Connection object once
+`Connection.mount_pool()` has been called.
+"""
+
+import time
+import select
 import httplib
-from itertools import chain
+import logging
+import threading
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.poolmanager import PoolManager, SSL_KEYWORDS
+from requests.packages.urllib3.connectionpool import (HTTPConnectionPool,
+                                                      HTTPSConnectionPool)
+
+__all__ = ['ConnectionPool', 'NoFreeConnections', 'PoolAdapter']
+
+logger = logging.getLogger(__name__)
+
+
+class NoFreeConnections(Exception):
+    """ Raised when no connection of a pool is released in time """
+    pass
 
-__all__ = [ 'ConnectionPool' ]
 
 class ResponseWrapper(object):
     def __init__(self, resp, finished):
@@ -37,117 +67,356 @@ class ResponseWrapper(object):
     def fileno(self, *args, **kwargs):
         return self.__resp.fileno(*args, **kwargs)
 
-    
+
+class _Pending(object):
+    """ Placeholder for a connection being created """
+    pass
+
+
+def _is_stale(conn):
+    """ Return True if the connection `conn` cannot be reused: a socket
+    that is readable while no request is in progress has either been
+    closed by the server or has unread data. """
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        # not connected yet, or closed: it reconnects when used
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0.0)
+    except (select.error, ValueError, TypeError):
+        return True
+    return bool(readable)
+
+
 class ConnectionPool(object):
-    class NoFreeConnections(Exception): pass
-    
+    """ Thread-safe pool of at most `pool_size` HTTP connections.
+
+    The positional and unknown keyword arguments are passed to the
+    connection class, httplib.HTTPConnection or, if `use_ssl` is True,
+    httplib.HTTPSConnection.  `connection_factory` is a function
+    returning a new connection, used instead of the connection class.
+
+    `acquire_timeout` is the default number of seconds to wait for a
+    connection when all of them are busy, forever if None.
+
+    `idle_timeout` is the number of seconds after which an unused
+    connection is closed.
+    """
+    NoFreeConnections = NoFreeConnections
+
     def __init__(self, *args, **kwargs):
         self._conn_args = args
-        self._conn_kwargs = kwargs
 
-        self._pool_size = 1
-        if 'pool_size' in kwargs:
-            self._pool_size = kwargs['pool_size']
-            del kwargs['pool_size']
-            
+        self._pool_size = kwargs.pop('pool_size', 1)
+        self.acquire_timeout = kwargs.pop('acquire_timeout', None)
+        self.idle_timeout = kwargs.pop('idle_timeout', 60)
+
         self._connection_class = httplib.HTTPConnection
-        if 'use_ssl' in kwargs:
-            if kwargs['use_ssl']:
-                self._connection_class = httplib.HTTPSConnection
-            del kwargs['use_ssl']
-        
-        self._busy_connections = []
+        if kwargs.pop('use_ssl', False):
+            self._connection_class = httplib.HTTPSConnection
+        self._connection_factory = kwargs.pop('connection_factory', None)
+        self._conn_kwargs = kwargs
+
+        self._cond = threading.Condition()
+        self._clock = time.time
+        # idle connections and the time they were released, the most
+        # recently used last
         self._free_connections = []
-        self._current_connection = None
+        self._busy_connections = set()
+        self._closed = False
+
+        # per thread state of the httplib-like interface
+        self._local = threading.local()
+
+        self._counters = dict.fromkeys(['created', 'reused', 'stale', 'reaped',
+                                        'discarded', 'waits', 'timeouts',
+                                        'peak_busy'], 0)
+        self._wait_time = 0.0
 
         # initialize with dubugging turned off
         self._debug_level = 0
-        
+
+    def __repr__(self):
+        return '<%s %d/%d busy>' % (self.__class__.__name__,
+                                    len(self._busy_connections), self._pool_size)
+
+    def _new_connection(self):
+        if self._connection_factory is not None:
+            conn = self._connection_factory()
+        else:
+            conn = self._connection_class(*self._conn_args, **self._conn_kwargs)
+
+        # if we have set the debug level, set it on new connections too
+        if self._debug_level:
+            conn.set_debuglevel(self._debug_level)
+        return conn
+
+    def acquire(self, timeout=None):
+        """ Return a connection for the exclusive use of the caller until
+        it calls release().
+
+        If all the connections are busy, wait at most `timeout` seconds
+        (`acquire_timeout` if None) for one to be released, then raise
+        NoFreeConnections.
+        """
+        if timeout is None:
+            timeout = self.acquire_timeout
+
+        with self._cond:
+            self._reap()
+            if (not self._free_connections and
+                    len(self._busy_connections) >= self._pool_size):
+                self._counters['waits'] += 1
+                start = self._clock()
+                while (not self._free_connections and
+                       len(self._busy_connections) >= self._pool_size):
+                    if self._closed:
+                        raise NoFreeConnections('the pool is closed')
+                    remaining = None
+                    if timeout is not None:
+                        remaining = start + timeout - self._clock()
+                        if remaining <= 0:
+                            self._counters['timeouts'] += 1
+                            self._wait_time += self._clock() - start
+                            raise NoFreeConnections(
+                                'no connection released after %s seconds' % timeout)
+                    self._cond.wait(remaining)
+                self._wait_time += self._clock() - start
+
+            conn = None
+            while self._free_connections:
+                candidate, released = self._free_connections.pop()
+                if _is_stale(candidate):
+                    self._counters['stale'] += 1
+                    candidate.close()
+                else:
+                    conn = candidate
+                    self._counters['reused'] += 1
+                    break
+
+            # the slot is taken before the connection is created, so that
+            # the pool is not exceeded while the lock is released
+            if conn is None:
+                conn = _Pending()
+            self._busy_connections.add(conn)
+            self._counters['peak_busy'] = max(self._counters['peak_busy'],
+                                              len(self._busy_connections))
+
+        if isinstance(conn, _Pending):
+            placeholder = conn
+            try:
+                conn = self._new_connection()
+            finally:
+                with self._cond:
+                    self._busy_connections.discard(placeholder)
+                    if conn is not placeholder:
+                        self._busy_connections.add(conn)
+                        self._counters['created'] += 1
+                    else:
+                        self._cond.notify()
+        return conn
+
+    def release(self, conn, reuse=True):
+        """ Return `conn`, obtained from acquire(), to the pool.  If
+        `reuse` is False, the connection is closed instead, for instance
+        after an error left it in an unknown state. """
+        with self._cond:
+            if conn not in self._busy_connections:
+                return
+            self._busy_connections.remove(conn)
+            if reuse and not self._closed:
+                self._free_connections.append((conn, self._clock()))
+            else:
+                self._counters['discarded'] += 1
+                conn.close()
+            self._reap()
+            self._cond.notify()
+
+    def reap(self):
+        """ Close the connections that have been idle for longer than
+        `idle_timeout`. """
+        with self._cond:
+            self._reap()
+
+    def _reap(self):
+        if self.idle_timeout is None:
+            return
+        deadline = self._clock() - self.idle_timeout
+        # the connections are ordered by release time
+        while self._free_connections and self._free_connections[0][1] <= deadline:
+            conn, released = self._free_connections.pop(0)
+            self._counters['reaped'] += 1
+            conn.close()
+
+    def stats(self):
+        """ Return a dictionary with the utilisation of the pool """
+        with self._cond:
+            stats = dict(self._counters)
+            busy = len(self._busy_connections)
+            stats.update({
+                'max_size': self._pool_size,
+                'busy': busy,
+                'idle': len(self._free_connections),
+                'wait_time': self._wait_time,
+                'utilisation': float(busy) / self._pool_size,
+                })
+        return stats
+
     def connect(self):
         pass
 
     def close(self):
-        pass
+        """ Close the idle connections, and the busy ones once they are
+        released.  Threads waiting for a connection get NoFreeConnections. """
+        with self._cond:
+            self._closed = True
+            for conn, released in self._free_connections:
+                conn.close()
+            self._free_connections = []
+            self._cond.notify_all()
 
-    def set_tunnel(self, *args, **kwargs): 
+    def set_tunnel(self, *args, **kwargs):
         raise NotImplementedError()
 
-    def set_debuglevel(self, level): 
+    def set_debuglevel(self, level):
         self._debug_level = level
 
-        if self._current_connection:
-            self._current_connection.set_debuglevel(level)
-        for conn in chain(self._free_connections, self._busy_connections):
+        with self._cond:
+            conns = ([conn for conn, released in self._free_connections] +
+                     [conn for conn in self._busy_connections
+                      if not isinstance(conn, _Pending)])
+        for conn in conns:
             conn.set_debuglevel(level)
 
+    # httplib.HTTPConnection-like interface, each thread has its own
+    # current connection between request() and getresponse()
+
+    def _get_current(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            raise httplib.ImproperConnectionState()
+        return conn
+
     def _start_connection(self):
-        if self._current_connection is not None:
+        if getattr(self._local, 'conn', None) is not None:
             raise httplib.ImproperConnectionState()
+        self._local.conn = self.acquire()
+        return self._local.conn
 
+    def _call(self, conn, method, *args, **kwargs):
         try:
-            self._current_connection = self._free_connections.pop()
-        except IndexError:
-            if len(self._busy_connections) >= self._pool_size:
-                raise NoFreeConnections()
-            #print 'create new connection (%d busy)' % len(self._busy_connections)
-            self._current_connection = self._connection_class(*self._conn_args, **self._conn_kwargs)
-            self._current_connection.connect()
-
-            # if we have set the debug level, set it on new connections too
-            if self._debug_level:
-                self._current_connection.set_debug_level = self._debug_level
-        
-    def request(self, *args, **kwargs):
-        self._start_connection()
-        try:
-            return self._current_connection.request(*args, **kwargs)
+            return getattr(conn, method)(*args, **kwargs)
         except (httplib.HTTPException, IOError):
-            self._current_connection = None
+            self._local.conn = None
+            self.release(conn, reuse=False)
             raise
 
+    def request(self, *args, **kwargs):
+        conn = self._start_connection()
+        return self._call(conn, 'request', *args, **kwargs)
+
     def putrequest(self, *args, **kwargs):
-        self._start_connection()
-        try:
-            return self._current_connection.putrequest(*args, **kwargs)
-        except (httplib.HTTPException, IOError):
-            self._current_connection = None
-            raise
+        conn = self._start_connection()
+        return self._call(conn, 'putrequest', *args, **kwargs)
 
     def putheader(self, *args, **kwargs):
-        if self._current_connection is None:
-            raise httplib.ImproperConnectionState()
-        return self._current_connection.putheader(*args, **kwargs)
+        return self._get_current().putheader(*args, **kwargs)
 
     def endheaders(self, *args, **kwargs):
-        if self._current_connection is None:
-            raise httplib.ImproperConnectionState()
+        return self._call(self._get_current(), 'endheaders', *args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        return self._get_current().send(*args, **kwargs)
+
+    def getresponse(self):
+        conn = self._get_current()
+        self._local.conn = None
         try:
-            return self._current_connection.endheaders(*args, **kwargs)
+            resp = conn.getresponse()
         except (httplib.HTTPException, IOError):
-            self._current_connection = None
+            self.release(conn, reuse=False)
             raise
+        return ResponseWrapper(resp, lambda: self.release(conn))
 
-    def send(self, *args, **kwargs):
-        if self._current_connection is None:
-            raise httplib.ImproperConnectionState()
-        return self._current_connection.send(*args, **kwargs)
 
-    def _recycle(self, conn):
-        self._busy_connections.remove(conn)
-        self._free_connections.append(conn)
-        
-    def getresponse(self):
-        if self._current_connection is None:
-            raise httplib.ImproperConnectionState()
+class _PooledMixin(object):
+    """ Makes a urllib3 connection pool take its connections from a
+    ConnectionPool """
+    def __init__(self, host, port=None, pool_options=None, **kwargs):
+        super(_PooledMixin, self).__init__(host, port, **kwargs)
+        self.flypool = ConnectionPool(connection_factory=self._new_conn,
+                                      **(pool_options or {}))
+
+    def _get_conn(self, timeout=None):
+        return self.flypool.acquire(timeout)
 
-        conn = self._current_connection
-        self._current_connection = None
-        self._busy_connections.append(conn)
+    def _put_conn(self, conn):
+        # urllib3 puts None back for connections it discarded, which
+        # _make_request() has already released
+        if conn is not None:
+            self.flypool.release(conn)
 
+    def _make_request(self, conn, *args, **kwargs):
         try:
-            resp = conn.getresponse()
-            return ResponseWrapper(resp, lambda: self._recycle(conn))
-        except httplib.HTTPException:
-            self._busy_connections.remove(conn)
+            return super(_PooledMixin, self)._make_request(conn, *args, **kwargs)
+        except Exception:
+            self.flypool.release(conn, reuse=False)
             raise
 
+    def close(self):
+        self.flypool.close()
+
+
+class _PooledHTTPConnectionPool(_PooledMixin, HTTPConnectionPool):
+    pass
+
+
+class _PooledHTTPSConnectionPool(_PooledMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PoolManager(PoolManager):
+    pool_classes = {'http': _PooledHTTPConnectionPool,
+                    'https': _PooledHTTPSConnectionPool}
+
+    def __init__(self, pool_options, **kwargs):
+        super(_PoolManager, self).__init__(**kwargs)
+        self.pool_options = pool_options
+
+    def _new_pool(self, scheme, host, port):
+        kwargs = dict(self.connection_pool_kw)
+        if scheme == 'http':
+            for kw in SSL_KEYWORDS:
+                kwargs.pop(kw, None)
+        return self.pool_classes[scheme](host, port, pool_options=self.pool_options,
+                                         **kwargs)
+
+
+class PoolAdapter(HTTPAdapter):
+    """ A requests transport adapter sending the requests to each host
+    through a ConnectionPool, see ConnectionPool for the arguments.
+
+    `ssl_version` forces the SSL protocol version, as SSLAdapter does.
+    """
+    def __init__(self, pool_size=10, acquire_timeout=None, idle_timeout=60,
+                 ssl_version=None):
+        self.pool_options = {'pool_size': pool_size,
+                             'acquire_timeout': acquire_timeout,
+                             'idle_timeout': idle_timeout}
+        self.ssl_version = ssl_version
+        super(PoolAdapter, self).__init__(pool_maxsize=pool_size)
+
+    def init_poolmanager(self, connections, maxsize, block=False):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        kwargs = {}
+        if self.ssl_version is not None:
+            kwargs['ssl_version'] = self.ssl_version
+        self.poolmanager = _PoolManager(self.pool_options, num_pools=connections,
+                                        maxsize=maxsize, block=block, **kwargs)
+
+    def pools(self):
+        """ Return the ConnectionPool of each host """
+        pools = self.poolmanager.pools
+        return [pools[key].flypool for key in pools.keys()]
@@ -0,0 +1,236 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Instrumentation of the requests sent to appliances.
+
+A Connection calls each of its `hooks` with a RequestRecord after every
+request.  RequestStats is a hook that keeps latency histograms per
+endpoint, it is installed by `Connection.enable_stats()`, or on every
+new connection by setting `Connection.COLLECT_STATS` to True:
+
+    Connection.COLLECT_STATS = True
+    shark = Shark(host, auth=auth)
+    ...
+    print shark.stats().to_json()
+
+Endpoints are identified by the request method and the URL path with
+the ids of the resources stripped, so that for instance all the
+requests for the data of any view are counted together.
+"""
+
+import re
+import json
+import bisect
+import urlparse
+import threading
+from collections import namedtuple
+
+__all__ = ['RequestRecord', 'Histogram', 'RequestStats', 'url_template']
+
+
+class RequestRecord(namedtuple('RequestRecord',
+                               ['method', 'url', 'template', 'status',
+                                'request_bytes', 'response_bytes',
+                                'ttfb', 'latency'])):
+    """ A request sent to an appliance.
+
+    `template` is the path of `url` as returned by url_template(), `status`
+    the HTTP status of the response, `ttfb` the number of seconds until the
+    response headers were received and `latency` the total number of
+    seconds of the request, including reading the body unless the response
+    is streamed.
+    """
+    __slots__ = ()
+
+
+# path segments that are resource ids rather than names: numbers,
+# hexadecimal strings and uuids of at least 8 characters, and names
+# ending with a number (such as the ids of Shark views), with an
+# optional extension
+_ID_SEGMENT = re.compile(r'^(\d+|(?=[0-9a-fA-F-]*\d)[0-9a-fA-F-]{8,}|[A-Za-z_]+\d{3,})'
+                         r'(\.[A-Za-z]+)?$')
+
+
+def url_template(url):
+    """ Return the path of `url` with the resource ids replaced by
+    `{id}`, e.g. `/api/profiler/1.0/reports/{id}/queries/{id}.json` """
+    path = urlparse.urlparse(url).path
+    return '/'.join(_ID_SEGMENT.sub(lambda m: '{id}' + (m.group(2) or ''), segment)
+                    for segment in path.split('/'))
+
+
+class Histogram(object):
+    """ Counts of observed values in buckets bounded by `bounds`, plus
+    an overflow bucket. """
+    DEFAULT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                      1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Return an upper bound of the `q` quantile (between 0 and 1) of
+        the observed values, or None if there are none. """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.bounds] + ['+Inf'],
+                                self.counts)),
+            }
+
+
+class _EndpointStats(object):
+    def __init__(self, bounds):
+        self.latency = Histogram(bounds)
+        self.ttfb = Histogram(bounds)
+        self.statuses = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def to_dict(self):
+        return {
+            'latency': self.latency.to_dict(),
+            'ttfb': self.ttfb.to_dict(),
+            'statuses': dict((str(k), v) for k, v in self.statuses.iteritems()),
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            }
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_labels(labels):
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in labels)
+
+
+class RequestStats(object):
+    """ Per endpoint statistics of requests, to be used as a Connection
+    hook.
+
+    `labels` is a dictionary of labels added to every metric when the
+    statistics are exported in the Prometheus format, such as the host
+    of the appliance.  `bounds` are the upper bounds, in seconds, of
+    the histogram buckets.
+    """
+    def __init__(self, labels=None, bounds=Histogram.DEFAULT_BOUNDS):
+        self.labels = labels or {}
+        self.bounds = tuple(bounds)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        key = (record.method, record.template)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = _EndpointStats(self.bounds)
+            stats.latency.observe(record.latency)
+            if record.ttfb is not None:
+                stats.ttfb.observe(record.ttfb)
+            stats.statuses[record.status] = stats.statuses.get(record.status, 0) + 1
+            stats.request_bytes += record.request_bytes
+            stats.response_bytes += record.response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def endpoints(self):
+        """ Return the list of (method, template) of the endpoints that
+        have been requested. """
+        with self._lock:
+            return sorted(self._endpoints)
+
+    def to_dict(self):
+        """ Return the statistics as a dictionary keyed by
+        `"<method> <template>"`. """
+        with self._lock:
+            return dict(('%s %s' % key, stats.to_dict())
+                        for key, stats in self._endpoints.iteritems())
+
+    def to_json(self, **kwargs):
+        """ Return the statistics as JSON, `kwargs` are passed to
+        json.dumps(). """
+        return json.dumps(self.to_dict(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix='flyscript'):
+        """ Return the statistics in the Prometheus text exposition
+        format, with metric names starting with `prefix`. """
+        base = sorted(self.labels.items())
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.iteritems())
+
+            for attr, name, text in (
+                    ('latency', 'request_duration_seconds', 'Total duration of requests.'),
+                    ('ttfb', 'request_ttfb_seconds', 'Time until the response headers are received.')):
+                header(name, 'histogram', text)
+                for (method, template), stats in endpoints:
+                    hist = getattr(stats, attr)
+                    labels = base + [('method', method), ('endpoint', template)]
+                    total = 0
+                    for bound, count in zip(self.bounds + (float('inf'),), hist.counts):
+                        total += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append('%s_%s_bucket%s %d' %
+                                     (prefix, name, _format_labels(labels + [('le', le)]), total))
+                    lines.append('%s_%s_sum%s %r' % (prefix, name, _format_labels(labels), hist.sum))
+                    lines.append('%s_%s_count%s %d' % (prefix, name, _format_labels(labels), hist.count))
+
+            header('requests_total', 'counter', 'Number of requests by response status.')
+            for (method, template), stats in endpoints:
+                for status, count in sorted(stats.statuses.iteritems()):
+                    labels = base + [('method', method), ('endpoint', template),
+                                     ('status', status)]
+                    lines.append('%s_requests_total%s %d' % (prefix, _format_labels(labels), count))
+
+            for attr, name, text in (
+                    ('request_bytes', 'request_bytes_total', 'Bytes sent in request bodies.'),
+                    ('response_bytes', 'response_bytes_total', 'Bytes received in response bodies.')):
+                header(name, 'counter', text)
+                for (method, template), stats in endpoints:
+                    labels = base + [('method', method), ('endpoint', template)]
+                    lines.append('%s_%s%s %d' % (prefix, name, _format_labels(labels),
+                                                 getattr(stats, attr)))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,137 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Incremental decoding of JSON documents whose bulk is one large array.
+
+Responses such as Shark view data or Profiler query results are a JSON
+object with a member holding a list of samples or rows.  `iter_array()`
+yields the elements of that list as the document is received, so only
+the current element and the unparsed part of the last chunk are held
+in memory, instead of the whole body, its unicode decoding and the
+decoded objects at the same time.
+"""
+
+import re
+import json
+
+__all__ = ['iter_array']
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITERS = ' \t\n\r,:]}'
+
+
+class _Reader(object):
+    """ Parses JSON values from a sequence of string chunks """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, wanted=1):
+        """ Read chunks until at least `wanted` more characters are
+        available, returns False if the end of the document is reached
+        before anything could be read. """
+        buf = self.buf[self.pos:]
+        size = len(buf)
+        parts = [buf]
+        for chunk in self.chunks:
+            if chunk:
+                parts.append(chunk)
+                size += len(chunk)
+                if size - len(buf) >= wanted:
+                    break
+        else:
+            self.eof = True
+        self.buf = ''.join(parts)
+        self.pos = 0
+        return size > len(buf)
+
+    def peek(self):
+        """ Skip whitespace and return the next character, or '' at the
+        end of the document. """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof or not self._fill():
+                return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError('Expecting one of %r at offset %d of chunk: %r' %
+                             (chars, self.pos, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """ Decode and return the next value """
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                obj, end = None, None
+            # a number at the end of the buffer may continue in the
+            # next chunk, so a value is only complete when followed by
+            # a character that cannot be part of it
+            if end is not None and (self.eof or (end < len(self.buf) and
+                                                 self.buf[end] in _DELIMITERS)):
+                self.pos = end
+                return obj
+            # read at least as much as is buffered so that large values
+            # are not decoded over and over again
+            if self.eof or not self._fill(len(self.buf) - self.pos):
+                if end is not None:
+                    self.pos = end
+                    return obj
+                raise ValueError('Truncated JSON document')
+
+
+def iter_array(chunks, name, fields=None):
+    """ Yield the elements of the array `name` of the JSON object read
+    from the iterable of string `chunks`.
+
+    The other members of the object are decoded as well, if `fields` is
+    a dictionary they are stored in it once the iteration is over.
+    Nothing is yielded if the document is empty, or if the member is
+    missing or null.
+    """
+    reader = _Reader(chunks)
+    if not reader.peek():
+        return
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == name and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() != ']':
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+            else:
+                reader.expect(']')
+        else:
+            value = reader.value()
+            if key == name:
+                for item in value or ():
+                    yield item
+            elif fields is not None:
+                fields[key] = value
+
+        if reader.expect(',}') == '}':
+            return
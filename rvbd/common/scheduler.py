@@ -0,0 +1,308 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+This module contains a scheduler that waits for long running operations
+on an appliance to complete, such as views being computed on trace
+files, indexes being created or reports being run.
+
+Many operations can be waited for at once.  Each one is polled on its
+own schedule: when the appliance reports the progress of the operation
+(or the time it expects to need), the next status request is sent when
+the operation should be complete, otherwise the polling interval grows
+exponentially.  For example, to apply a view to a list of trace files:
+
+    views = [shark.create_view(f, columns, filters, sync=False)
+             for f in files]
+    wait_for([v.completion(timeout=600) for v in views])
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+from rvbd.common.futures import Future
+from rvbd.common.exceptions import CompletionTimeout
+
+__all__ = ['Operation', 'PollOperation', 'CompletionScheduler',
+           'BackgroundScheduler', 'wait_for']
+
+logger = logging.getLogger(__name__)
+
+
+class Operation(object):
+    """ Base class for a long running operation.
+
+    Subclasses implement `poll()`, and optionally `complete()`.
+
+    `timeout` is the number of seconds after which waiting for the
+    operation is abandoned and `error` is set to a CompletionTimeout.
+
+    `on_progress` is called with the operation after every status
+    request, `on_done` is called with the operation once it is
+    complete, failed or timed out.
+    """
+    def __init__(self, name=None, timeout=None, on_progress=None, on_done=None):
+        self.name = name
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.on_done = on_done
+
+        self.done = False
+        self.error = None
+        self.progress = None
+        self.remaining = None
+        self.polls = 0
+
+        self._deadline = None
+        self._interval = None
+        self._first = None
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+    def poll(self):
+        """ Request the status of the operation from the appliance.
+
+        Returns a tuple `(done, progress, remaining)`, where `done` is
+        True when the operation is complete, `progress` the fraction
+        of the operation that is complete (between 0 and 1) and
+        `remaining` the estimated number of seconds until completion.
+        `progress` and `remaining` are None if they are not known.
+        """
+        raise NotImplementedError()
+
+    def complete(self):
+        """ Called once the operation is complete. """
+        pass
+
+
+class PollOperation(Operation):
+    """ An operation whose status is returned by the function `poll`,
+    see `Operation.poll()` for its return value. """
+    def __init__(self, poll, name=None, **kwargs):
+        super(PollOperation, self).__init__(name, **kwargs)
+        self._poll = poll
+
+    def poll(self):
+        return self._poll()
+
+
+class CompletionScheduler(object):
+    """ Waits for the completion of a set of operations.
+
+    Operations are polled at least `min_interval` and at most
+    `max_interval` seconds apart.  When nothing is known about how
+    long an operation will take, the interval is multiplied by
+    `backoff` after every status request.
+    """
+    def __init__(self, min_interval=0.1, max_interval=5.0, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._clock = time.time
+        self._sleep = time.sleep
+
+    def add(self, op):
+        """ Add the operation `op`, its first status request is sent
+        right away. """
+        now = self._clock()
+        if op.timeout is not None:
+            op._deadline = now + op.timeout
+        op._interval = self.min_interval
+        self._push(now, op)
+        return op
+
+    def pending(self):
+        """ Return the number of operations that are not complete yet. """
+        return len(self._heap)
+
+    def cancel(self):
+        """ Stop polling the operations that are not complete yet, and
+        return them. """
+        ops = [entry[2] for entry in sorted(self._heap)]
+        self._heap = []
+        return ops
+
+    def wait(self, timeout=None, raise_errors=True):
+        """ Poll the operations until all of them are done.
+
+        `timeout` is an overall deadline in seconds, on top of the
+        timeout of each operation.
+
+        If `raise_errors` is True, the error of the first operation
+        that failed or timed out is raised after all of them are done,
+        otherwise the errors are only stored in the operations.
+
+        Returns the list of operations.
+        """
+        ops = []
+        if timeout is not None:
+            deadline = self._clock() + timeout
+            for entry in self._heap:
+                op = entry[2]
+                if op._deadline is None or deadline < op._deadline:
+                    op._deadline = deadline
+
+        while True:
+            op = self.wait_next()
+            if op is None:
+                break
+            ops.append(op)
+
+        if raise_errors:
+            for op in ops:
+                if op.error is not None:
+                    raise op.error
+        return ops
+
+    def wait_next(self):
+        """ Poll the operations until one of them is done and return it.
+
+        Returns None if there are no operations left.  New operations
+        can be added between calls.
+        """
+        while self._heap:
+            when = self._heap[0][0]
+            now = self._clock()
+            if when > now:
+                self._sleep(when - now)
+                continue
+
+            op = heapq.heappop(self._heap)[2]
+            self._poll(op)
+            if op.done:
+                return op
+        return None
+
+    def _push(self, when, op):
+        heapq.heappush(self._heap, (when, next(self._counter), op))
+
+    def _poll(self, op):
+        try:
+            done, progress, remaining = op.poll()
+            op.polls += 1
+            op.progress = progress
+            op.remaining = remaining
+            if op.on_progress is not None:
+                op.on_progress(op)
+            if done:
+                op.complete()
+        except Exception, e:
+            self._finish(op, e)
+            return
+
+        now = self._clock()
+        if done:
+            self._finish(op, None)
+        elif op._deadline is not None and now >= op._deadline:
+            self._finish(op, CompletionTimeout('timed out waiting for %s' % op))
+        else:
+            when = now + self._next_interval(op, now)
+            if op._deadline is not None and when > op._deadline:
+                when = op._deadline
+            self._push(when, op)
+
+    def _next_interval(self, op, now):
+        estimate = op.remaining
+        if op.progress is not None:
+            if op._first is None:
+                op._first = (now, op.progress)
+            elif estimate is None:
+                # extrapolate the average rate since the first status
+                start, progress = op._first
+                if op.progress > progress and now > start:
+                    rate = (op.progress - progress) / (now - start)
+                    estimate = (1.0 - op.progress) / rate
+
+        if estimate is None:
+            interval = op._interval * self.backoff
+        else:
+            interval = estimate
+        interval = max(self.min_interval, min(interval, self.max_interval))
+        op._interval = interval
+        return interval
+
+    def _finish(self, op, error):
+        op.done = True
+        op.error = error
+        if error is not None:
+            logger.warning('%s failed: %s' % (op, error))
+        if op.on_done is not None:
+            op.on_done(op)
+
+
+class BackgroundScheduler(CompletionScheduler):
+    """ A CompletionScheduler polling its operations from a background
+    thread, so that callers are not blocked while waiting. """
+    def __init__(self, **kwargs):
+        super(BackgroundScheduler, self).__init__(**kwargs)
+        self._cond = threading.Condition()
+        self._sleep = self._cond.wait
+        self._thread = None
+
+    def submit(self, op):
+        """ Add the operation `op` and return a Future that completes
+        with `op` once it is done, or with its error. """
+        future = Future()
+        on_done = op.on_done
+
+        def done(op):
+            if on_done is not None:
+                on_done(op)
+            if op.error is not None:
+                future.set_exception(op.error)
+            else:
+                future.set_result(op)
+
+        op.on_done = done
+        with self._cond:
+            self.add(op)
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        return future
+
+    def _run(self):
+        with self._cond:
+            while True:
+                if self.wait_next() is None:
+                    self._cond.wait()
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """ Return the BackgroundScheduler shared by the asynchronous
+    interfaces. """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = BackgroundScheduler()
+        return _default_scheduler
+
+
+def wait_for(ops, timeout=None, raise_errors=True, **kwargs):
+    """ Wait for the completion of all the operations in `ops`.
+
+    Additional keyword arguments are passed to CompletionScheduler,
+    see `CompletionScheduler.wait()` for the other arguments.
+    """
+    scheduler = CompletionScheduler(**kwargs)
+    for op in ops:
+        scheduler.add(op)
+    return scheduler.wait(timeout=timeout, raise_errors=raise_errors)
@@ -25,15 +25,17 @@ objects.
 
 from __future__ import absolute_import
 
+import time
 import base64
 import logging
 
 from rvbd.common import connection
+from rvbd.common import futures
 from rvbd.common.exceptions import RvbdException, RvbdHTTPException
 
 from rvbd.common.api_helpers import APIVersion
 
-__all__ = ['Service', 'Auth', 'UserAuth', 'OAuth', 'RvbdException']
+__all__ = ['Service', 'AsyncService', 'Auth', 'UserAuth', 'OAuth', 'RvbdException']
 
 logger = logging.getLogger(__name__)
 
@@ -91,7 +93,7 @@ class Service(object):
     is created.  Requests can be made via the `Service.conn` property.
     """
     def __init__(self, service, host=None, port=None, auth=None,
-                 verify_ssl=False, versions=None):
+                 verify_ssl=False, versions=None, session_cache=None):
         """Establish a connection to the named host.
 
         `host` is the name or IP address of the device to connect to
@@ -112,6 +114,11 @@ class Service(object):
             if unspecified, this will use the latest version supported
             by both this implementation and service requested.  This does
             not apply to the "common" resource requests.
+
+        `session_cache` is an optional rvbd.common.sessioncache.SessionCache.
+            If it holds a session of `auth` on this device, the session is
+            reused instead of checking the API versions and logging in
+            again, otherwise the new session is stored in it.
         """
 
         self.service = service
@@ -122,10 +129,19 @@ class Service(object):
         self.conn = None
 
         self.verify_ssl = verify_ssl
+        self.session_cache = session_cache
 
         logger.info("New service %s for host %s" % (self.service, self.host))
 
+        # authentication methods fetched while checking the API versions
+        self._auth_info = None
+
         self.connect()
+        if auth is not None and self._resume_session(auth, versions):
+            return
+
+        if auth is not None:
+            self._auth_info = futures.spawn(self._get_auth_info)
         self.check_api_versions(versions)
 
         if auth is not None:
@@ -138,12 +154,28 @@ class Service(object):
         self.logout()
 
     def connect(self):
-        if self.conn is not None and hasattr(self.conn, 'close'):
-            self.conn.close()
+        stats = None
+        if self.conn is not None:
+            # keep the statistics of the previous connection
+            stats = self.conn.stats()
+            if hasattr(self.conn, 'close'):
+                self.conn.close()
 
         self.conn = connection.Connection(self.host, port=self.port,
                                           verify=self.verify_ssl,
                                           reauthenticate_handler=self.reauthenticate)
+        if stats is not None:
+            self.conn.enable_stats(stats)
+
+    def stats(self):
+        """Return the per endpoint statistics of the requests sent to the
+        device, a RequestStats object, or None if they are not collected.
+
+        Statistics are collected once `conn.enable_stats()` is called,
+        or for every service when `Connection.COLLECT_STATS` is set to
+        True before it is created.
+        """
+        return self.conn.stats()
 
     def logout(self):
         """End the authenticated session with the device."""
@@ -191,13 +223,19 @@ class Service(object):
 
         return None
 
+    def _get_auth_info(self):
+        # uses the GL7 'auth_info' resource
+        return self.conn.json_request('GET', '/api/common/1.0/auth_info')
+
     def _detect_auth_methods(self):
         """Get the list of authentication methods supported."""
-        # uses the GL7 'auth_info' resource
-        path = '/api/common/1.0/auth_info'
+        prefetched, self._auth_info = self._auth_info, None
 
         try:
-            auth_info = self.conn.json_request('GET', path)
+            if prefetched is not None:
+                auth_info = prefetched.result()
+            else:
+                auth_info = self._get_auth_info()
             logger.info("Supported authentication methods: %s" %
                         (','.join(auth_info['supported_methods'])))
             self._supports_auth_basic  = ("BASIC" in auth_info['supported_methods'])
@@ -222,6 +260,7 @@ class Service(object):
 
         self.auth = auth
         self._detect_auth_methods()
+        expires = None
 
         if self._supports_auth_oauth and Auth.OAUTH in self.auth.methods:
             # TODO fix for future support to handle appropriate triplets
@@ -233,6 +272,8 @@ class Service(object):
             }
             answer = self.conn.json_request('POST', path, 'POST', params=data)
             token = answer['access_token']
+            if answer.get('expires_in'):
+                expires = time.time() + float(answer['expires_in'])
             st = token.split('.')
             if len(st) == 1:
                 auth_header = 'Bearer %s' % token
@@ -240,7 +281,9 @@ class Service(object):
                 auth_header = 'SignedBearer %s' % token
             else:
                 raise RvbdException('Unknown OAuth response from server: %s' % st)
-            self.conn.add_headers({'Authorization': auth_header})
+            headers = {'Authorization': auth_header}
+            self.conn.add_headers(headers)
+            method = Auth.OAUTH
             logger.info('Authenticated using OAUTH2.0')
 
         elif self._supports_auth_cookie and Auth.COOKIE in self.auth.methods:
@@ -256,23 +299,68 @@ class Service(object):
             # we're good, set up our http headers for subsequent
             # requests!
             cookie = http_response.headers['set-cookie']
-            self.conn.add_headers({'Cookie': cookie})
+            headers = {'Cookie': cookie}
+            self.conn.add_headers(headers)
+            method = Auth.COOKIE
+            expiries = [c.expires for c in http_response.cookies
+                        if c.expires is not None]
+            if expiries:
+                expires = min(expiries)
 
             logger.info("Authenticated using COOKIE")
 
         elif self._supports_auth_basic and Auth.BASIC in self.auth.methods:
 
-            # Use HTTP Basic authentication
-            s = base64.b64encode("%s:%s" % (self.auth.username, self.auth.password))
-            self.conn.add_headers({'Authorization': 'Basic %s' % s})
+            # Use HTTP Basic authentication, the header holds the
+            # password so it is not stored in the session cache
+            self._add_basic_auth_header()
+            headers = None
+            method = Auth.BASIC
 
             logger.info("Authenticated using BASIC")
 
         else:
             raise RvbdException("No supported authentication methods")
 
+        if self.session_cache is not None:
+            api_version = getattr(self, 'api_version', None)
+            if api_version is not None:
+                api_version = str(api_version)
+            self.session_cache.put(self.service, self.host, self.port, auth,
+                                   api_version, method, headers, expires)
+
+    def _add_basic_auth_header(self):
+        s = base64.b64encode("%s:%s" % (self.auth.username, self.auth.password))
+        self.conn.add_headers({'Authorization': 'Basic %s' % s})
+
+    def _resume_session(self, auth, versions):
+        """Set up the session of `auth` found in the session cache,
+        returns False if there is none or if its API version is not
+        one of `versions`."""
+        if self.session_cache is None:
+            return False
+        entry = self.session_cache.get(self.service, self.host, self.port, auth)
+        if entry is None or entry['method'] not in auth.methods:
+            return False
+
+        if entry['api_version'] is not None:
+            api_version = APIVersion(entry['api_version'])
+            if versions is not None and api_version not in versions:
+                return False
+            self.api_version = api_version
+
+        self.auth = auth
+        if entry['method'] == Auth.BASIC:
+            self._add_basic_auth_header()
+        else:
+            self.conn.add_headers(entry['headers'])
+        logger.info("Resumed cached session for %s on %s" % (self.service, self.host))
+        return True
+
     def reauthenticate(self):
         """Retry the authentication method"""
+        if self.session_cache is not None:
+            self.session_cache.remove(self.service, self.host, self.port, self.auth)
         self.authenticate(self.auth)
 
     def ping(self):
@@ -284,3 +372,52 @@ class Service(object):
         res.read()
 
         return True
+
+
+class AsyncService(object):
+    """Asynchronous interface to a Service.
+
+    Methods return a rvbd.common.futures.Future instead of blocking,
+    the requests are run by `executor`, by default the executor shared
+    by all the asynchronous interfaces.  The underlying Service object
+    is available as `service`, and `conn` is an AsyncConnection.
+
+    Subclasses set `service_class` to the Service subclass they wrap.
+    """
+    service_class = None
+
+    def __init__(self, service, executor=None):
+        self.service = service
+        self.executor = executor or futures.default_executor()
+        self.conn = connection.AsyncConnection(service.conn, self.executor)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.service.host)
+
+    @classmethod
+    def connect(cls, *args, **kwargs):
+        """Create a `service_class` object in the background and return
+        a Future for the asynchronous interface to it.
+
+        The arguments are those of `service_class`, plus an optional
+        `executor`.  Connecting, checking the API versions and
+        authenticating all happen without blocking the caller.
+        """
+        executor = kwargs.pop('executor', None) or futures.default_executor()
+        future = executor.submit(cls.service_class, *args, **kwargs)
+        return future.then(lambda service: cls(service, executor=executor))
+
+    def _submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def check_api_versions(self, api_versions):
+        """See Service.check_api_versions()"""
+        return self._submit(self.service.check_api_versions, api_versions)
+
+    def authenticate(self, auth):
+        """See Service.authenticate()"""
+        return self._submit(self.service.authenticate, auth)
+
+    def logout(self):
+        """See Service.logout()"""
+        return self._submit(self.service.logout)
@@ -0,0 +1,148 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+On-disk cache of authenticated sessions.
+
+Creating a Service checks the API versions supported by the appliance,
+detects its authentication methods and logs in, which takes several
+requests before any real work is done.  Scripts that run often for a
+short time can instead reuse the session of a previous run by passing
+a SessionCache:
+
+    shark = Shark(host, auth=auth, session_cache=SessionCache())
+
+The cache stores the negotiated API version, the authentication method
+and the session cookie or OAuth token, keyed by service, host, port,
+user and a salted hash of the password, so that a session is only
+reused with the credentials that opened it.  Passwords are never
+stored.  When the appliance rejects a cached
+session, the service logs in again and the entry is replaced.
+"""
+
+import os
+import json
+import time
+import hmac
+import errno
+import hashlib
+import logging
+
+from rvbd.common._fs import FlyscriptDir
+
+__all__ = ['SessionCache']
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache(object):
+    """ Authenticated sessions stored in the flyscript directory.
+
+    `lifetime` is the number of seconds a session is reused at most,
+    unless the appliance returns an earlier expiry time for it.
+
+    `directory` overrides the location of the cache, by default it
+    is in the flyscript directory of the user.
+    """
+    DEFAULT_LIFETIME = 15 * 60
+    SALT_FILE = '.salt'
+
+    def __init__(self, lifetime=DEFAULT_LIFETIME, directory=None):
+        self.lifetime = lifetime
+        self.dir = FlyscriptDir('sessions', directory=directory)
+        self._clock = time.time
+        self._salt = None
+
+    def _get_salt(self):
+        """ Return the random salt of the cache directory, creating it
+        the first time. """
+        if self._salt is None:
+            path = os.path.join(self.dir.basedir, self.SALT_FILE)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                with open(path, 'rb') as f:
+                    self._salt = f.read()
+            else:
+                self._salt = os.urandom(16)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(self._salt)
+        return self._salt
+
+    def _user(self, auth):
+        if hasattr(auth, 'access_code'):
+            # identify OAuth sessions without storing the access code
+            return 'oauth:' + hashlib.sha1(auth.access_code).hexdigest()
+        # a session opened with another password is not reused
+        password = hmac.new(self._get_salt(), auth.password or '',
+                            hashlib.sha256).hexdigest()
+        return '%s:%s' % (auth.username, password)
+
+    def _path(self, service, host, port, auth):
+        key = json.dumps([service, host, port, self._user(auth)])
+        return os.path.join(self.dir.basedir, hashlib.sha1(key).hexdigest())
+
+    def get(self, service, host, port, auth):
+        """ Return the session of `auth` on the `service` of `host:port`
+        as a dictionary, or None if there is no unexpired one. """
+        path = self._path(service, host, port, auth)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+
+        if entry.get('expires') is not None and entry['expires'] <= self._clock():
+            logger.debug('cached session for %s on %s expired' % (service, host))
+            self._unlink(path)
+            return None
+        return entry
+
+    def put(self, service, host, port, auth, api_version, method,
+            headers=None, expires=None):
+        """ Store the session of `auth` on the `service` of `host:port`.
+
+        `headers` are the HTTP headers identifying the session, `expires`
+        the time at which the appliance ends it, if known.
+        """
+        deadline = self._clock() + self.lifetime
+        if expires is None or expires > deadline:
+            expires = deadline
+        entry = {
+            'api_version': api_version,
+            'method': method,
+            'headers': headers or {},
+            'expires': expires,
+            }
+
+        # the session headers are credentials, only the user can read them
+        path = self._path(service, host, port, auth)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp, path)
+
+    def remove(self, service, host, port, auth):
+        """ Forget the session of `auth` on the `service` of `host:port`. """
+        self._unlink(self._path(service, host, port, auth))
+
+    def clear(self):
+        """ Remove all the sessions from the cache """
+        for name in self.dir.get_files():
+            if name != self.SALT_FILE:
+                self._unlink(os.path.join(self.dir.basedir, name))
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
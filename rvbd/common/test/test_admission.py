@@ -0,0 +1,196 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common import admission
+from rvbd.common.admission import TokenBucket, Budget, AdmissionController
+from rvbd.common.connection import Connection
+from rvbd.common.test.test_connection import FakeServer
+from rvbd.shark._interfaces import Sample
+from rvbd.shark.viewutils import OutputMixer
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def test_rate(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(t):
+            waits.append(t)
+            now[0] += t
+
+        bucket = TokenBucket(2, burst=2)
+        bucket._clock = lambda: now[0]
+        bucket._sleep = sleep
+
+        for i in range(4):
+            bucket.acquire()
+        self.assertEqual(waits, [0.5, 0.5])
+
+        # tokens accumulate up to the burst
+        now[0] += 10
+        for i in range(3):
+            bucket.acquire()
+        self.assertEqual(waits, [0.5, 0.5, 0.5])
+
+
+class StreamOutput(object):
+    """ View output whose samples are streamed from `path` """
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+
+    def get_legend(self):
+        return [{'id': 'v', 'name': 'v', 'dimension': False}]
+
+    def get_iterdata(self):
+        for s in self.conn.json_request('GET', self.path, stream='samples'):
+            yield Sample(s['t'], s['vals'])
+
+
+class AdmissionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(10000)
+        self.server = FakeServer({'/data': '{}', '/jobs/1/packets': self.data})
+        self.conn = Connection(self.server.url)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        admission.remove_limits(self.server.url)
+        self.conn.conn.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def test_classify(self):
+        controller = AdmissionController()
+        self.assertEqual(controller.classify('POST', '/api/shark/5.0/views'), 'views')
+        self.assertEqual(controller.classify('GET', '/api/shark/5.0/views'), None)
+        self.assertEqual(controller.classify('POST', '/api/shark/5.0/jobs/1/exports'), 'exports')
+        self.assertEqual(controller.classify('GET', 'https://host/api/shark/5.0/clips/2/packets'),
+                         'downloads')
+        self.assertEqual(controller.classify('GET', '/api/shark/5.0/fs/a/b.pcap/download'),
+                         'downloads')
+
+    def test_max_inflight(self):
+        self.conn.set_limits(max_inflight=2)
+        hold = threading.Event()
+        for i in range(6):
+            self.server.httpd.responses['/data/%d' % i] = '{}'
+            self.server.httpd.hold['/data/%d' % i] = hold
+
+        def get(i):
+            self.conn.json_request('GET', '/data/%d' % i)
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(6)]
+        for t in threads:
+            t.start()
+        while len(self.server.httpd.requests) < 2:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        self.assertEqual(len(self.server.httpd.requests), 2)
+        hold.set()
+        for t in threads:
+            t.join()
+
+        stats = self.conn.admission_stats()['default']
+        self.assertEqual(stats['admitted'], 6)
+        self.assertEqual(stats['peak_inflight'], 2)
+        self.assertEqual(stats['inflight'], 0)
+        self.assertEqual(stats['wait_time']['count'], 6)
+        self.assertTrue(stats['wait_time']['max'] > 0)
+
+    def test_downloads(self):
+        controller = self.conn.set_limits(max_inflight=1, heavy={'downloads': 1})
+        for name in ('a', 'b'):
+            path = self.conn.download('/jobs/1/packets', os.path.join(self.dir, name))
+            self.assertEqual(open(path, 'rb').read(), self.data)
+        self.assertEqual(self.conn.json_request('GET', '/data'), {})
+
+        stats = controller.stats()
+        self.assertEqual(stats['downloads']['admitted'], 2)
+        self.assertEqual(stats['downloads']['inflight'], 0)
+        self.assertEqual(stats['default']['admitted'], 3)
+        self.assertEqual(stats['default']['inflight'], 0)
+
+        text = controller.to_prometheus(labels={'host': 'shark'})
+        self.assertTrue('flyscript_admission_wait_seconds_count{host="shark",'
+                        'budget="downloads"} 2' in text)
+        self.assertTrue('flyscript_admission_inflight{host="shark",'
+                        'budget="default"} 0' in text)
+
+    def test_json_stream(self):
+        self.server.httpd.responses['/items'] = '{"items": [1, 2, 3]}'
+        self.conn.set_limits(max_inflight=1)
+
+        # the request is admitted until the headers are received, the
+        # body can be read while other requests are sent
+        it = self.conn.json_request('GET', '/items', stream='items')
+        self.assertEqual(self.conn.admission_stats()['default']['inflight'], 0)
+        self.assertEqual(next(it), 1)
+        self.assertEqual(self.conn.json_request('GET', '/data'), {})
+        self.assertEqual(list(it), [2, 3])
+        self.assertEqual(self.conn.admission_stats()['default']['admitted'], 2)
+
+    def test_mixed_streams(self):
+        # the mixer keeps a stream open for each of its sources
+        self.conn.set_limits(max_inflight=2)
+        mixer = OutputMixer()
+        for i in range(4):
+            path = '/outputs/%d' % i
+            samples = [{'t': t, 'vals': [[i * 10 + t]]} for t in range(3)]
+            self.server.httpd.responses[path] = json.dumps({'samples': samples})
+            mixer.add_source(StreamOutput(self.conn, path))
+
+        data = [s.vals for s in mixer.get_iterdata(time_thresh=1)]
+        self.assertEqual(data, [[[t, 10 + t, 20 + t, 30 + t]] for t in range(3)])
+        stats = self.conn.admission_stats()['default']
+        self.assertEqual(stats['admitted'], 4)
+        self.assertEqual(stats['peak_inflight'], 1)
+        self.assertEqual(stats['inflight'], 0)
+
+    def test_nested(self):
+        budget = Budget(max_inflight=1)
+        outer = budget.acquire()
+        # a thread already admitted is not blocked by its own slot
+        inner = budget.acquire()
+        self.assertEqual(budget.inflight, 2)
+
+        # but other threads are
+        admitted = threading.Event()
+
+        def acquire():
+            budget.release(budget.acquire())
+            admitted.set()
+
+        t = threading.Thread(target=acquire)
+        t.start()
+        self.assertFalse(admitted.wait(0.1))
+        budget.release(inner)
+        self.assertFalse(admitted.wait(0.1))
+        # admissions can be released by any thread
+        threading.Thread(target=budget.release, args=(outer,)).start()
+        self.assertTrue(admitted.wait(5))
+        t.join()
+        self.assertEqual(budget.inflight, 0)
+        self.assertEqual(budget._holders, {})
+
+    def test_unlimited(self):
+        self.assertEqual(self.conn.admission_stats(), None)
+        self.assertEqual(self.conn.json_request('GET', '/data'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.connection import Connection
+from rvbd.common.exceptions import RvbdHTTPException
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send each response at once rather than line by line
+    wbufsize = -1
+
+    def setup(self):
+        self.server.connections += 1
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        server = self.server
+        rng = self.headers.get('Range')
+        server.requests.append((self.path, rng))
+        if self.path in server.hold:
+            server.hold[self.path].wait(5)
+
+        body = server.responses.get(self.path)
+        headers = [('Content-Type', 'application/json')]
+        drop = False
+        if body is None:
+            self.send_response(404)
+            body = json.dumps({'error_id': 'NOT_FOUND', 'error_text': self.path})
+        elif rng and server.accept_ranges:
+            start, end = [int(x) for x in rng.split('=')[1].split('-')]
+            headers.append(('Content-Range', 'bytes %d-%d/%d' % (start, end, len(body))))
+            body = body[start:end + 1]
+            self.send_response(206)
+            if start in server.drop:
+                server.drop.remove(start)
+                drop = True
+        else:
+            self.send_response(200)
+        if server.accept_ranges:
+            headers.append(('Accept-Ranges', 'bytes'))
+        if not server.unframed:
+            headers.append(('Content-Length', str(len(body))))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+
+        if drop:
+            # simulate a dropped connection in the middle of the body
+            self.wfile.write(body[:len(body) / 2])
+            self.close_connection = 1
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients may close a response without reading it
+        pass
+
+
+class FakeServer(object):
+    """ HTTP server on localhost serving fixed responses by path """
+    def __init__(self, responses, accept_ranges=False):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeHandler)
+        self.httpd.responses = responses
+        self.httpd.accept_ranges = accept_ranges
+        self.httpd.requests = []
+        self.httpd.connections = 0
+        # if True, bodies are sent without length on kept alive
+        # connections, which can only be read until a timeout
+        self.httpd.unframed = False
+        # starts of the ranges whose connection is dropped
+        self.httpd.drop = set()
+        # events by path, the response is only sent once they are set
+        self.httpd.hold = {}
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_port
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JsonRequestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = {'samples': [{'t': i, 'vals': [[str(i)]]} for i in range(1000)],
+                    'legend': []}
+        self.server = FakeServer({'/data': json.dumps(self.doc)})
+        self.conn = Connection(self.server.url)
+
+    def tearDown(self):
+        self.conn.conn.close()
+        self.server.stop()
+
+    def test_stream(self):
+        it = self.conn.json_request('GET', '/data', stream='samples')
+        self.assertEqual(list(it), self.doc['samples'])
+        self.assertEqual(self.conn.json_request('GET', '/data'), self.doc)
+
+    def test_coalesce(self):
+        self.server.httpd.hold['/data'] = hold = threading.Event()
+        results = []
+
+        def get():
+            results.append(self.conn.json_request('GET', '/data'))
+
+        threads = [threading.Thread(target=get) for i in range(5)]
+        for t in threads:
+            t.start()
+        while not self.conn._inflight:
+            time.sleep(0.01)
+        # let the other threads join the request in flight
+        time.sleep(0.1)
+        hold.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.server.httpd.requests, [('/data', None)])
+        self.assertEqual(results, [self.doc] * 5)
+        # each caller gets its own objects
+        self.assertEqual(len(set(id(r) for r in results)), 5)
+
+        self.conn.json_request('GET', '/data')
+        self.assertEqual(len(self.server.httpd.requests), 2)
+
+    def test_stats(self):
+        self.assertEqual(self.conn.stats(), None)
+        stats = self.conn.enable_stats()
+        self.server.httpd.responses['/reports/12/queries/345.json'] = '{}'
+        self.server.httpd.responses['/reports/67/queries/890.json'] = '{}'
+
+        self.conn.json_request('GET', '/reports/12/queries/345.json')
+        self.conn.json_request('GET', '/reports/67/queries/890.json')
+        self.assertRaises(RvbdHTTPException, self.conn.json_request,
+                          'GET', '/reports/1/queries/2.json')
+        list(self.conn.json_request('GET', '/data', stream='samples'))
+
+        d = stats.to_dict()
+        self.assertEqual(sorted(d), ['GET /data', 'GET /reports/{id}/queries/{id}.json'])
+        endpoint = d['GET /reports/{id}/queries/{id}.json']
+        self.assertEqual(endpoint['statuses'], {'200': 2, '404': 1})
+        self.assertEqual(endpoint['latency']['count'], 3)
+        self.assertEqual(d['GET /data']['response_bytes'],
+                         len(self.server.httpd.responses['/data']))
+
+        text = stats.to_prometheus()
+        self.assertTrue('flyscript_requests_total{host="%s",method="GET",'
+                        'endpoint="/reports/{id}/queries/{id}.json",status="404"} 1'
+                        % self.server.url in text)
+        self.assertTrue('flyscript_request_duration_seconds_count{host="%s",method="GET",'
+                        'endpoint="/data"} 1' % self.server.url in text)
+
+
+class DownloadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(300000)
+        self.server = FakeServer({'/file': self.data}, accept_ranges=True)
+        self.conn = Connection(self.server.url)
+        self.conn.DOWNLOAD_SEGMENT_SIZE = 64 * 1024
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'file.pcap')
+
+    def tearDown(self):
+        self.conn.conn.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def ranges(self):
+        return [r for p, r in self.server.httpd.requests if r is not None]
+
+    def check_file(self):
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(os.path.exists(self.path + '.progress'))
+
+    def test_parallel(self):
+        progress = []
+        self.conn.download('/file', self.path, parallel=4,
+                           progress=lambda done, total: progress.append((done, total)))
+        self.check_file()
+        # the first request only asks for one byte
+        self.assertEqual(self.ranges()[0], 'bytes=0-0')
+        self.assertEqual(len(self.ranges()), 6)
+        self.assertEqual(progress[-1], (len(self.data), len(self.data)))
+
+    def test_retry(self):
+        self.server.httpd.drop.add(65536)
+        self.conn.download('/file', self.path, parallel=2)
+        self.check_file()
+        # the dropped range continues where it stopped
+        self.assertTrue('bytes=%d-131071' % (65536 + 32768) in self.ranges())
+
+    def test_resume(self):
+        self.conn.DOWNLOAD_RETRIES = 0
+        self.server.httpd.drop.add(131072)
+        self.assertRaises(IOError, self.conn.download, '/file', self.path,
+                          resume=True)
+        with open(self.path + '.progress') as f:
+            self.assertEqual(json.load(f)['done'], [0, 1])
+
+        self.server.httpd.requests = []
+        self.conn.download('/file', self.path, resume=True)
+        self.check_file()
+        self.assertEqual(self.ranges(), ['bytes=0-0',
+                                         'bytes=131072-196607',
+                                         'bytes=196608-262143',
+                                         'bytes=262144-299999'])
+
+    def test_no_ranges(self):
+        self.server.httpd.accept_ranges = False
+        self.conn.download('/file', self.path, parallel=4, resume=True)
+        self.check_file()
+        # the whole file is returned in response to the first request
+        self.assertEqual(self.server.httpd.requests, [('/file', 'bytes=0-0')])
+
+    def test_empty(self):
+        self.server.httpd.responses['/empty'] = ''
+        self.conn.download('/empty', self.path, parallel=4)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), '')
+        self.assertEqual(self.server.httpd.requests, [('/empty', 'bytes=0-0'),
+                                                      ('/empty', None)])
+
+    def test_keep_alive(self):
+        for i in range(20):
+            self.conn.download('/file', self.path, overwrite=True)
+            self.check_file()
+        self.assertEqual(self.server.httpd.connections, 1)
+
+    def test_unframed(self):
+        self.server.httpd.accept_ranges = False
+        self.server.httpd.unframed = True
+        for i in range(3):
+            self.conn.download('/file', self.path, overwrite=True)
+            self.check_file()
+        self.assertTrue(self.conn._close_downloads)
+        # the first response was discarded and requested again
+        self.assertEqual(len(self.server.httpd.requests), 4)
+        self.assertEqual(self.server.httpd.connections, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.futures import Future, Executor, as_completed, wait_all
+from rvbd.common.scheduler import BackgroundScheduler, PollOperation
+from rvbd.common.exceptions import CompletionTimeout
+
+import time
+import unittest
+import threading
+
+
+class FutureTests(unittest.TestCase):
+
+    def test_result(self):
+        f = Future()
+        seen = []
+        f.add_done_callback(seen.append)
+        self.assertFalse(f.done())
+        self.assertRaises(CompletionTimeout, f.result, 0.01)
+        f.set_result(3)
+        self.assertEqual(f.result(), 3)
+        self.assertEqual(seen, [f])
+
+    def test_exception(self):
+        f = Future()
+        f.set_exception(ValueError('boom'))
+        self.assertRaises(ValueError, f.result)
+        self.assertTrue(isinstance(f.exception(), ValueError))
+
+    def test_then(self):
+        f = Future()
+        inner = Future()
+        g = f.then(lambda x: x + 1).then(lambda x: inner).then(lambda x: x * 2)
+        f.set_result(1)
+        self.assertFalse(g.done())
+        inner.set_result(5)
+        self.assertEqual(g.result(), 10)
+
+        f = Future()
+        g = f.then(lambda x: 1 / x)
+        f.set_result(0)
+        self.assertRaises(ZeroDivisionError, g.result)
+
+
+class ExecutorTests(unittest.TestCase):
+
+    def test_bounded_workers(self):
+        executor = Executor(max_workers=3)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work(i):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return i
+
+        futures = [executor.submit(work, i) for i in range(20)]
+        self.assertEqual(wait_all(futures), range(20))
+        self.assertEqual(sorted(f.result() for f in as_completed(futures)),
+                         range(20))
+        self.assertTrue(running[1] <= 3)
+        self.assertTrue(len(executor._threads) <= 3)
+
+
+class BackgroundSchedulerTests(unittest.TestCase):
+
+    def test_submit(self):
+        scheduler = BackgroundScheduler(min_interval=0.001, max_interval=0.01)
+        counts = [0, 0]
+
+        def poll(i):
+            counts[i] += 1
+            return counts[i] >= 3, None, None
+
+        f1 = scheduler.submit(PollOperation(lambda: poll(0)))
+        f2 = scheduler.submit(PollOperation(lambda: poll(1), timeout=0))
+        self.assertEqual(f1.result(5).polls, 3)
+        self.assertRaises(CompletionTimeout, f2.result, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.http_pool import ConnectionPool, NoFreeConnections
+from rvbd.common.connection import Connection
+from rvbd.common.test.test_connection import FakeServer
+
+import json
+import time
+import socket
+import unittest
+import threading
+
+
+class FakeConn(object):
+    def __init__(self, sock=None):
+        self.sock = sock
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.pool = ConnectionPool(pool_size=2, idle_timeout=60,
+                                   connection_factory=FakeConn)
+        self.pool._clock = lambda: self.now
+
+    def test_bounded(self):
+        self.pool._clock = time.time
+        c1 = self.pool.acquire()
+        c2 = self.pool.acquire()
+        self.assertRaises(NoFreeConnections, self.pool.acquire, 0.01)
+
+        acquired = []
+        t = threading.Thread(target=lambda: acquired.append(self.pool.acquire(5)))
+        t.start()
+        self.pool.release(c1)
+        t.join()
+        self.assertEqual(acquired, [c1])
+
+        stats = self.pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['busy']), (2, 1, 2))
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['utilisation'], 1.0)
+
+    def test_reap(self):
+        c1 = self.pool.acquire()
+        self.pool.release(c1)
+        self.now = 30
+        c2 = self.pool.acquire()
+        self.assertTrue(c2 is c1)
+        self.pool.release(c2)
+        self.now = 100
+        self.pool.reap()
+        self.assertTrue(c1.closed)
+        self.assertFalse(self.pool.acquire() is c1)
+        self.assertEqual(self.pool.stats()['reaped'], 1)
+
+    def test_stale(self):
+        a, b = socket.socketpair()
+        try:
+            c1 = FakeConn(a)
+            self.pool._connection_factory = lambda: c1
+            self.assertTrue(self.pool.acquire() is c1)
+            self.pool.release(c1)
+            # the server closed the connection
+            b.close()
+            self.pool._connection_factory = FakeConn
+            c2 = self.pool.acquire()
+            self.assertFalse(c2 is c1)
+            self.assertTrue(c1.closed)
+            self.assertEqual(self.pool.stats()['stale'], 1)
+        finally:
+            a.close()
+
+    def test_discard(self):
+        c1 = self.pool.acquire()
+        self.pool.release(c1, reuse=False)
+        self.assertTrue(c1.closed)
+        self.assertEqual(self.pool.stats()['busy'], 0)
+
+
+class MountedPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer({'/data': json.dumps({'x': 1})})
+        self.conn = Connection(self.server.url)
+
+    def tearDown(self):
+        self.conn.conn.close()
+        self.server.stop()
+
+    def test_threads(self):
+        # every request goes to the wire
+        self.conn.COALESCE_GETS = False
+        self.conn.mount_pool(pool_size=2)
+        errors = []
+
+        def work():
+            try:
+                for i in range(10):
+                    self.conn.json_request('GET', '/data')
+            except Exception, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(self.server.httpd.connections <= 2)
+        stats = self.conn.pool_stats()
+        self.assertTrue(stats['peak_busy'] <= 2)
+        self.assertEqual(stats['busy'], 0)
+        self.assertEqual(stats['created'] + stats['reused'], 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.instrumentation import (Histogram, RequestRecord,
+                                         RequestStats, url_template)
+
+import json
+import unittest
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def test_url_template(self):
+        self.assertEqual(url_template('https://host/api/profiler/1.0/reports/123/queries/45.json?x=1'),
+                         '/api/profiler/1.0/reports/{id}/queries/{id}.json')
+        self.assertEqual(url_template('/api/shark/4.0/views/admin1234/data/6f1c2a3e'),
+                         '/api/shark/4.0/views/{id}/data/{id}')
+        self.assertEqual(url_template('/api/shark/4.0/fs/admin/trace.pcap'),
+                         '/api/shark/4.0/fs/admin/trace.pcap')
+
+    def test_histogram(self):
+        h = Histogram(bounds=(1, 2, 4))
+        self.assertEqual(h.quantile(0.5), None)
+        for v in (0.5, 0.5, 1.5, 3, 10):
+            h.observe(v)
+        self.assertEqual(h.counts, [2, 1, 1, 1])
+        self.assertEqual(h.quantile(0.4), 1)
+        self.assertEqual(h.quantile(0.8), 4)
+        self.assertEqual(h.quantile(1), 10)
+
+    def test_export(self):
+        stats = RequestStats(labels={'host': 'a"b'}, bounds=(0.1, 1))
+        for latency, status in ((0.05, 200), (0.5, 200), (5, 500)):
+            stats(RequestRecord('GET', '/x/1', '/x/{id}', status, 10, 100,
+                                latency / 2, latency))
+
+        d = json.loads(stats.to_json())
+        self.assertEqual(d['GET /x/{id}']['statuses'], {'200': 2, '500': 1})
+        self.assertEqual(d['GET /x/{id}']['response_bytes'], 300)
+
+        lines = stats.to_prometheus().splitlines()
+        labels = 'host="a\\"b",method="GET",endpoint="/x/{id}"'
+        for line in ['# TYPE flyscript_request_duration_seconds histogram',
+                     'flyscript_request_duration_seconds_bucket{%s,le="0.1"} 1' % labels,
+                     'flyscript_request_duration_seconds_bucket{%s,le="1"} 2' % labels,
+                     'flyscript_request_duration_seconds_bucket{%s,le="+Inf"} 3' % labels,
+                     'flyscript_request_duration_seconds_count{%s} 3' % labels,
+                     'flyscript_requests_total{%s,status="500"} 1' % labels,
+                     'flyscript_request_bytes_total{%s} 30' % labels]:
+            self.assertTrue(line in lines, line)
+
+
+if __name__ == '__main__':
+    unittest.main()
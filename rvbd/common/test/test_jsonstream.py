@@ -0,0 +1,59 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.jsonstream import iter_array
+
+import json
+import unittest
+
+
+def chunked(s, size):
+    return [s[i:i + size] for i in range(0, len(s), size)]
+
+
+DOC = {
+    'legend': [{'type': 'INT32', 'name': u'caf\xe9'}],
+    'samples': [{'t': 1365000000000000000 + i, 'p': i,
+                 'vals': [[str(i * 12345), 1.5e-3 * i, None, True]]}
+                for i in range(20)],
+    'totals': [123456789, -0.25, u'\u2603 "quoted" \\ ,]}'],
+    }
+
+
+class IterArrayTests(unittest.TestCase):
+
+    def test_chunk_sizes(self):
+        s = json.dumps(DOC, indent=1)
+        expected = json.loads(s)
+        for size in (1, 2, 3, 7, 64, len(s)):
+            fields = {}
+            items = list(iter_array(chunked(s, size), 'samples', fields))
+            self.assertEqual(items, expected['samples'])
+            self.assertEqual(fields['legend'], expected['legend'])
+            self.assertEqual(fields['totals'], expected['totals'])
+
+    def test_numbers_across_chunks(self):
+        s = '{"data": [12345, 6.0e10, -7]}'
+        for size in range(1, len(s)):
+            self.assertEqual(list(iter_array(chunked(s, size), 'data')),
+                             [12345, 6.0e10, -7])
+
+    def test_empty(self):
+        self.assertEqual(list(iter_array([], 'data')), [])
+        self.assertEqual(list(iter_array(['{}'], 'data')), [])
+        self.assertEqual(list(iter_array(['{"data": []}'], 'data')), [])
+        self.assertEqual(list(iter_array(['{"data": null}'], 'data')), [])
+        self.assertEqual(list(iter_array(['{"other": [1]}'], 'data')), [])
+
+    def test_truncated(self):
+        s = '{"data": [1, 2, {"a": '
+        self.assertRaises(ValueError, list, iter_array(chunked(s, 4), 'data'))
+        self.assertRaises(ValueError, list, iter_array(['[1, 2]'], 'data'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.scheduler import CompletionScheduler, PollOperation, wait_for
+from rvbd.common.exceptions import CompletionTimeout
+
+import unittest
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_scheduler(clock, **kwargs):
+    scheduler = CompletionScheduler(**kwargs)
+    scheduler._clock = clock.time
+    scheduler._sleep = clock.sleep
+    return scheduler
+
+
+def linear_job(clock, duration, report_progress=True):
+    """ Return a poll function for a job progressing linearly from
+    now until `duration` seconds later, and the list of poll times """
+    start = clock.time()
+    polls = []
+
+    def poll():
+        polls.append(clock.time() - start)
+        progress = min(1.0, (clock.time() - start) / duration)
+        return progress >= 1.0, (progress if report_progress else None), None
+
+    return poll, polls
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_progress_estimate(self):
+        scheduler = make_scheduler(self.clock, min_interval=0.1, max_interval=100)
+        poll, polls = linear_job(self.clock, 60)
+        op = scheduler.add(PollOperation(poll, 'job'))
+        scheduler.wait()
+
+        self.assertTrue(op.done)
+        self.assertEqual(op.error, None)
+        # the first two status requests give the rate, the third one
+        # is sent when the job is expected to be done
+        self.assertEqual(len(polls), 3)
+        self.assertAlmostEqual(polls[-1], 60)
+
+    def test_remaining_seconds(self):
+        scheduler = make_scheduler(self.clock, min_interval=0.1, max_interval=100)
+        start = self.clock.time()
+
+        def poll():
+            remaining = max(0, start + 30 - self.clock.time())
+            return remaining == 0, None, remaining
+
+        op = scheduler.add(PollOperation(poll))
+        scheduler.wait()
+        self.assertEqual(op.polls, 2)
+
+    def test_backoff(self):
+        scheduler = make_scheduler(self.clock, min_interval=1, max_interval=8,
+                                   backoff=2)
+        poll, polls = linear_job(self.clock, 40, report_progress=False)
+        scheduler.add(PollOperation(poll))
+        scheduler.wait()
+
+        intervals = [b - a for a, b in zip(polls, polls[1:])]
+        self.assertEqual(intervals[:4], [2, 4, 8, 8])
+        self.assertTrue(polls[-1] >= 40)
+
+    def test_many_operations(self):
+        scheduler = make_scheduler(self.clock, max_interval=1000)
+        done = []
+        ops = []
+        all_polls = []
+        for i in range(50):
+            poll, polls = linear_job(self.clock, 10 + i)
+            all_polls.append(polls)
+            ops.append(scheduler.add(PollOperation(poll, i,
+                                                   on_done=done.append)))
+        scheduler.wait()
+
+        self.assertEqual(done, ops)
+        self.assertTrue(sum(len(p) for p in all_polls) <= 50 * 3)
+
+    def test_timeout(self):
+        scheduler = make_scheduler(self.clock, max_interval=100)
+        poll, polls = linear_job(self.clock, 60)
+        op = scheduler.add(PollOperation(poll, timeout=20))
+        self.assertRaises(CompletionTimeout, scheduler.wait)
+        self.assertTrue(isinstance(op.error, CompletionTimeout))
+        self.assertAlmostEqual(polls[-1], 20)
+
+    def test_overall_timeout(self):
+        scheduler = make_scheduler(self.clock, max_interval=100)
+        fast, fast_polls = linear_job(self.clock, 5)
+        slow, slow_polls = linear_job(self.clock, 60)
+        ops = [scheduler.add(PollOperation(fast)),
+               scheduler.add(PollOperation(slow))]
+        scheduler.wait(timeout=30, raise_errors=False)
+
+        self.assertEqual(ops[0].error, None)
+        self.assertTrue(isinstance(ops[1].error, CompletionTimeout))
+        self.assertAlmostEqual(slow_polls[-1], 30)
+
+    def test_poll_error(self):
+        progress = []
+
+        def poll():
+            raise ValueError('boom')
+
+        op = PollOperation(poll, on_progress=progress.append)
+        self.assertRaises(ValueError, wait_for, [op])
+        self.assertTrue(op.done)
+        self.assertEqual(progress, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.service import Service, UserAuth
+from rvbd.common.api_helpers import APIVersion
+from rvbd.common.test.test_connection import ThreadingHTTPServer
+from rvbd.common.test.test_sessioncache import LoginHandler
+
+import unittest
+import threading
+
+
+class DiscoveryHandler(LoginHandler):
+    """ Only answers the services request once the auth_info request
+    has been received, or after a timeout """
+
+    def do_GET(self):
+        if self.path == '/api/common/1.0/services':
+            self.server.concurrent = self.server.auth_info.wait(2)
+        elif self.path == '/api/common/1.0/auth_info':
+            self.server.auth_info.set()
+        LoginHandler.do_GET(self)
+
+
+class ReauthenticationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), LoginHandler)
+        self.httpd.requests = []
+        self.httpd.session = 0
+        thread = threading.Thread(target=self.httpd.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.service = Service('test', 'http://127.0.0.1:%d' % self.httpd.server_port,
+                               auth=UserAuth('admin', 'secret'),
+                               versions=[APIVersion('1.0')])
+
+    def tearDown(self):
+        self.service.conn.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_single_flight(self):
+        # the session ends on the device
+        self.httpd.session += 1
+        del self.httpd.requests[:]
+        errors = []
+
+        def ping(i):
+            try:
+                self.service.conn.json_request('GET', '/api/test/1.0/ping/%d' % i)
+            except Exception, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=ping, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        logins = [r for r in self.httpd.requests if r[0] == 'POST']
+        self.assertEqual(len(logins), 1)
+        self.assertEqual(self.httpd.session, 3)
+
+
+class DiscoveryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), DiscoveryHandler)
+        self.httpd.requests = []
+        self.httpd.session = 0
+        self.httpd.auth_info = threading.Event()
+        self.httpd.concurrent = None
+        thread = threading.Thread(target=self.httpd.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.service = None
+
+    def tearDown(self):
+        if self.service is not None:
+            self.service.conn.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_concurrent(self):
+        self.service = Service('test', 'http://127.0.0.1:%d' % self.httpd.server_port,
+                               auth=UserAuth('admin', 'secret'),
+                               versions=[APIVersion('1.0')])
+        self.assertTrue(self.httpd.concurrent)
+        self.assertEqual(str(self.service.api_version), '1.0')
+        self.assertEqual(self.service.conn.conn.headers['Cookie'], 'session=1')
+        self.assertEqual(sorted(self.httpd.requests),
+                         [('GET', '/api/common/1.0/auth_info'),
+                          ('GET', '/api/common/1.0/services'),
+                          ('POST', '/api/common/1.0/login')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+from rvbd.common.service import Service, UserAuth, OAuth, Auth
+from rvbd.common.api_helpers import APIVersion
+from rvbd.common.sessioncache import SessionCache
+from rvbd.common.test.test_connection import ThreadingHTTPServer
+
+import os
+import json
+import stat
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+
+
+class LoginHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serves the common resources of a device with cookie based
+    authentication, and a /api/test/1.0/ping resource requiring a
+    valid session """
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def reply(self, status, body, headers=()):
+        body = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(('GET', self.path))
+        if self.path == '/api/common/1.0/services':
+            self.reply(200, [{'id': 'test', 'versions': ['1.0']}])
+        elif self.path == '/api/common/1.0/auth_info':
+            self.reply(200, {'supported_methods': ['BASIC', 'COOKIE']})
+        elif self.headers.get('Cookie') != 'session=%d' % server.session:
+            self.reply(401, {'error_id': 'AUTH_INVALID_SESSION',
+                             'error_text': 'invalid session'})
+        else:
+            self.reply(200, {})
+
+    def do_POST(self):
+        server = self.server
+        server.requests.append(('POST', self.path))
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server.session += 1
+        self.reply(200, {}, [('Set-Cookie', 'session=%d' % server.session)])
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = SessionCache(directory=self.dir)
+        self.auth = UserAuth('admin', 'secret')
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), LoginHandler)
+        self.httpd.requests = []
+        self.httpd.session = 0
+        self.host = 'http://127.0.0.1:%d' % self.httpd.server_port
+        thread = threading.Thread(target=self.httpd.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.services = []
+
+    def tearDown(self):
+        for service in self.services:
+            service.conn.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.dir)
+
+    def service(self, auth=None):
+        service = Service('test', self.host, auth=auth or self.auth,
+                          versions=[APIVersion('1.0')],
+                          session_cache=self.cache)
+        self.services.append(service)
+        return service
+
+    def session_file(self):
+        names = [name for name in os.listdir(self.dir)
+                 if name != SessionCache.SALT_FILE]
+        self.assertEqual(len(names), 1)
+        return os.path.join(self.dir, names[0])
+
+    def ping(self, service):
+        return service.conn.json_request('GET', '/api/test/1.0/ping')
+
+    def test_resume(self):
+        first = self.service()
+        self.assertEqual(len(self.httpd.requests), 3)
+        self.ping(first)
+
+        del self.httpd.requests[:]
+        second = self.service()
+        self.assertEqual(self.httpd.requests, [])
+        self.assertEqual(str(second.api_version), '1.0')
+        self.ping(second)
+        self.assertEqual(self.httpd.requests, [('GET', '/api/test/1.0/ping')])
+
+        # the password is not stored, and only the user can read the session
+        path = self.session_file()
+        self.assertTrue('secret' not in open(path).read())
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0600)
+
+    def test_rejected(self):
+        self.service()
+        # the session ends on the device
+        self.httpd.session += 1
+
+        service = self.service()
+        self.ping(service)
+        self.assertEqual(self.httpd.session, 3)
+        self.assertEqual(self.httpd.requests[-2:],
+                         [('POST', '/api/common/1.0/login'),
+                          ('GET', '/api/test/1.0/ping')])
+
+        # the new session was stored
+        del self.httpd.requests[:]
+        self.ping(self.service())
+        self.assertEqual(self.httpd.requests, [('GET', '/api/test/1.0/ping')])
+
+    def test_expiry(self):
+        now = [1000.0]
+        self.cache._clock = lambda: now[0]
+        self.service()
+
+        now[0] += SessionCache.DEFAULT_LIFETIME + 1
+        del self.httpd.requests[:]
+        self.service()
+        self.assertEqual(len(self.httpd.requests), 3)
+
+    def test_keys(self):
+        self.service()
+        other = UserAuth('monitor', 'secret')
+        self.assertEqual(self.cache.get('test', self.host, None, other), None)
+        # the session is not reused with a wrong password
+        other = UserAuth('admin', 'guess')
+        self.assertEqual(self.cache.get('test', self.host, None, other), None)
+        self.assertEqual(self.cache.get('test', self.host, 443, self.auth), None)
+        self.assertEqual(self.cache.get('test', self.host, None, OAuth('code')), None)
+
+        entry = self.cache.get('test', self.host, None, self.auth)
+        self.assertEqual(entry['method'], Auth.COOKIE)
+        self.assertEqual(entry['headers'], {'Cookie': 'session=1'})
+
+        self.cache.clear()
+        self.assertEqual(os.listdir(self.dir), [SessionCache.SALT_FILE])
+
+    def test_basic(self):
+        auth = UserAuth('admin', 'secret', method=Auth.BASIC)
+        self.service(auth=auth)
+        del self.httpd.requests[:]
+
+        service = self.service(auth=auth)
+        self.assertEqual(self.httpd.requests, [])
+        self.assertTrue(service.conn.conn.headers['Authorization'].startswith('Basic '))
+        self.assertTrue('secret' not in open(self.session_file()).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
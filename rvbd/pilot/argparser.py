@@ -8,6 +8,7 @@
 
 import string
 import rvbd.shark
+from rvbd.common.service import UserAuth
 
 from rvbd.shark._filter import *
 import rvbd.common.time
@@ -63,16 +64,19 @@ class ArgParser(object):
         '''returns the password of the user that applied the selected view.'''
         return self._pass
 
-    def connect_to_shark(self):
+    def connect_to_shark(self, session_cache=None):
         '''Connect to the Shark specified in the command line
 
+        `session_cache` is an optional ``rvbd.common.sessioncache.SessionCache``
+        used to reuse the session of a previous invocation of the script.
+
         Returns the correspondent ``rvbd.shark.Shark`` object.'''
         if self._shark == None:
             self._shark = rvbd.shark.Shark(self.get_shark_addr(), 
                                     port=self.get_shark_port(), 
-                                    username=self.get_username(), 
-                                    password=self.get_pass(),
-                                    force_ssl=True)
+                                    auth=UserAuth(self.get_username(),
+                                                  self.get_pass()),
+                                    session_cache=session_cache)
         
         return self._shark
     
@@ -15,11 +15,13 @@ class APIGroup(object):
 
 
 class API1Group(APIGroup):
-    def _json_request(self, urlpath, method='GET', data=None, params=None):
+    def _json_request(self, urlpath, method='GET', data=None, params=None,
+                      stream=None):
         """Issue the given API request via JSON
         """
         return self.service.conn.json_request(method, self.uri_prefix + urlpath,
-                                              body=data, params=params)
+                                              body=data, params=params,
+                                              stream=stream)
 
 
 class Common(API1Group):
@@ -80,12 +82,12 @@ class Report(API1Group):
     def status(self, rid):
         return self._json_request('/reports/{0}.json'.format(rid))
 
-    def queries(self, rid, qid=None, params=None):
+    def queries(self, rid, qid=None, params=None, stream=None):
         uri = '/reports/{0}/queries'.format(rid)
         if qid is not None:
             uri += '/' + str(qid)
         uri += '.json'
-        return self._json_request(uri, params=params)
+        return self._json_request(uri, params=params, stream=stream)
 
     def delete(self, rid):
         return self._json_request('/reports/{0}.json'.format(rid),
@@ -24,7 +24,8 @@ class ProfilerApp(Application):
     def setup(self):
         self.profiler = rvbd.profiler.Profiler(self.host,
                                                port=self.options.port,
-                                               auth=self.auth)
+                                               auth=self.auth,
+                                               session_cache=self.session_cache)
 
     def validate_args(self):
         if len(self.args) < 1:
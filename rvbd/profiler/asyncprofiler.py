@@ -0,0 +1,72 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Asynchronous interface to a Profiler appliance, for scripts that work
+with many Profilers at the same time.  Reports are waited for by a
+single background thread, and requests are run by a shared pool of
+worker threads.
+"""
+
+import inspect
+
+from rvbd.common.service import AsyncService
+from rvbd.common.scheduler import default_scheduler
+from rvbd.profiler.profiler import Profiler
+
+__all__ = ['AsyncProfiler']
+
+
+class AsyncProfiler(AsyncService):
+    """Asynchronous interface to a Profiler, all methods return a
+    rvbd.common.futures.Future.  Use `AsyncProfiler.connect()` to create
+    the Profiler object without blocking, the Profiler itself is
+    available as `service`.
+    """
+    service_class = Profiler
+
+    def __init__(self, profiler, executor=None, scheduler=None):
+        super(AsyncProfiler, self).__init__(profiler, executor=executor)
+        self.scheduler = scheduler or default_scheduler()
+
+    def run_report(self, report_class, *args, **kwargs):
+        """Create a report of class `report_class` (for example
+        TrafficSummaryReport) and run it, passing the arguments to its
+        `run()` method.
+
+        The returned future completes with the report once it is
+        complete, or fails if this takes longer than the optional
+        keyword argument `timeout` in seconds.
+        """
+        timeout = kwargs.pop('timeout', None)
+        report = report_class(self.service)
+
+        if 'sync' not in inspect.getargspec(report.run).args:
+            # reports made of several queries wait for each of them
+            return self._submit(report.run, *args, **kwargs).then(lambda res: report)
+
+        kwargs['sync'] = False
+
+        def started(res):
+            op = report.completion(timeout=timeout)
+            return self.scheduler.submit(op).then(lambda op: report)
+
+        return self._submit(report.run, *args, **kwargs).then(started)
+
+    def poll(self, report):
+        """Return the status of `report`, see Report.status()"""
+        return self._submit(report.status)
+
+    def fetch(self, report, *args, **kwargs):
+        """Return the data of `report`, see the `get_data()` method of
+        the report for the arguments."""
+        return self._submit(report.get_data, *args, **kwargs)
+
+    def delete_report(self, report):
+        """Delete `report` from the Profiler"""
+        return self._submit(report.delete)
@@ -16,6 +16,7 @@ like creating running reports.
 import types
 import logging
 import itertools
+import threading
 
 from rvbd.common.utils import DictObject
 from rvbd.common.api_helpers import APIVersion
@@ -24,6 +25,7 @@ from rvbd.profiler import _constants
 from rvbd.common._fs import FlyscriptDir
 from rvbd.profiler._types import Column, AreaContainer, ColumnContainer
 from rvbd.common.exceptions import RvbdException
+from rvbd.common import futures
 
 import rvbd.common.service
 
@@ -42,8 +44,11 @@ class Profiler(rvbd.common.service.Service):
     """The Profiler class is the main interface to interact with a Profiler
     Appliance.  Primarily this provides an interface to reporting.
     """
+    # number of column requests sent at the same time when retrieving
+    # the columns of several triplets
+    COLUMN_FETCH_WORKERS = 8
 
-    def __init__(self, host, port=None, auth=None):
+    def __init__(self, host, port=None, auth=None, session_cache=None):
         """Establishes a connection to a Profiler appliance.
 
         `host` is the name or IP address of the Profiler to connect to
@@ -60,12 +65,17 @@ class Profiler(rvbd.common.service.Service):
                  if unspecified, this will use the latest version supported
                  by both this implementation and the Profiler appliance.
 
+        `session_cache` is an optional rvbd.common.sessioncache.SessionCache
+                 used to reuse the session of a previous process.  Cached
+                 sessions are left open on logout.
+
         See the base [Service](common.html#service) class for more information
         about additional functionality supported.
         """
         super(Profiler, self).__init__("profiler", host, port,
                                        auth=auth,
-                                       versions=[APIVersion("1.0")])
+                                       versions=[APIVersion("1.0")],
+                                       session_cache=session_cache)
 
         self.api = _api1.Handler(self)
 
@@ -74,10 +84,24 @@ class Profiler(rvbd.common.service.Service):
         self.centricities = _constants.centricities
 
         self._info = None
+        # the areas are fetched on first access
+        self._areas = None
+        self._areas_dict = None
+
+        # the column catalog: Column objects interned by key and id,
+        # and the keys of the columns of each triplet that was loaded
+        self._columns_lock = threading.Lock()
+        self._columns_by_key = dict()
+        self._columns_by_id = dict()
+        self._triplet_keys = dict()
+        self._search_cache = dict()
+        self._columns = None
+        # True once the columns of every triplet are loaded, and the
+        # keys or ids that were not found in the whole catalog
+        self._catalog_loaded = False
+        self._unknown_columns = set()
 
         self._load_file_caches()
-        self.columns = ColumnContainer(self._unique_columns())
-        self.areas = AreaContainer(self._areas_dict.iteritems())
 
     def _load_file_caches(self):
         """Load and unroll locally cached files
@@ -92,29 +116,47 @@ class Profiler(rvbd.common.service.Service):
         if self._columns_file.data is None:
             self._columns_file.data = dict()
 
+        for _hash, columns in self._columns_file.data.items():
+            self._columns_file.data[_hash] = self._index_columns(_hash, columns)
+
+    def _load_areas(self):
+        """Load the areas from the local cache file, retrieving them
+        from the server the first time
+        """
+        if self._areas_dict is not None:
+            return
+
         areas_filename = 'areas-' + self.version + '.json'
         self._areas_file = self._fs_data.get_config(areas_filename)
         if self._areas_file.data is None:
             self._areas_file.data = self.api.report.areas()
             self._areas_file.write()
 
-        self._verify_cache()
         self._areas_dict = dict(self._genareas(self._areas_file.data))
 
-    def _verify_cache(self, refetch=False):
-        """Retrieve all the possible combinations of
-        groupby, centricity and realm using the rule shown under
-        the search_columns method.
-
-        By default, all these permutations will be checked against
-        the current local cache file, and any missing keys will be
-        retrieved from the server.
+    @property
+    def areas(self):
+        """Container of the areas available on the Profiler"""
+        if self._areas is None:
+            self._load_areas()
+            self._areas = AreaContainer(self._areas_dict.iteritems())
+        return self._areas
 
-        `refetch` will force an api refresh call from the machine even if
-                the data can be found in local cache.
+    @property
+    def columns(self):
+        """Container of all the columns available on the Profiler,
+        retrieving the columns missing from the local cache on first
+        access"""
+        if self._columns is None:
+            self._verify_cache()
+            self._columns = ColumnContainer(self._columns_by_key.values())
+        return self._columns
+
+    def _triplets(self):
+        """Return all the possible combinations of realm, centricity
+        and groupby, using the rule shown under the search_columns method.
         """
-        columns = list()
-        write = False
+        triplets = list()
         for realm in self.realms:
             if realm == 'traffic_flow_list' or realm == 'identity_list':
                 centricities = ['hos']
@@ -132,39 +174,109 @@ class Profiler(rvbd.common.service.Service):
                     groupbys = ['hos']
 
                 for groupby in groupbys:
-                    _hash = make_hash(realm, centricity, groupby)
-                    if refetch or _hash not in self._columns_file.data:
-                        logger.debug('Requesting columns for triplet: %s, %s, %s' % (realm, centricity, groupby))
-                        api_call = self.api.report.columns(realm,
-                                                           centricity, groupby)
-                        # generate Column objects from json
-                        api_columns = self._gencolumns(api_call)
-                        # compare against objects we've already retrieved
-                        existing = [c for c in columns if c in api_columns]
-                        new_columns = [c for c in api_columns if c not in existing]
-                        columns.extend(new_columns)
-
-                        # add them to data, preserving existing objects
-                        self._columns_file.data[_hash] = existing + new_columns
-                        write = True
-        if write:
+                    triplets.append((realm, centricity, groupby))
+        return triplets
+
+    def _verify_cache(self, refetch=False):
+        """Make sure the columns of all the triplets are loaded.
+
+        Triplets missing from the local cache file are retrieved from
+        the server, several at a time.
+
+        `refetch` will force an api refresh call from the machine even if
+                the data can be found in local cache.
+        """
+        if refetch:
+            with self._columns_lock:
+                self._columns_by_key.clear()
+                self._columns_by_id.clear()
+                self._triplet_keys.clear()
+                self._search_cache.clear()
+                self._columns = None
+                self._columns_file.data = dict()
+                self._catalog_loaded = False
+        if not self._catalog_loaded:
+            self._load_triplets(self._triplets(), force=refetch)
+            self._catalog_loaded = True
+
+    def _index_columns(self, _hash, columns):
+        """Intern `columns` and record their keys as the columns of the
+        triplet `_hash`.  Returns the interned Column objects.
+        """
+        interned = list()
+        for c in columns:
+            c = self._columns_by_key.setdefault(c.key, c)
+            self._columns_by_id.setdefault(c.id, c)
+            interned.append(c)
+        self._triplet_keys[_hash] = frozenset(c.key for c in interned)
+        self._search_cache.clear()
+        self._unknown_columns.clear()
+        self._columns = None
+        return interned
+
+    def _load_triplets(self, triplets, force=False):
+        """Retrieve the columns of the `triplets` that are not loaded
+        yet from the server and add them to the catalog and to the
+        local cache file.
+        """
+        with self._columns_lock:
+            missing = [t for t in triplets
+                       if make_hash(*t) not in self._triplet_keys]
+            if not missing:
+                return
+
+            results = self._fetch_columns(missing, force)
+            for triplet, api_call in zip(missing, results):
+                _hash = make_hash(*triplet)
+                # generate Column objects from json
+                columns = self._index_columns(_hash, self._gencolumns(api_call))
+                self._columns_file.data[_hash] = columns
             self._columns_file.write()
 
-    def _unique_columns(self):
-        """Pull unique columns from _columns_file (a dict of lists)
+    def _fetch_columns(self, triplets, force=False):
+        """Request the columns of each of `triplets`, running up to
+        COLUMN_FETCH_WORKERS requests at the same time.  Returns the
+        json columns in the order of `triplets`.
         """
-        def unique(seq):
-            seen = set()
-            for lst in seq:
-                for c in lst:
-                    if c in seen:
-                        continue
-                    seen.add(c)
-                    yield c
-        return list(unique(self._columns_file.data.values()))
+        pending = list(reversed(triplets))
+        results = dict()
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    triplet = pending.pop()
+                logger.debug('Requesting columns for triplet: %s, %s, %s' % triplet)
+                results[triplet] = self.api.report.columns(*triplet, force=force)
+
+        nworkers = min(self.COLUMN_FETCH_WORKERS, len(triplets))
+        futures.wait_all([futures.spawn(work) for i in range(nworkers)])
+        return [results[t] for t in triplets]
+
+    def _find_column(self, cname, index):
+        """Return the column with key or id `cname` from `index`, loading
+        the triplets missing from the catalog if it is not found.  Returns
+        None if there is no such column.
+        """
+        try:
+            return index[cname]
+        except KeyError:
+            pass
+
+        if cname in self._unknown_columns:
+            return None
+        self._verify_cache()
+        column = index.get(cname)
+        if column is None:
+            with self._columns_lock:
+                self._unknown_columns.add(cname)
+        return column
 
     def _parse_area(self, area):
         if isinstance(area, types.StringTypes):
+            self._load_areas()
             if area not in self._areas_dict:
                 raise ValueError('{0} is not a valid area type for this'
                                  'profiler'.format(area))
@@ -205,11 +317,9 @@ class Profiler(rvbd.common.service.Service):
         """
         res = list()
         if groupby:
-            groupby_cols = self.search_columns(groupbys=[groupby])
+            groupby_keys = self._search_keys(groupbys=[groupby])
         else:
-            groupby_cols = None
-
-        colnames = set(c.key for c in self.columns)
+            groupby_keys = None
 
         for column in columns:
             if isinstance(column, types.StringTypes):
@@ -222,13 +332,14 @@ class Profiler(rvbd.common.service.Service):
                     # likely json-dict
                     cname = column['strid'].lower()[3:]
 
-            if cname not in colnames:
+            col = self._find_column(cname, self._columns_by_key)
+            if col is None:
                 raise RvbdException('{0} is not a valid column '
                                     'for this profiler'.format(column))
-            if groupby_cols and cname not in groupby_cols:
+            if groupby_keys and cname not in groupby_keys:
                 raise RvbdException('{0} is not a valid column '
                                     'for groupby {1}'.format(column, groupby))
-            res.append(self.columns[cname])
+            res.append(col)
                 
         return res
 
@@ -237,7 +348,12 @@ class Profiler(rvbd.common.service.Service):
 
         `ids` is a list of integer ids
         """
-        res = [self.columns[i] for i in ids]
+        res = list()
+        for i in ids:
+            col = self._find_column(i, self._columns_by_id)
+            if col is None:
+                raise KeyError(i)
+            res.append(col)
         return res
 
     def search_columns(self, realms=None, centricities=None, groupbys=None):
@@ -254,9 +370,16 @@ class Profiler(rvbd.common.service.Service):
             | identity_list               | hos        | thu                  |
             |-----------------------------+------------+----------------------|
 
+        Only the columns of the matching triplets are retrieved from the
+        server, if they are not in the local cache.
         """
-        result = set()
+        keys = self._search_keys(realms, centricities, groupbys)
+        return [self._columns_by_key[k] for k in keys]
 
+    def _search_keys(self, realms=None, centricities=None, groupbys=None):
+        """Return the set of the keys of the columns found by
+        search_columns().
+        """
         if realms is None:
             realms = self.realms
         if centricities is None:
@@ -264,22 +387,31 @@ class Profiler(rvbd.common.service.Service):
         if groupbys is None:
             groupbys = self.groupbys.values()
 
-        datakeys = self._columns_file.data.keys()
-        search_keys = [make_hash(*p) for p in itertools.product(realms,
-                                                                centricities,
-                                                                groupbys)]
+        search = (tuple(realms), tuple(centricities), tuple(groupbys))
+        with self._columns_lock:
+            try:
+                return self._search_cache[search]
+            except KeyError:
+                pass
+
+        search_keys = set(make_hash(*p) for p in itertools.product(*search))
+        triplets = [t for t in self._triplets() if make_hash(*t) in search_keys]
+        self._load_triplets(triplets)
 
-        keys = [k for k in datakeys if k in search_keys]
-        for key in keys:
-            result.update(x for x in self._columns_file.data[key])
-        return list(result)
+        with self._columns_lock:
+            result = set()
+            for t in triplets:
+                result.update(self._triplet_keys[make_hash(*t)])
+            result = frozenset(result)
+            self._search_cache[search] = result
+        return result
 
     def logout(self):
         """Issue logout command to profiler machine.
         """
-        if self.conn:
+        if self.conn and self.session_cache is None:
             try:
                 self.api.common.logout()
             except AttributeError:
                 pass
-            super(Profiler, self).logout()
+        super(Profiler, self).logout()
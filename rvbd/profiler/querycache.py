@@ -0,0 +1,125 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+The results of a Profiler report over a time frame that ended a while
+ago do not change, so they can be saved and reused instead of having
+the Profiler compute them again.
+
+A QueryCache is passed to the `run()` method of a report to enable this:
+
+    cache = QueryCache()
+    report = TrafficSummaryReport(profiler)
+    report.run('hos', columns, timefilter=timefilter, cache=cache)
+
+The first time a report is run, the data of its queries is saved on
+disk (in the flyscript directory) as it is retrieved.  Afterwards, the
+same report is served from the cache without being created on the
+Profiler, as long as the same data is requested.  Reports whose time
+frame ends less than `min_age` seconds ago are never cached.
+"""
+
+import json
+import time
+import hashlib
+import logging
+
+from rvbd.common._fs import FlyscriptCache
+from rvbd.common.connection import Connection
+
+__all__ = ['QueryCache']
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache(object):
+    """ On-disk cache of the data of Profiler reports over past
+    time frames.
+
+    `max_size` is the size of the cache in bytes, when it is exceeded
+    the least recently used reports are removed.
+
+    `min_age` is the number of seconds the time frame of a report must
+    have ended for the report to be cached, so that the Profiler has
+    received all the flows of the time frame.
+
+    `directory` overrides the location of the cache, by default it
+    is in the flyscript directory of the user.
+    """
+    DEFAULT_SIZE = 256 * 2**20
+    DEFAULT_MIN_AGE = 60 * 60
+
+    def __init__(self, max_size=DEFAULT_SIZE, min_age=DEFAULT_MIN_AGE,
+                 directory=None):
+        # the data is mostly made of repeated strings, compress it
+        self._store = FlyscriptCache('Profiler', 'queries', max_size=max_size,
+                                     directory=directory, compress=True)
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        self._clock = time.time
+
+    def clear(self):
+        """ Remove all the reports from the cache """
+        self._store.clear()
+
+    def make_key(self, profiler, to_post):
+        """ Return the key of the report created with the request body
+        `to_post`, or None if it cannot be cached. """
+        end = to_post['criteria']['time_frame']['end']
+        if end > self._clock() - self.min_age:
+            return None
+
+        definition = {
+            'host': profiler.host,
+            'version': profiler.version,
+            'report': to_post,
+            }
+        s = json.dumps(definition, sort_keys=True, cls=Connection.JsonEncoder)
+        return hashlib.sha1(s).hexdigest()
+
+    def lookup(self, key):
+        """ Return the CachedReport `key`, or None """
+        if self._store.has(key):
+            try:
+                queries = self._store.get(key, 'queries.pcl')
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                logger.debug('query cache hit for %s' % key)
+                return CachedReport(self, key, queries)
+
+        self.misses += 1
+        return None
+
+    def add(self, key, queries):
+        """ Save the description of the `queries` of a complete report
+        and return its CachedReport. """
+        self._store.put(key, 'queries.pcl', queries)
+        return CachedReport(self, key, queries)
+
+
+class CachedReport(object):
+    """ The data of one report stored in a QueryCache """
+    def __init__(self, cache, key, queries):
+        self.cache = cache
+        self.key = key
+        self.queries = queries
+
+    def _name(self, index, params):
+        s = json.dumps([index, params], sort_keys=True)
+        return 'data-%s.pcl' % hashlib.sha1(s).hexdigest()
+
+    def get_data(self, index, params):
+        """ Return the data of query number `index` for the request
+        parameters `params`, raises KeyError if it is not in the cache. """
+        return self.cache._store.get(self.key, self._name(index, params))
+
+    def put_data(self, index, params, querydata):
+        self.cache._store.put(self.key, self._name(index, params), querydata)
@@ -12,17 +12,21 @@ access to running reports and retrieving data from a Profiler.
 """
 
 import logging
+import inspect
 import re
-import time
 import cStringIO as StringIO
+from collections import deque, namedtuple, OrderedDict
+from itertools import izip
 
 from rvbd.profiler.filters import TimeFilter, TrafficFilter
 from rvbd.common.timeutils import (parse_timedelta, datetime_to_seconds, 
-                                   timedelta_total_seconds)
+                                   timedelta_total_seconds, sec_string_to_datetime)
 from rvbd.common.utils import RecursiveUpdateDict
-from rvbd.common.exceptions import RvbdException
+from rvbd.common.exceptions import RvbdException, CompletionTimeout
+from rvbd.common.scheduler import PollOperation, CompletionScheduler, wait_for
 
-__all__ = ['TrafficSummaryReport',
+__all__ = ['ReportBatch',
+           'TrafficSummaryReport',
            'TrafficOverallTimeSeriesReport',
            'TrafficFlowListReport',
            'WANSummaryReport',
@@ -32,6 +36,63 @@ __all__ = ['TrafficSummaryReport',
 logger = logging.getLogger(__name__)
 
 
+def _is_float_column(column):
+    return (column.json['type'] == 'float' or
+            column.json['type'] in 'reltime' or
+            column.json['rate'] == 'opt')          # profiler bug, %reduct columns labeled as ints
+
+
+def _to_float(x):
+    try:
+        return float(x)
+    except ValueError:
+        return x
+
+
+def _to_float_or_nan(x):
+    try:
+        return float(x)
+    except ValueError:
+        return float('nan')
+
+
+def _compile_row_converter(legend):
+    """Return a function converting a row of query data to native
+    values according to the columns in `legend`.
+
+    Rows are converted into new lists, the rows passed in are left
+    untouched.
+    """
+    converters = []
+    for column in legend:
+        if _is_float_column(column):
+            converters.append(_to_float)
+        elif column.json['type'] == 'int':
+            converters.append(int)
+        else:
+            converters.append(None)
+
+    if not any(converters):
+        return list
+
+    converters = [c or (lambda x: x) for c in converters]
+
+    def convert_row(row):
+        return [c(x) for c, x in izip(converters, row)]
+    return convert_row
+
+
+def _compile_columnar_converter(column):
+    """Return a tuple (dtype, converter) describing how `column` is
+    stored by `Query.get_columnar()`.
+    """
+    if _is_float_column(column):
+        return 'float64', _to_float_or_nan
+    elif column.json['type'] == 'int':
+        return 'int64', int
+    return 'object', lambda x: x
+
+
 class Query(object):
     """This class represents a profiler query instance.
     """
@@ -61,6 +122,7 @@ class Query(object):
         self.querydata = None
         self.data = None
         self.data_selected_columns = None
+        self._converters = {}
 
     def get_legend(self, columns=None):
         if columns:
@@ -69,22 +131,22 @@ class Query(object):
             return self.selected_columns
         return self.available_columns
 
-    def _to_native(self, row):
-        legend = self.get_legend()
-        for i, x in enumerate(row):
-            if (legend[i].json['type'] == 'float' or
-                legend[i].json['type'] in 'reltime' or
-                legend[i].json['rate'] == 'opt'):          # profiler bug, %reduct columns labeled as ints
-                try:
-                    row[i] = float(x)
-                except ValueError:
-                    pass
-            elif legend[i].json['type'] == 'int':
-                row[i] = int(x)
-        return row
+    def _get_converter(self, columns=None):
+        """Return the row converter for `columns`, or for the legend
+        of this query if not given, compiling it on first use.
+        """
+        legend = columns or self.get_legend()
+        key = tuple(col.id for col in legend)
+        try:
+            return self._converters[key]
+        except KeyError:
+            convert = _compile_row_converter(legend)
+            self._converters[key] = convert
+            return convert
 
-    def _get_querydata(self, columns=None):
-        """Get the query data.
+    def _get_query_columns(self, columns=None):
+        """Return the columns to request and the matching request
+        parameters.
         """
         if columns:
             columns = self.report.profiler.get_columns(columns)
@@ -93,42 +155,134 @@ class Query(object):
         elif self.custom_columns:
             columns = self.available_columns
 
-        #if we already got this data do not get it again
-        changed = (self.data_selected_columns is None or
-                   self.data_selected_columns != columns)
-        if not changed:
-            return
-
         if columns:
             params = {"columns": (",".join(str(col.id)
                                            for col in columns))}
         else:
             params = None
+        return columns, params
 
-        self.querydata = self.report.profiler.api.report.queries(self.report.id,
-                                                                 self.id,
-                                                                 params=params)
+    def _get_querydata(self, columns=None):
+        """Get the query data.
+        """
+        columns, params = self._get_query_columns(columns)
+
+        #if we already got this data do not get it again
+        changed = (self.data_selected_columns is None or
+                   self.data_selected_columns != columns)
+        if not changed:
+            return
+
+        cached = self.report._cached
+        querydata = None
+        if cached is not None:
+            index = self.report.queries.index(self)
+            try:
+                querydata = cached.get_data(index, params)
+            except KeyError:
+                # served from the cache, but not with these columns
+                self.report._create_uncached()
+
+        if querydata is None:
+            querydata = self.report.profiler.api.report.queries(self.report.id,
+                                                                self.id,
+                                                                params=params)
+            if cached is not None:
+                cached.put_data(index, params, querydata)
+
+        self.querydata = querydata
         self.data = self.querydata['data']
         self.data_selected_columns = columns
         logger.debug(
             'Retrieved query data for '
             'query id {0} and column {1}'.format(self.id, columns))
 
+    def _get_rows(self, columns=None):
+        """Return the columns of the data and an iterable on its rows,
+        either the data retrieved by get_data() or a stream, unless
+        the report is cached.
+        """
+        columns, params = self._get_query_columns(columns)
+        if self.report._cached is not None:
+            # the data is read from and saved in the cache as a whole
+            self._get_querydata(columns)
+            rows = self.data
+        elif (self.data_selected_columns is not None and
+                self.data_selected_columns == columns):
+            rows = self.data
+        else:
+            rows = self.report.profiler.api.report.queries(self.report.id,
+                                                           self.id,
+                                                           params=params,
+                                                           stream='data')
+        return columns, rows
+
     def get_iterdata(self, columns=None):
         """Iterate over the query data
+
+        Unless the data has already been retrieved by get_data(), the
+        rows are decoded as they are received and are not kept.
         """
-        self._get_querydata(columns)
-        for row in self.data:
-            yield self._to_native(row)
+        columns, rows = self._get_rows(columns)
+        convert = self._get_converter(columns)
+        for row in rows:
+            yield convert(row)
 
     def get_data(self, columns=None):
-        return list(self.get_iterdata(columns))
+        self._get_querydata(columns)
+        convert = self._get_converter(self.data_selected_columns)
+        return [convert(row) for row in self.data]
 
     def get_totals(self, columns=None):
         """Return the totals associated with the requested columns.
         """
         self._get_querydata(columns)
-        return self._to_native(self.querydata['totals'])
+        convert = self._get_converter(self.data_selected_columns)
+        return convert(self.querydata['totals'])
+
+    def get_columnar(self, columns=None):
+        """Return the query data as NumPy arrays, one per column in
+        legend order, instead of a list of rows.  This requires the
+        `numpy` package.
+
+        Integer columns are returned in `int64` arrays and float,
+        time and rate columns in `float64` arrays, values that are not
+        numbers being stored as NaN.  Any other column is returned in
+        an `object` array.  The conversion is done a column at a time
+        by NumPy rather than for every value.
+        """
+        import numpy
+
+        columns, rows = self._get_rows(columns)
+        legend = columns or self.get_legend()
+        if not isinstance(rows, list):
+            rows = list(rows)
+        values = zip(*rows) if rows else [()] * len(legend)
+
+        arrays = []
+        for column, vals in zip(legend, values):
+            dtype, convert = _compile_columnar_converter(column)
+            try:
+                array = numpy.array(vals, dtype=dtype)
+            except ValueError:
+                # some values need converting one by one
+                array = numpy.array([convert(v) for v in vals], dtype=dtype)
+            arrays.append(array)
+        return arrays
+
+    def get_dataframe(self, columns=None):
+        """Return the query data as a pandas DataFrame, with one column
+        per legend entry named after its key.  The columns are built from
+        get_columnar(), see its documentation for their types.  This
+        requires the `pandas` package.
+        """
+        import pandas as pd
+
+        columns, _ = self._get_query_columns(columns)
+        legend = columns or self.get_legend()
+        arrays = self.get_columnar(columns)
+        keys = [col.key for col in legend]
+        return pd.DataFrame(dict(zip(keys, arrays)), columns=keys)
         
     def all_columns(self):
         """Returns all the columns available for this query.
@@ -140,6 +294,187 @@ class Query(object):
         return self.available_columns
 
 
+# realms whose rows are independent of the time frame they were computed
+# over, so that the rows of consecutive time ranges are concatenated
+# rather than merged
+_CONCATENATED_REALMS = ('traffic_overall_time_series',
+                        'traffic_flow_list',
+                        'identity_list')
+
+
+def _split_timefilter(timefilter, seconds):
+    """Split `timefilter` into consecutive TimeFilters at the multiples
+    of `seconds` since the Unix epoch.
+    """
+    start = datetime_to_seconds(timefilter.start)
+    end = datetime_to_seconds(timefilter.end)
+    bounds = [start]
+    t = (start // seconds + 1) * seconds
+    while t < end:
+        bounds.append(t)
+        t += seconds
+    bounds.append(end)
+    return [TimeFilter(sec_string_to_datetime(t0), sec_string_to_datetime(t1))
+            for t0, t1 in zip(bounds[:-1], bounds[1:])]
+
+
+def _merge_rule(column):
+    """Return how the values of data column `column` computed over
+    consecutive time ranges are merged: 'sum' for totals, 'max' for
+    peaks, 'rate' for averages per second, or None if they cannot be
+    merged (such as averages of response times or percentiles).
+    """
+    if column.json['type'] not in ('int', 'float'):
+        return None
+    words = column.key.split('_')
+    if 'total' in words:
+        return 'sum'
+    if 'peak' in words:
+        return 'max'
+    if 'avg' in words and column.json['rate'] == 'persec':
+        return 'rate'
+    return None
+
+
+def _merge_rows(shard_rows, legend, weights):
+    """Merge the rows of the shards in `shard_rows` having the same key
+    column values, `weights` being the fraction of the whole time frame
+    covered by each shard.  Columns that cannot be merged are None.
+    """
+    rules = [None if col.iskey else _merge_rule(col) for col in legend]
+    keys = [i for i, col in enumerate(legend) if col.iskey]
+    merged = OrderedDict()
+    for weight, rows in zip(weights, shard_rows):
+        for row in rows:
+            key = tuple(row[i] for i in keys)
+            acc = merged.get(key)
+            if acc is None:
+                acc = merged[key] = [0 if rule in ('sum', 'rate') else None
+                                     for rule in rules]
+                for i in keys:
+                    acc[i] = row[i]
+            for i, rule in enumerate(rules):
+                x = row[i]
+                if rule is None or not isinstance(x, (int, long, float)):
+                    continue
+                if rule == 'sum':
+                    acc[i] += x
+                elif rule == 'rate':
+                    # a key missing from a shard had no traffic then
+                    acc[i] += x * weight
+                elif acc[i] is None or x > acc[i]:
+                    acc[i] = x
+    return merged.values()
+
+
+def _incomplete_keys(shard_rows, legend):
+    """Return the key column values of the rows that are missing from
+    some of the shards in `shard_rows`.
+    """
+    keys = [i for i, col in enumerate(legend) if col.iskey]
+    counts = OrderedDict()
+    for rows in shard_rows:
+        for key in set(tuple(row[i] for i in keys) for row in rows):
+            counts[key] = counts.get(key, 0) + 1
+    return [key for key, count in counts.iteritems()
+            if count < len(shard_rows)]
+
+
+class _ShardedQuery(object):
+    """The data of a report run as several reports over consecutive
+    time ranges, see SingleQueryReport.run().
+    """
+    def __init__(self, report, shards, weights, merge):
+        self.report = report
+        self.id = None
+        self.shards = [shard.get_query_by_index(0) for shard in shards]
+        self.weights = weights
+        self.merge = merge
+
+    def get_legend(self, columns=None):
+        return self.shards[0].get_legend(columns)
+
+    def _get_query_columns(self, columns=None):
+        return self.shards[0]._get_query_columns(columns)
+
+    def _legend(self, columns=None):
+        columns, _ = self._get_query_columns(columns)
+        return columns or self.get_legend()
+
+    def get_iterdata(self, columns=None):
+        if self.merge:
+            for row in self.get_data(columns):
+                yield row
+            return
+        for query in self.shards:
+            for row in query.get_iterdata(columns):
+                yield row
+
+    def get_data(self, columns=None):
+        if not self.merge:
+            return [row for query in self.shards
+                    for row in query.get_data(columns)]
+
+        legend = self._legend(columns)
+        shard_rows = [query.get_data(columns) for query in self.shards]
+        rows = _merge_rows(shard_rows, legend, self.weights)
+
+        incomplete = _incomplete_keys(shard_rows, legend)
+        if incomplete and self.report.incomplete_keys is None:
+            logger.warning("%d rows are missing from some time ranges, their "
+                           "values only cover the ranges that returned them"
+                           % len(incomplete))
+        self.report.incomplete_keys = incomplete
+
+        sort_col = self.report.sort_col
+        if sort_col is not None:
+            sort_col = self.report.profiler.get_columns([sort_col])[0]
+            if sort_col in legend and _merge_rule(sort_col) is not None:
+                i = legend.index(sort_col)
+                rows.sort(key=lambda row: row[i], reverse=True)
+        return rows
+
+    def get_totals(self, columns=None):
+        legend = self._legend(columns)
+        totals = _merge_rows([[query.get_totals(columns)] for query in self.shards],
+                             legend, self.weights)
+        # the key columns have no meaning in totals
+        return [None if col.iskey else x for col, x in zip(legend, totals[0])]
+
+    def get_columnar(self, columns=None):
+        import numpy
+
+        if not self.merge:
+            shards = [query.get_columnar(columns) for query in self.shards]
+            return [numpy.concatenate(arrays) for arrays in zip(*shards)]
+
+        legend = self._legend(columns)
+        rows = self.get_data(columns)
+        values = zip(*rows) if rows else [()] * len(legend)
+        arrays = []
+        for column, vals in zip(legend, values):
+            dtype, convert = _compile_columnar_converter(column)
+            try:
+                array = numpy.array(vals, dtype=dtype)
+            except (ValueError, TypeError):
+                # integer columns that could not be merged hold None,
+                # float columns get NaN instead
+                array = numpy.array(vals, dtype=object)
+            arrays.append(array)
+        return arrays
+
+    def get_dataframe(self, columns=None):
+        import pandas as pd
+
+        legend = self._legend(columns)
+        arrays = self.get_columnar(columns)
+        keys = [col.key for col in legend]
+        return pd.DataFrame(dict(zip(keys, arrays)), columns=keys)
+
+    def all_columns(self):
+        return self.shards[0].all_columns()
+
+
 class Report(object):
     """This class represents a Profiler report.  This class is normally not
     used directly, but instead via subclasses for specific report types.
@@ -172,6 +507,11 @@ class Report(object):
         self.query = None
         self.queries = list()
 
+        self.id = None
+        self.cache = None
+        self._cache_key = None
+        self._cached = None
+
     def __enter__(self):
         return self
 
@@ -180,7 +520,8 @@ class Report(object):
 
     def run(self, template_id,
             timefilter=None, resolution="auto",
-            query=None, trafficexpr=None, data_filter=None, sync=True):
+            query=None, trafficexpr=None, data_filter=None, sync=True,
+            cache=None):
         """Create the report on Profiler and begin running
         the report.  If the `sync` option is True, periodically
         poll until the report is complete, otherwise return
@@ -199,6 +540,11 @@ class Report(object):
         `data_filter` is a deprecated filter to run against report data
 
         `sync` if True, poll for status until the report is complete
+
+        `cache` is an optional rvbd.profiler.querycache.QueryCache.  If
+        it is specified and the time frame ended long enough ago, the
+        data of the report is saved in the cache as it is retrieved, and
+        a report that is already in the cache is not created on Profiler.
         """
 
         self.template_id = template_id
@@ -219,6 +565,9 @@ class Report(object):
         self.id = None
         self.queries = list()
         self.last_status = None
+        self.cache = cache
+        self._cache_key = None
+        self._cached = None
 
         if resolution not in ["auto", "1min", "15min", "hour",
                               "6hour", "day", "week", "month"]:
@@ -249,7 +598,22 @@ class Report(object):
 
         to_post = {"template_id": self.template_id,
                    "criteria": criteria}
+        self._to_post = to_post
+
+        if cache is not None:
+            self._cache_key = cache.make_key(self.profiler, to_post)
+            if self._cache_key is not None:
+                self._cached = cache.lookup(self._cache_key)
+                if self._cached is not None:
+                    logger.info("Report found in the query cache")
+                    return
+
+        self._create(to_post)
 
+        if sync:
+            self.wait_for_complete()
+
+    def _create(self, to_post):
         logger.debug("Posting JSON: %s" % to_post)
 
         response = self.profiler.api.report.reports(data=to_post)
@@ -263,36 +627,68 @@ class Report(object):
 
         logger.info("Created report %d" % self.id)
 
-        if sync:
-            self.wait_for_complete()
+    def _create_uncached(self):
+        """Run a report served from the cache on Profiler, to retrieve
+        data that is not in the cache.
+        """
+        if self.id is not None:
+            return
+        self._create(self._to_post)
+        self.wait_for_complete()
+
+        # the queries are the same as those of the cached report
+        data = self.profiler.api.report.queries(self.id)
+        for query, q in zip(self.queries, data):
+            query.id = q['id']
 
     def wait_for_complete(self, interval=1, timeout=600):
         """ Periodically checks report status and returns when 100% complete
+
+        Status requests are sent at least `interval` seconds apart, and
+        less often when the Profiler estimates that the report needs
+        more time.  Returns False if the report is not complete after
+        `timeout` seconds.
         """
-        complete = False
-        percent = 100
-        start = time.clock()
-        while (time.clock() - start) < timeout:
-            s = self.status()
+        last = {'percent': 100}
 
+        def on_progress(op):
+            s = self.last_status
             if s['status'] == 'completed':
-                logger.info("Report %d complete" % self.id)
-                complete = True
-                break
-
-            if int(s['percent']) != percent:
-                percent = s['percent']
+                return
+            if int(s['percent']) != last['percent']:
+                last['percent'] = int(s['percent'])
                 logger.info("Report %d %d%% complete, remaining %d" %
-                            (self.id, percent, s['remaining_seconds']))
+                            (self.id, last['percent'], s['remaining_seconds']))
 
-            time.sleep(interval)
+        op = self.completion(timeout=timeout, on_progress=on_progress)
+        wait_for([op], raise_errors=False,
+                 min_interval=interval, max_interval=max(interval, 5))
 
-        if not complete:
+        if isinstance(op.error, CompletionTimeout):
             logger.warning("Timed out waiting for report %d to complete,"
                            "last %d%% complete" %
-                           (self.id, (percent if percent else 0)))
+                           (self.id, (last['percent'] if last['percent'] else 0)))
+            return False
+        elif op.error is not None:
+            raise op.error
+
+        logger.info("Report %d complete" % self.id)
+        return True
+
+    def completion(self, timeout=None, on_progress=None, on_done=None):
+        """ Return an operation that completes when the report is
+        complete, to be waited for with rvbd.common.scheduler.wait_for()
+        or a CompletionScheduler, see rvbd.common.scheduler.Operation
+        for a description of the arguments.
+        """
+        def poll():
+            s = self.status()
+            if s['status'] == 'completed':
+                return True, 1.0, 0
+            return False, int(s['percent']) / 100.0, s.get('remaining_seconds')
 
-        return complete
+        return PollOperation(poll, 'report %s' % self.id, timeout=timeout,
+                             on_progress=on_progress, on_done=on_done)
 
     def status(self):
         """Query for the status of report.  If the report has not been run,
@@ -306,6 +702,11 @@ class Report(object):
 
         `remaining_seconds` is an estimate of the time left until complete
         """
+        if self.id is None and self._cached is not None:
+            self.last_status = {'status': 'completed', 'percent': 100,
+                                'remaining_seconds': 0}
+            return self.last_status
+
         if not self.id:
             return None
 
@@ -314,22 +715,29 @@ class Report(object):
         return self.last_status
 
     def _load_queries(self, column_ids=None):
-        if not self.id:
+        if not self.id and self._cached is None:
             raise ValueError("No id set, must run a report"
                              "or attach to an existing report first")
 
-        data = self.profiler.api.report.queries(self.id)
+        if self._cached is not None:
+            data = self._cached.queries
+        else:
+            data = self.profiler.api.report.queries(self.id)
+            if (self._cache_key is not None and self.last_status is not None and
+                    self.last_status['status'] == 'completed'):
+                self._cached = self.cache.add(self._cache_key, data)
+
         for query in data:
             self.queries.append(Query(self, query, column_ids, self.custom_columns))
 
-        logger.debug("Report %d: loaded %d queries"
+        logger.debug("Report %s: loaded %d queries"
                      % (self.id, len(data)))
 
     def get_query_by_index(self, index=0):
         """Returns the query_id by specifying the index,
         default to 0 (the first query)
         """
-        if not self.id:
+        if not self.id and self._cached is None and not self.queries:
             raise ValueError("No id set, must run a report"
                              "or attach to an existing report first")
 
@@ -338,7 +746,7 @@ class Report(object):
 
         query = self.queries[index]
 
-        logger.debug("Retrieving query data for report %d, query %s" %
+        logger.debug("Retrieving query data for report %s, query %s" %
                      (self.id, query.id))
 
         return query
@@ -366,6 +774,22 @@ class Report(object):
         query = self.get_query_by_index(index)
         return query.get_data(columns)
 
+    def get_columnar(self, index=0, columns=None):
+        """Retrieve the data for this report as NumPy arrays, one per
+        column, see Query.get_columnar().  If `columns` is specified,
+        restrict the data to the list of requested columns.
+        """
+        query = self.get_query_by_index(index)
+        return query.get_columnar(columns)
+
+    def get_dataframe(self, index=0, columns=None):
+        """Retrieve the data for this report as a pandas DataFrame, see
+        Query.get_dataframe().  If `columns` is specified, restrict the
+        data to the list of requested columns.
+        """
+        query = self.get_query_by_index(index)
+        return query.get_dataframe(columns)
+
     def get_totals(self, index=0, columns=None):
         """Retrieve the totals for this report. If `columns` is specified,
         restrict the totals to the list of requested columns.
@@ -375,12 +799,115 @@ class Report(object):
 
     def delete(self):
         """Issue a call to Profiler delete this report."""
+        if self.id is None and self._cached is not None:
+            return
         try:
             self.profiler.api.report.delete(self.id)
         except:
             pass
 
 
+# one of the results of ReportBatch.run(), `error` is the exception
+# raised while creating or waiting for `report`
+ReportResult = namedtuple('ReportResult', ['report', 'error'])
+
+
+class ReportBatch(object):
+    """Runs many reports on Profilers at the same time.
+
+    Reports are added with the arguments of their run() method, then
+    `run()` creates them and waits for all of them together, polling
+    each one according to the time the Profiler expects it to need.
+    Results are returned as soon as each report is complete, so that
+    its data can be fetched while the others are still running:
+
+        batch = ReportBatch()
+        for groupby in groupbys:
+            batch.add(TrafficSummaryReport(profiler),
+                      groupby=groupby, columns=columns, timefilter=timefilter)
+        for report, error in batch.run():
+            ...
+
+    At most `max_in_flight` reports are running at the same time (all
+    of them if None).  A report that is not complete after `timeout`
+    seconds fails with a CompletionTimeout.  Status requests are sent
+    between `min_interval` and `max_interval` seconds apart.
+    """
+    def __init__(self, max_in_flight=None, timeout=600,
+                 min_interval=1, max_interval=5):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.scheduler = CompletionScheduler(min_interval=min_interval,
+                                             max_interval=max_interval)
+        self._pending = deque()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, report, **kwargs):
+        """Add `report`, to be run with the keyword arguments `kwargs`
+        of its run() method.  Returns the report."""
+        if 'sync' not in inspect.getargspec(report.run).args:
+            # such as WAN reports, made of several reports waited for
+            # one after the other
+            raise ValueError('%s cannot be run asynchronously' %
+                             report.__class__.__name__)
+        kwargs['sync'] = False
+        self._pending.append((report, kwargs))
+        return report
+
+    def run(self):
+        """Generator creating the reports added to the batch, and
+        yielding a ReportResult for each one in completion order.  If
+        creating a report or waiting for it fails, `error` is the
+        exception that was raised, other reports are not affected.
+        Reports that time out are deleted, as are the reports created
+        but not returned yet if the generator is closed early.
+        """
+        scheduler = self.scheduler
+        ready = deque()
+        running = [0]
+
+        def submit():
+            while self._pending and (self.max_in_flight is None or
+                                     running[0] < self.max_in_flight):
+                report, kwargs = self._pending.popleft()
+                try:
+                    report.run(**kwargs)
+                except Exception, e:
+                    ready.append(ReportResult(report, e))
+                    continue
+
+                op = report.completion(timeout=self.timeout)
+                op.report = report
+                scheduler.add(op)
+                running[0] += 1
+
+        try:
+            while True:
+                submit()
+                if ready:
+                    result = ready.popleft()
+                else:
+                    op = scheduler.wait_next()
+                    if op is None:
+                        break
+                    running[0] -= 1
+                    result = ReportResult(op.report, op.error)
+                    if op.error is None:
+                        logger.info("Report %s complete" % op.report.id)
+                    elif isinstance(op.error, CompletionTimeout):
+                        logger.warning("Timed out waiting for report %s" %
+                                       op.report.id)
+                        op.report.delete()
+                yield result
+        finally:
+            # the caller stopped early, the reports still running are
+            # not wanted anymore
+            for op in scheduler.cancel():
+                op.report.delete()
+
+
 class MultiQueryReport(Report):
     """ Used to generate Profiler standard template reports
     """
@@ -392,7 +919,7 @@ class MultiQueryReport(Report):
         self.template_id = None
 
     def run(self, template_id, timefilter=None, trafficexpr=None,
-            data_filter=None, resolution="auto"):
+            data_filter=None, resolution="auto", cache=None):
         """
         The primary driver of these reports come from the `template_id` which
         defines the query sources.  Thus no query input or realm/centricity/groupby
@@ -405,6 +932,8 @@ class MultiQueryReport(Report):
         `resolution` is the data resolution (1min, 15min, etc.)
 
         `data_filter` is a deprecated filter to run against report data
+
+        `cache` is an optional rvbd.profiler.querycache.QueryCache
         """
         self.template_id = template_id
 
@@ -414,7 +943,8 @@ class MultiQueryReport(Report):
                                           query=None,
                                           trafficexpr=trafficexpr,
                                           data_filter=data_filter,
-                                          sync=True)
+                                          sync=True,
+                                          cache=cache)
 
     def get_query_names(self):
         """Return full name of each query in report
@@ -445,10 +975,16 @@ class SingleQueryReport(Report):
 
         super(SingleQueryReport, self).__init__(profiler)
 
+        # the reports run over each time range, in sharded mode
+        self.shards = None
+        self.unmerged_columns = list()
+        self.incomplete_keys = None
+
     def run(self, realm,
             groupby="hos", columns=None, sort_col=None,
             timefilter=None, trafficexpr=None, host_group_type="ByLocation",
-            resolution="auto", centricity="hos", area=None, data_filter=None, sync=True):
+            resolution="auto", centricity="hos", area=None, data_filter=None, sync=True,
+            cache=None, shard_duration=None, shards_in_flight=4):
         """
         `realm` is the type of query, this is automatically set by subclasses
 
@@ -473,6 +1009,27 @@ class SingleQueryReport(Report):
         `area` sets the appropriate scope for the report
 
         `data_filter` is a deprecated filter to run against report data
+
+        `cache` is an optional rvbd.profiler.querycache.QueryCache, see
+            `Report.run`
+
+        `shard_duration` splits `timefilter` into ranges of this duration
+            (a timedelta or a string such as '1 day'), aligned on multiples
+            of the duration, run as separate reports at most
+            `shards_in_flight` at a time.  The data of time series, flow
+            list and identity reports is returned in time order.  Rows of
+            other reports with the same keys are merged: totals are added,
+            peaks are the largest value and averages per second are
+            weighted by the duration of the ranges.  Other columns, such
+            as response times, cannot be merged, they are listed in
+            `unmerged_columns` and their values are None.  The rows are
+            those returned by each range, which may be limited to the top
+            rows: once the data is retrieved, `incomplete_keys` lists the
+            key column values of the rows missing from some ranges, whose
+            merged values only cover the ranges that returned them.
+            Sharded reports are always waited for, `sync` must be True.
+            `resolution` should be set since Profiler picks it from the
+            duration of each range otherwise.
         """
 
         # query related parameters
@@ -484,6 +1041,20 @@ class SingleQueryReport(Report):
         self.host_group_type = host_group_type
         self.area = area
 
+        self.shards = None
+        self.unmerged_columns = list()
+        self.incomplete_keys = None
+        if shard_duration is not None:
+            if not sync:
+                raise ValueError('sharded reports cannot be run asynchronously')
+            return self._run_sharded(
+                shard_duration, shards_in_flight,
+                realm=realm, groupby=groupby, columns=columns, sort_col=sort_col,
+                timefilter=timefilter, trafficexpr=trafficexpr,
+                host_group_type=host_group_type, resolution=resolution,
+                centricity=centricity, area=area, data_filter=data_filter,
+                cache=cache)
+
         self._column_ids = [x.id for x in
                             self.profiler.get_columns(self.columns, self.groupby)]
 
@@ -509,7 +1080,75 @@ class SingleQueryReport(Report):
                                            timefilter=timefilter, resolution=resolution,
                                            query=query, trafficexpr=trafficexpr,
                                            data_filter=data_filter,
-                                           sync=sync)
+                                           sync=sync, cache=cache)
+
+    def _run_sharded(self, shard_duration, shards_in_flight, **kwargs):
+        """Run the report as one report per time range, see run()."""
+        if isinstance(shard_duration, basestring):
+            shard_duration = parse_timedelta(shard_duration)
+        seconds = int(timedelta_total_seconds(shard_duration))
+
+        resolution = kwargs['resolution']
+        if resolution == 'month':
+            raise ValueError('reports with a monthly resolution cannot be sharded')
+        if resolution != 'auto':
+            resolutions = dict((v, k) for k, v in self.RESOLUTION_MAP.iteritems())
+            try:
+                res = resolutions[resolution]
+            except KeyError:
+                res = int(timedelta_total_seconds(parse_timedelta(resolution)))
+            if seconds % res:
+                raise ValueError('shard duration must be a multiple of '
+                                 'the resolution')
+
+        timefilter = kwargs.pop('timefilter')
+        if timefilter is None:
+            timefilter = TimeFilter.parse_range("last 5 min")
+        self.timefilter = timefilter
+        self.resolution = resolution
+        self.trafficexpr = kwargs['trafficexpr']
+        ranges = _split_timefilter(timefilter, seconds)
+
+        batch = ReportBatch(max_in_flight=shards_in_flight)
+        shards = [batch.add(SingleQueryReport(self.profiler), timefilter=tf, **kwargs)
+                  for tf in ranges]
+        logger.info("Running %d reports over %d second ranges" %
+                    (len(shards), seconds))
+        errors = [result.error for result in batch.run()
+                  if result.error is not None]
+        if errors:
+            for shard in shards:
+                shard.delete()
+            raise errors[0]
+
+        self.shards = shards
+        total = float(sum(datetime_to_seconds(tf.end) - datetime_to_seconds(tf.start)
+                          for tf in ranges))
+        weights = [(datetime_to_seconds(tf.end) - datetime_to_seconds(tf.start)) / total
+                   for tf in ranges]
+        merge = self.realm not in _CONCATENATED_REALMS
+        self.queries = [_ShardedQuery(self, shards, weights, merge)]
+
+        if merge:
+            self.unmerged_columns = [col for col in self.queries[0].get_legend()
+                                     if not col.iskey and _merge_rule(col) is None]
+            if self.unmerged_columns:
+                logger.warning("Columns %s cannot be merged across time ranges" %
+                               ', '.join(col.key for col in self.unmerged_columns))
+
+    def status(self):
+        if self.shards is not None:
+            self.last_status = {'status': 'completed', 'percent': 100,
+                                'remaining_seconds': 0}
+            return self.last_status
+        return super(SingleQueryReport, self).status()
+
+    def delete(self):
+        if self.shards is not None:
+            for shard in self.shards:
+                shard.delete()
+            return
+        super(SingleQueryReport, self).delete()
 
     def _load_queries(self):
         super(SingleQueryReport, self)._load_queries(self._column_ids)
@@ -529,6 +1168,16 @@ class SingleQueryReport(Report):
             columns = self.columns
         return super(SingleQueryReport, self).get_data(0, columns)
 
+    def get_columnar(self, columns=None):
+        if columns is None:
+            columns = self.columns
+        return super(SingleQueryReport, self).get_columnar(0, columns)
+
+    def get_dataframe(self, columns=None):
+        if columns is None:
+            columns = self.columns
+        return super(SingleQueryReport, self).get_dataframe(0, columns)
+
 
 class TrafficSummaryReport(SingleQueryReport):
     """
@@ -542,13 +1191,16 @@ class TrafficSummaryReport(SingleQueryReport):
 
     def run(self, groupby, columns, sort_col=None,
             timefilter=None, trafficexpr=None, host_group_type="ByLocation",
-            resolution="auto", centricity="hos", area=None, sync=True):
+            resolution="auto", centricity="hos", area=None, sync=True, cache=None,
+            shard_duration=None, shards_in_flight=4):
         """ See `SingleQueryReport` for a description of the arguments. """
         return super(TrafficSummaryReport, self).run(
             realm='traffic_summary',
             groupby=groupby, columns=columns, sort_col=sort_col,
             timefilter=timefilter, trafficexpr=trafficexpr, host_group_type=host_group_type,
-            resolution=resolution, centricity=centricity, area=area, sync=sync)
+            resolution=resolution, centricity=centricity, area=area, sync=sync,
+            cache=cache, shard_duration=shard_duration,
+            shards_in_flight=shards_in_flight)
 
 
 class TrafficOverallTimeSeriesReport(SingleQueryReport):
@@ -560,7 +1212,8 @@ class TrafficOverallTimeSeriesReport(SingleQueryReport):
 
     def run(self, columns,
             timefilter=None, trafficexpr=None,
-            resolution="auto", centricity="hos", area=None, sync=True):
+            resolution="auto", centricity="hos", area=None, sync=True, cache=None,
+            shard_duration=None, shards_in_flight=4):
         """
         See `SingleQueryReport` for a description of the arguments.  (Note that
         `sort_col`, `groupby`, and `host_group_type` are not applicable to 
@@ -570,7 +1223,9 @@ class TrafficOverallTimeSeriesReport(SingleQueryReport):
             realm='traffic_overall_time_series',
             groupby='tim', columns=columns, sort_col=None,
             timefilter=timefilter, trafficexpr=trafficexpr, host_group_type=None,
-            resolution=resolution, centricity=centricity, area=area, sync=sync)
+            resolution=resolution, centricity=centricity, area=area, sync=sync,
+            cache=cache, shard_duration=shard_duration,
+            shards_in_flight=shards_in_flight)
 
 
 class TrafficFlowListReport(SingleQueryReport):
@@ -581,17 +1236,20 @@ class TrafficFlowListReport(SingleQueryReport):
         super(TrafficFlowListReport, self).__init__(profiler)
 
     def run(self, columns, sort_col=None,
-            timefilter=None, trafficexpr=None, sync=True):
+            timefilter=None, trafficexpr=None, sync=True, cache=None,
+            shard_duration=None, shards_in_flight=4):
         """
         See `SingleQueryReport` for a description of the arguments.  (Note that
-        only `columns, `sort_col`, `timefilter`, and `trafficexpr` apply to this
-        report type).
+        only `columns, `sort_col`, `timefilter`, `trafficexpr`, `cache`
+        and the sharding arguments apply to this report type).
         """
         return super(TrafficFlowListReport, self).run(
             realm='traffic_flow_list',
             groupby='hos', columns=columns, sort_col=sort_col,
             timefilter=timefilter, trafficexpr=trafficexpr, host_group_type=None,
-            resolution="1min", centricity="hos", area=None, sync=sync)
+            resolution="1min", centricity="hos", area=None, sync=sync,
+            cache=cache, shard_duration=shard_duration,
+            shards_in_flight=shards_in_flight)
 
 
 class WANReport(SingleQueryReport):
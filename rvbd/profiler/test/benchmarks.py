@@ -0,0 +1,66 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Micro benchmarks for the client side processing of Profiler query data.
+None of these need a Profiler appliance, the data is synthetic.
+
+Run all of them with:
+
+    python -m rvbd.profiler.test.benchmarks
+
+or just some of them by passing their names on the command line.
+"""
+
+import sys
+
+from rvbd.shark.test.benchmarks import timeit, report
+from rvbd.profiler.test.fakes import make_query, make_rows
+
+
+def _row_to_native(query, row):
+    """ Row conversion as done before the converters were compiled,
+    looking up the legend of the query for every row """
+    legend = query.get_legend()
+    for i, x in enumerate(row):
+        if (legend[i].json['type'] == 'float' or
+            legend[i].json['type'] in 'reltime' or
+            legend[i].json['rate'] == 'opt'):
+            try:
+                row[i] = float(x)
+            except ValueError:
+                pass
+        elif legend[i].json['type'] == 'int':
+            row[i] = int(x)
+    return row
+
+
+def bench_rows(nrows=500000):
+    """ Compare the per-cell legend lookups with the compiled row
+    converter and with the columnar arrays """
+    query = make_query(make_rows(nrows))
+    query.get_data()
+
+    def baseline():
+        [_row_to_native(query, list(row)) for row in query.data]
+
+    report('rows (%d rows)' % nrows, timeit(baseline), timeit(query.get_data))
+    report('columnar (%d rows)' % nrows, timeit(baseline), timeit(query.get_columnar))
+
+
+BENCHMARKS = ['rows']
+
+
+def main(args):
+    names = args or BENCHMARKS
+    for name in names:
+        globals()['bench_' + name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
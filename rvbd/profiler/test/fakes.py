@@ -0,0 +1,155 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Stand-ins for a Profiler and its reporting API, shared by the tests
+and benchmarks that run without an appliance.
+"""
+
+from rvbd.profiler._types import Column
+from rvbd.profiler.profiler import Profiler
+from rvbd.profiler.report import Query
+from rvbd.common.exceptions import RvbdException
+
+
+def column(cid, strid, ctype, rate='', category='data'):
+    return {'id': cid, 'strid': strid, 'name': strid, 'type': ctype,
+            'rate': rate, 'category': category, 'available': True}
+
+
+COLUMNS = [column(6, 'ID_HOST_IP', 'ipaddr', category='key'),
+           column(33, 'ID_AVG_BYTES', 'float', rate='persec'),
+           column(34, 'ID_TOTAL_PKTS', 'int'),
+           column(98, 'ID_TIME', 'time'),
+           column(120, 'ID_PCT_REDUCTION', 'int', rate='opt')]
+
+
+def make_rows(nrows):
+    return [[u'10.0.%d.%d' % (i / 256 % 256, i % 256), u'%d.5' % i,
+             unicode(i * 3), unicode(1365000000 + i), u'%d' % (i % 100)]
+            for i in xrange(nrows)]
+
+
+class FakeObject(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeReportAPI(object):
+    """ Stand-in for the `profiler.api.report` group.
+
+    The data of every query is `rows`, with values for each of
+    `columns`, restricted to the requested columns.  Without a `clock`
+    reports complete instantly, otherwise they complete after the
+    number of seconds given as their template id.  Creating a report
+    with a negative template id fails.
+    """
+    def __init__(self, rows=(), totals=None, columns=COLUMNS, clock=None):
+        self.rows = rows
+        self.totals = totals
+        self.columns = columns
+        self.clock = clock
+        self.requests = []
+        self.created = {}
+        self.deleted = []
+        self.polls = {}
+        self.running = 0
+        self.max_running = 0
+
+    def reports(self, data):
+        self.requests.append('reports')
+        duration = 0
+        if self.clock is not None:
+            duration = data['template_id']
+            if duration < 0:
+                raise RvbdException('invalid template')
+        rid = len(self.created) + 1
+        start = self.clock() if self.clock is not None else 0
+        self.created[rid] = (start, duration)
+        self.polls[rid] = 0
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        return {'id': rid}
+
+    def status(self, rid):
+        self.requests.append('status')
+        self.polls[rid] = self.polls.get(rid, 0) + 1
+        start, duration = self.created.get(rid, (0, 0))
+        elapsed = self.clock() - start if self.clock is not None else 0
+        if elapsed >= duration:
+            self.running -= 1
+            return {'status': 'completed', 'percent': 100, 'remaining_seconds': 0}
+        return {'status': 'running', 'percent': int(100 * elapsed / duration),
+                'remaining_seconds': duration - elapsed}
+
+    def queries(self, report_id, query_id=None, params=None, stream=None):
+        if query_id is None:
+            self.requests.append('queries')
+            return [{'id': 'q%d' % report_id, 'actual_t0': 0, 'actual_t1': 60,
+                     'columns': self.columns}]
+
+        ids = [c['id'] for c in self.columns]
+        if params is not None and 'columns' in params:
+            requested = params['columns']
+            indices = [ids.index(int(i)) for i in requested.split(',')]
+        else:
+            requested = None
+            indices = range(len(ids))
+        self.requests.append(('stream' if stream else 'data', query_id, requested))
+
+        rows = [[row[i] for i in indices] for row in self.rows]
+        if stream == 'data':
+            return iter(rows)
+        totals = self.totals or [u''] * len(ids)
+        return {'data': rows, 'totals': [totals[i] for i in indices]}
+
+    def delete(self, rid):
+        self.requests.append('delete')
+        self.deleted.append(rid)
+
+
+class FakeProfiler(object):
+    """ Profiler whose columns are `columns`, see FakeReportAPI for
+    the other arguments """
+    host = 'profiler.example.com'
+    version = '10.0'
+    _gencolumns = Profiler._gencolumns.im_func
+
+    def __init__(self, rows=(), totals=None, columns=COLUMNS, clock=None):
+        self.api = FakeObject(report=FakeReportAPI(rows, totals, columns, clock))
+        self.columns = dict((c['strid'].lower()[3:],
+                             Column(c['id'], c['strid'].lower()[3:], c['name'], json=c))
+                            for c in columns)
+
+    def get_columns(self, columns, groupby=None):
+        res = []
+        for c in columns:
+            if isinstance(c, dict):
+                c = c['strid'].lower()[3:]
+            elif isinstance(c, Column):
+                c = c.key
+            res.append(self.columns[c])
+        return res
+
+    def get_columns_by_ids(self, ids):
+        return [c for i in ids for c in self.columns.values() if c.id == i]
+
+
+class FakeReport(object):
+    _cached = None
+
+    def __init__(self, profiler):
+        self.id = 1
+        self.profiler = profiler
+
+
+def make_query(rows, totals=None):
+    """ Return a Query of a report whose data is `rows` """
+    report = FakeReport(FakeProfiler(rows, totals))
+    return Query(report, {'id': 'q1', 'actual_t0': 0, 'actual_t1': 60,
+                          'columns': COLUMNS}, custom_columns=True)
@@ -0,0 +1,159 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import os
+import time
+import shutil
+import urlparse
+import tempfile
+import unittest
+import threading
+
+from rvbd.common.service import UserAuth
+from rvbd.common.exceptions import RvbdException
+from rvbd.common.test.test_connection import ThreadingHTTPServer
+from rvbd.common.test.test_sessioncache import LoginHandler
+from rvbd.profiler.profiler import Profiler
+
+
+def column(cid, strid, category='data'):
+    return {'id': cid, 'strid': strid, 'name': strid, 'type': 'int',
+            'rate': '', 'category': category, 'available': True}
+
+
+class ProfilerHandler(LoginHandler):
+    """ Serves the columns of each triplet: host_ip and avg_bytes for
+    all of them, and a column specific to the groupby """
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse.urlparse(self.path)
+        if url.path == '/api/common/1.0/services':
+            self.reply(200, [{'id': 'profiler', 'versions': ['1.0']}])
+        elif url.path == '/api/common/1.0/info.json':
+            self.reply(200, {'sw_version': '10.0'})
+        elif url.path == '/api/profiler/1.0/reporting/columns.json':
+            params = dict(urlparse.parse_qsl(url.query))
+            groupby = params['group_by']
+            with server.lock:
+                server.columns.append((params['realm'], params['centricity'], groupby))
+                server.active += 1
+                server.peak = max(server.peak, server.active)
+            time.sleep(0.01)
+            self.reply(200, [column(5, 'ID_HOST_IP', 'key'),
+                             column(33, 'ID_AVG_BYTES'),
+                             column(1000 + sum(map(ord, groupby)), 'ID_BY_' + groupby.upper())])
+            with server.lock:
+                server.active -= 1
+        else:
+            LoginHandler.do_GET(self)
+
+
+class ColumnCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        # the catalog is cached in the flyscript directory of the user
+        self.home = os.environ.get('HOME')
+        self.dir = tempfile.mkdtemp()
+        os.environ['HOME'] = self.dir
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), ProfilerHandler)
+        self.httpd.requests = []
+        self.httpd.session = 0
+        self.httpd.lock = threading.Lock()
+        self.httpd.columns = []
+        self.httpd.active = 0
+        self.httpd.peak = 0
+        thread = threading.Thread(target=self.httpd.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        self.profilers = []
+
+    def tearDown(self):
+        for profiler in self.profilers:
+            profiler.conn.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        os.environ['HOME'] = self.home
+        shutil.rmtree(self.dir)
+
+    def profiler(self):
+        profiler = Profiler('http://127.0.0.1:%d' % self.httpd.server_port,
+                            auth=UserAuth('admin', 'secret'))
+        self.profilers.append(profiler)
+        return profiler
+
+    def test_lazy(self):
+        profiler = self.profiler()
+        self.assertEqual(self.httpd.columns, [])
+
+        columns = profiler.search_columns(realms=['traffic_flow_list'])
+        self.assertEqual(self.httpd.columns, [('traffic_flow_list', 'hos', 'hos')])
+        self.assertEqual(sorted(c.key for c in columns),
+                         ['avg_bytes', 'by_hos', 'host_ip'])
+
+        profiler.get_columns(['host_ip', 'by_hos'], groupby='hos')
+        self.assertEqual(sorted(self.httpd.columns[1:]),
+                         [('traffic_summary', 'hos', 'hos'),
+                          ('traffic_summary', 'int', 'hos')])
+        self.assertRaises(RvbdException, profiler.get_columns,
+                          ['by_tim'], groupby='hos')
+
+        # searches are answered from the catalog
+        del self.httpd.columns[:]
+        profiler.search_columns(realms=['traffic_flow_list'])
+        profiler.get_columns(['host_ip'], groupby='hos')
+        self.assertEqual(self.httpd.columns, [])
+
+    def test_catalog(self):
+        profiler = self.profiler()
+        self.assertEqual(profiler.columns.key.host_ip.id, 5)
+
+        triplets = profiler._triplets()
+        self.assertEqual(sorted(self.httpd.columns), sorted(triplets))
+        self.assertTrue(1 < self.httpd.peak <= Profiler.COLUMN_FETCH_WORKERS)
+
+        # columns shared by several triplets are the same objects
+        host_ip = profiler.get_columns(['host_ip'])[0]
+        self.assertTrue(profiler.columns.key.host_ip is host_ip)
+        self.assertTrue(profiler.get_columns_by_ids([5])[0] is host_ip)
+        for c in profiler.search_columns(groupbys=['tim']):
+            if c.key == 'host_ip':
+                self.assertTrue(c is host_ip)
+        self.assertRaises(RvbdException, profiler.get_columns, ['unknown'])
+        self.assertRaises(KeyError, profiler.get_columns_by_ids, [1])
+
+        # the next profiler object loads the catalog from the cache file
+        del self.httpd.columns[:]
+        profiler = self.profiler()
+        self.assertEqual(profiler.get_columns(['by_app'])[0].key, 'by_app')
+        self.assertEqual(len(list(profiler.columns)),
+                         len(set(t[2] for t in triplets)) + 2)
+        self.assertEqual(self.httpd.columns, [])
+
+
+    def test_unknown(self):
+        profiler = self.profiler()
+        self.assertRaises(RvbdException, profiler.get_columns, ['unknown'])
+        self.assertEqual(len(self.httpd.columns), len(profiler._triplets()))
+
+        # the catalog is complete, unknown columns are remembered
+        calls = []
+        load = profiler._load_triplets
+        profiler._load_triplets = lambda *args, **kwargs: (
+            calls.append(args), load(*args, **kwargs))
+        self.assertRaises(RvbdException, profiler.get_columns, ['unknown'])
+        self.assertRaises(KeyError, profiler.get_columns_by_ids, [1])
+        self.assertRaises(KeyError, profiler.get_columns_by_ids, [1])
+        self.assertEqual(calls, [])
+        self.assertEqual(profiler.get_columns(['by_app'])[0].key, 'by_app')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import math
+import unittest
+
+from rvbd.profiler.test.fakes import make_query, make_rows
+
+
+class QueryTests(unittest.TestCase):
+
+    def test_data(self):
+        rows = make_rows(3) + [[u'10.1.1.1', u'', u'7', u'1365000100', u'50']]
+        totals = [u'', u'12.5', u'16', u'', u'20']
+        query = make_query(rows, totals)
+
+        expected = [[u'10.0.0.0', 0.5, 0, 1365000000.0, 0.0],
+                    [u'10.0.0.1', 1.5, 3, 1365000001.0, 1.0],
+                    [u'10.0.0.2', 2.5, 6, 1365000002.0, 2.0],
+                    [u'10.1.1.1', u'', 7, 1365000100.0, 50.0]]
+        self.assertEqual(list(query.get_iterdata()), expected)
+        self.assertEqual(query.get_data(), expected)
+        self.assertEqual(query.get_totals(), [u'', 12.5, 16, u'', 20.0])
+
+        # the rows received are not modified
+        self.assertEqual(query.data, rows)
+        self.assertEqual(len(query._converters), 1)
+
+    def test_columns(self):
+        query = make_query(make_rows(2))
+        columns = [query.available_columns[1], query.available_columns[0]]
+        self.assertEqual(query.get_data(columns)[1], [1.5, u'10.0.0.1'])
+        self.assertEqual(query.report.profiler.api.report.requests[-1],
+                         ('data', 'q1', '33,6'))
+
+    def test_columnar(self):
+        rows = make_rows(3) + [[u'10.1.1.1', u'', u'7', u'1365000100', u'50']]
+        query = make_query(rows)
+        host, avg, pkts, t, pct = query.get_columnar()
+
+        self.assertEqual(host.dtype, object)
+        self.assertEqual(list(host), [r[0] for r in rows])
+        self.assertEqual(avg.dtype, 'float64')
+        self.assertEqual(list(avg[:3]), [0.5, 1.5, 2.5])
+        self.assertTrue(math.isnan(avg[3]))
+        self.assertEqual(pkts.dtype, 'int64')
+        self.assertEqual(list(pkts), [0, 3, 6, 7])
+        self.assertEqual(t.dtype, 'float64')
+        self.assertEqual(pct.dtype, 'float64')
+        self.assertEqual(list(pct), [0.0, 1.0, 2.0, 50.0])
+
+        # streamed, unless the data has been retrieved
+        api = query.report.profiler.api.report
+        self.assertEqual(api.requests[-1][0], 'stream')
+        query.get_data()
+        query.get_columnar()
+        self.assertEqual(api.requests[-1][0], 'data')
+
+    def test_columnar_empty(self):
+        arrays = make_query([]).get_columnar()
+        self.assertEqual([len(a) for a in arrays], [0] * 5)
+        self.assertEqual(arrays[2].dtype, 'int64')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import os
+import shutil
+import pickle
+import datetime
+import tempfile
+import unittest
+
+from rvbd.common.timeutils import tzutc
+from rvbd.profiler.filters import TimeFilter
+from rvbd.profiler.querycache import QueryCache
+from rvbd.profiler.report import TrafficSummaryReport, ReportBatch
+from rvbd.profiler.test.fakes import FakeProfiler, make_rows
+
+
+class QueryCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = QueryCache(directory=self.dir)
+        self.rows = make_rows(100)
+        self.profiler = FakeProfiler(self.rows)
+        self.requests = self.profiler.api.report.requests
+        start = datetime.datetime(2013, 4, 1, tzinfo=tzutc())
+        self.timefilter = TimeFilter(start, start + datetime.timedelta(days=1))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_report(self, columns=('host_ip', 'avg_bytes'), timefilter=None,
+                   cache=None):
+        report = TrafficSummaryReport(self.profiler)
+        report.run('hos', list(columns), timefilter=timefilter or self.timefilter,
+                   cache=cache or self.cache)
+        return report
+
+    def test_hit(self):
+        report = self.run_report()
+        data = report.get_data()
+        self.assertEqual(data[1], [u'10.0.0.1', 1.5])
+        report.delete()
+        self.assertEqual(self.requests, ['reports', 'status', 'queries',
+                                         ('data', 'q1', '6,33'), 'delete'])
+
+        del self.requests[:]
+        report = self.run_report()
+        self.assertEqual(report.status()['status'], 'completed')
+        self.assertEqual(report.get_data(), data)
+        self.assertEqual(list(report.get_iterdata()), data)
+        report.delete()
+        self.assertEqual(self.requests, [])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # the data is compressed
+        raw = len(pickle.dumps(report.queries[0].querydata, pickle.HIGHEST_PROTOCOL))
+        self.assertTrue(self.cache._store.size() < raw / 2)
+
+    def test_other_columns(self):
+        self.run_report().get_data()
+
+        del self.requests[:]
+        report = self.run_report()
+        data = report.get_data(columns=['avg_bytes'])
+        self.assertEqual(data[2], [2.5])
+        # the report had to be run on the Profiler after all
+        self.assertEqual(self.requests, ['reports', 'status', 'queries',
+                                         ('data', 'q2', '33')])
+
+        del self.requests[:]
+        report = self.run_report()
+        self.assertEqual(report.get_data(columns=['avg_bytes']), data)
+        self.assertEqual(self.requests, [])
+
+    def corrupt(self, prefix):
+        """ Replace the items whose name starts with `prefix` by data
+        that cannot be decompressed """
+        for root, dirs, files in os.walk(self.dir):
+            for name in files:
+                if name.startswith(prefix):
+                    with open(os.path.join(root, name), 'wb') as f:
+                        pickle.dump('garbage', f)
+
+    def test_corrupt_data(self):
+        data = self.run_report().get_data()
+        self.corrupt('data-')
+
+        del self.requests[:]
+        report = self.run_report()
+        self.assertEqual(report.get_data(), data)
+        self.assertEqual(self.requests, ['reports', 'status', 'queries',
+                                         ('data', 'q2', '6,33')])
+
+    def test_corrupt_queries(self):
+        data = self.run_report().get_data()
+        self.corrupt('queries')
+
+        del self.requests[:]
+        report = self.run_report()
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(report.get_data(), data)
+        self.assertEqual(self.requests, ['reports', 'status', 'queries',
+                                         ('data', 'q2', '6,33')])
+
+    def test_keys(self):
+        self.run_report().get_data()
+        del self.requests[:]
+
+        # other columns, time frames and Profiler versions are other reports
+        self.run_report(columns=('host_ip', 'total_pkts')).get_data()
+        start = self.timefilter.start + datetime.timedelta(days=1)
+        self.run_report(timefilter=TimeFilter(start, start + datetime.timedelta(days=1))).get_data()
+        self.profiler.version = '10.1'
+        self.run_report().get_data()
+        self.assertEqual(self.requests.count('reports'), 3)
+        self.assertEqual(self.cache.misses, 4)
+
+    def test_recent(self):
+        now = datetime.datetime.now(tzutc())
+        timefilter = TimeFilter(now - datetime.timedelta(hours=1), now)
+        for i in range(2):
+            report = self.run_report(timefilter=timefilter)
+            report.get_data()
+        self.assertEqual(self.requests.count('reports'), 2)
+        self.assertEqual(os.listdir(self.dir), [])
+        self.assertEqual(self.cache.misses, 0)
+
+    def test_batch(self):
+        self.run_report().get_data()
+        del self.requests[:]
+
+        batch = ReportBatch()
+        report = batch.add(TrafficSummaryReport(self.profiler), groupby='hos',
+                           columns=['host_ip', 'avg_bytes'],
+                           timefilter=self.timefilter, cache=self.cache)
+        results = list(batch.run())
+        self.assertEqual(results[0].error, None)
+        self.assertEqual(report.get_data()[1], [u'10.0.0.1', 1.5])
+        self.assertEqual(self.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import unittest
+
+from rvbd.profiler.report import Report, ReportBatch, WANSummaryReport
+from rvbd.common.exceptions import RvbdException, CompletionTimeout
+from rvbd.profiler.test.fakes import FakeProfiler
+
+
+class ReportBatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0.0]
+        self.profiler = FakeProfiler(clock=lambda: self.now[0])
+
+    def batch(self, **kwargs):
+        batch = ReportBatch(**kwargs)
+
+        def sleep(t):
+            self.now[0] += t
+        batch.scheduler._clock = lambda: self.now[0]
+        batch.scheduler._sleep = sleep
+        return batch
+
+    def test_batch(self):
+        batch = self.batch()
+        durations = [30, 10, 20, -1]
+        reports = [batch.add(Report(self.profiler), template_id=d) for d in durations]
+
+        results = list(batch.run())
+        self.assertEqual([r.report for r in results],
+                         [reports[3], reports[1], reports[2], reports[0]])
+        self.assertTrue(isinstance(results[0].error, RvbdException))
+        self.assertEqual([r.error for r in results[1:]], [None] * 3)
+
+        # all the reports ran at the same time, paced by their estimates
+        api = self.profiler.api.report
+        self.assertEqual(api.max_running, 3)
+        self.assertTrue(self.now[0] < 35)
+        self.assertTrue(max(api.polls.values()) < 10)
+
+    def test_max_in_flight(self):
+        batch = self.batch(max_in_flight=2)
+        for d in [10, 10, 10, 10, 10]:
+            batch.add(Report(self.profiler), template_id=d)
+        results = list(batch.run())
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.profiler.api.report.max_running, 2)
+
+    def test_timeout(self):
+        batch = self.batch(timeout=60)
+        slow = batch.add(Report(self.profiler), template_id=1000)
+        fast = batch.add(Report(self.profiler), template_id=5)
+
+        results = list(batch.run())
+        self.assertEqual([r.report for r in results], [fast, slow])
+        self.assertTrue(isinstance(results[1].error, CompletionTimeout))
+        # the timeout is measured in wall clock time
+        self.assertTrue(60 <= self.now[0] < 70)
+        # the report that timed out is deleted
+        self.assertEqual(self.profiler.api.report.deleted, [slow.id])
+
+    def test_stop_early(self):
+        batch = self.batch()
+        reports = [batch.add(Report(self.profiler), template_id=d)
+                   for d in [10, 20, 30]]
+        results = batch.run()
+        self.assertTrue(next(results).report is reports[0])
+        results.close()
+        # the reports that were not returned are deleted
+        self.assertEqual(sorted(self.profiler.api.report.deleted),
+                         [reports[1].id, reports[2].id])
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, ReportBatch().add,
+                          WANSummaryReport(self.profiler))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import math
+import datetime
+import unittest
+
+from rvbd.common.timeutils import tzutc, datetime_to_seconds
+from rvbd.profiler.filters import TimeFilter
+from rvbd.profiler.report import (TrafficSummaryReport,
+                                  TrafficOverallTimeSeriesReport)
+from rvbd.profiler.test.fakes import FakeProfiler, FakeReportAPI, column
+
+
+COLUMNS = [column(6, 'ID_HOST_IP', 'ipaddr', category='key'),
+           column(98, 'ID_TIME', 'time', category='key'),
+           column(34, 'ID_TOTAL_BYTES', 'int', rate='count'),
+           column(33, 'ID_AVG_BYTES', 'float', rate='persec'),
+           column(35, 'ID_PEAK_BYTES', 'float', rate='persec'),
+           column(40, 'ID_RESPONSE_TIME', 'float')]
+
+START = datetime.datetime(2013, 4, 1, 6, tzinfo=tzutc())
+END = datetime.datetime(2013, 4, 3, tzinfo=tzutc())
+# host 10.0.0.2 only has traffic on the first day
+B_TIME = datetime_to_seconds(START)
+
+
+class ShardingReportAPI(FakeReportAPI):
+    """ Reports complete instantly with data computed from their time
+    frame: one row per minute for time series, and two hosts for
+    summaries """
+    def __init__(self):
+        super(ShardingReportAPI, self).__init__(columns=COLUMNS)
+        self.frames = {}
+
+    def reports(self, data):
+        res = super(ShardingReportAPI, self).reports(data)
+        tf = data['criteria']['time_frame']
+        self.frames[res['id']] = (tf['start'], tf['end'], data['criteria']['query'])
+        return res
+
+    def queries(self, rid, query_id=None, params=None, stream=None):
+        start, end, query = self.frames[rid]
+        if query_id is None:
+            return [{'id': 'q%d' % rid, 'actual_t0': start, 'actual_t1': end,
+                     'columns': [c for c in COLUMNS if c['id'] in query['columns']]}]
+
+        if query['realm'] == 'traffic_overall_time_series':
+            rows = [{98: unicode(t), 33: u'100.0'} for t in range(start, end, 60)]
+        else:
+            rows = [{6: u'10.0.0.1', 34: unicode(end - start), 33: u'1.0',
+                     35: unicode(end), 40: u'5.0'}]
+            if start <= B_TIME < end:
+                rows.append({6: u'10.0.0.2', 34: u'10', 33: u'2.0',
+                             35: u'3.0', 40: u'7.0'})
+        ids = [int(i) for i in params['columns'].split(',')]
+        num = lambda x: float(x) if '.' in x else int(x)
+        totals = dict((i, unicode(sum(num(r[i]) for r in rows))) for i in ids
+                      if i not in (6, 98))
+        return {'data': [[r[i] for i in ids] for r in rows],
+                'totals': [totals.get(i, u'') for i in ids]}
+
+
+class ShardingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = FakeProfiler(columns=COLUMNS)
+        self.profiler.api.report = self.api = ShardingReportAPI()
+        self.timefilter = TimeFilter(START, END)
+
+    def test_summary(self):
+        report = TrafficSummaryReport(self.profiler)
+        report.run('hos', ['host_ip', 'total_bytes', 'avg_bytes', 'peak_bytes',
+                           'response_time'],
+                   sort_col='total_bytes', timefilter=self.timefilter,
+                   resolution='hour', shard_duration='1 day')
+
+        # split at midnight
+        ranges = sorted(v[:2] for v in self.api.frames.values())
+        midnight = datetime_to_seconds(START) + 18 * 3600
+        self.assertEqual(ranges, [(datetime_to_seconds(START), midnight),
+                                  (midnight, datetime_to_seconds(END))])
+
+        self.assertEqual([c.key for c in report.unmerged_columns], ['response_time'])
+        data = report.get_data()
+        self.assertEqual(data, [[u'10.0.0.1', 42 * 3600, 1.0,
+                                 float(datetime_to_seconds(END)), None],
+                                [u'10.0.0.2', 10, 2.0 * 18 / 42, 3.0, None]])
+        # the second host was not returned for the second day
+        self.assertEqual(report.incomplete_keys, [(u'10.0.0.2',)])
+        totals = report.get_totals()
+        self.assertEqual(totals[:2], [None, 42 * 3600 + 10])
+        self.assertEqual(totals[4], None)
+
+        arrays = report.get_columnar()
+        self.assertEqual(list(arrays[1]), [42 * 3600, 10])
+        # columns that cannot be merged are NaN
+        self.assertTrue(all(math.isnan(x) for x in arrays[4]))
+
+        report.delete()
+        self.assertEqual(sorted(self.api.deleted), [1, 2])
+
+    def test_async(self):
+        report = TrafficSummaryReport(self.profiler)
+        self.assertRaises(ValueError, report.run, 'hos', ['host_ip', 'total_bytes'],
+                          timefilter=self.timefilter, shard_duration='1 day',
+                          sync=False)
+        self.assertEqual(self.api.created, {})
+
+    def test_time_series(self):
+        report = TrafficOverallTimeSeriesReport(self.profiler)
+        report.run(['time', 'avg_bytes'], timefilter=self.timefilter,
+                   resolution='1min', shard_duration=datetime.timedelta(hours=6),
+                   shards_in_flight=2)
+        self.assertEqual(len(self.api.created), 7)
+
+        data = report.get_data()
+        times = [row[0] for row in data]
+        self.assertEqual(len(data), 42 * 60)
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(times[0], datetime_to_seconds(START))
+        self.assertEqual(list(report.get_iterdata()), data)
+        self.assertEqual(len(report.get_columnar()[0]), 42 * 60)
+
+    def test_resolution(self):
+        report = TrafficOverallTimeSeriesReport(self.profiler)
+        self.assertRaises(ValueError, report.run, ['time', 'avg_bytes'],
+                          timefilter=self.timefilter, resolution='hour',
+                          shard_duration='90 min')
+        self.assertEqual(self.api.created, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
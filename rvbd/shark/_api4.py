@@ -17,7 +17,8 @@ class API4Group(APIGroup):
     def _xjtrans(self, urlpath, method, data, as_json,
                  timestamp_format=APITimestampFormat.NANOSECOND,
                  params=None,
-                 custom_headers=None):
+                 custom_headers=None,
+                 stream=None):
         """Issue the given API request using either JSON or XML
         (dictated by the as_json parameter)."""
         self.add_base_header('X-RBT-High-Precision-Timestamp-Format', timestamp_format)
@@ -34,7 +35,8 @@ class API4Group(APIGroup):
 
         if as_json:
             return self.shark.conn.json_request(method, self.uri_prefix + urlpath,
-                                                body=data, params=params, extra_headers=headers)
+                                                body=data, params=params, extra_headers=headers,
+                                                stream=stream)
         else:
             return self.shark.conn.xml_request(method, self.uri_prefix + urlpath,
                                                body=data,
@@ -213,13 +215,13 @@ class Interfaces(API4Group):
         """ Return details for a specific export """
         return self._xjtrans("/interfaces/%s/exports/%s" % (handle, export_id), "GET", None, as_json, timestamp_format)
 
-    def get_packets_from_export(self, handle, export_id, path=None):
+    def get_packets_from_export(self, handle, export_id, path=None, **kwargs):
         """ Fetch packets from export ID """
-        return self.shark.conn.download(self.uri_prefix + "/interfaces/%s/exports/%s/packets" % (handle, export_id), path)
+        return self.shark.conn.download(self.uri_prefix + "/interfaces/%s/exports/%s/packets" % (handle, export_id), path, **kwargs)
     
-    def get_packets(self, handle, path=None, params=None):
+    def get_packets(self, handle, path=None, params=None, **kwargs):
         """ Directly fetch packets for this interface, with optional parameters """
-        return self.shark.conn.download(self.uri_prefix + "/interfaces/%s/packets" % handle, path, params=params)
+        return self.shark.conn.download(self.uri_prefix + "/interfaces/%s/packets" % handle, path, params=params, **kwargs)
 
     def delete_export(self, handle, export_id):
         """ Delete an export """
@@ -263,13 +265,13 @@ class Jobs(API4Group):
         """ Delete an export """
         return self._xjtrans("/jobs/%s/exports/%s" % (handle, export_id), "DELETE", None, True, APITimestampFormat.NANOSECOND)
 
-    def get_packets_from_export(self, handle, export_id, path=None):
+    def get_packets_from_export(self, handle, export_id, path=None, **kwargs):
         """ Fetch packets from export ID """
-        return self.shark.conn.download(self.uri_prefix + "/jobs/%s/exports/%s/packets" % (handle, export_id), path)
+        return self.shark.conn.download(self.uri_prefix + "/jobs/%s/exports/%s/packets" % (handle, export_id), path, **kwargs)
 
-    def get_packets(self, handle, path=None, params=None):
+    def get_packets(self, handle, path=None, params=None, **kwargs):
         """ Directly fetch packets for this job, with optional parameters """
-        return self.shark.conn.download(self.uri_prefix + "/jobs/%s/packets" % handle, path, params=params)
+        return self.shark.conn.download(self.uri_prefix + "/jobs/%s/packets" % handle, path, params=params, **kwargs)
 
     def state_update(self, handle, config, as_json=True, timestamp_format=APITimestampFormat.NANOSECOND):
         """ Updates the capture jobs status """
@@ -332,13 +334,13 @@ class Clips(API4Group):
         """ Delete an export """
         return self._xjtrans("/clips/%s/exports/%s" % (handle, export_id), "DELETE", None, True, APITimestampFormat.NANOSECOND)
 
-    def get_packets_from_export(self, handle, export_id, path=None):
+    def get_packets_from_export(self, handle, export_id, path=None, **kwargs):
         """ Fetch packets from export ID """
-        return self.shark.conn.download(self.uri_prefix + "/clips/%s/exports/%s/packets" % (handle, export_id), path)
+        return self.shark.conn.download(self.uri_prefix + "/clips/%s/exports/%s/packets" % (handle, export_id), path, **kwargs)
 
-    def get_packets(self, handle, path=None, params=None):
+    def get_packets(self, handle, path=None, params=None, **kwargs):
         """ Directly fetch packets from this clip, with optional parameters """
-        return self.shark.conn.download(self.uri_prefix + "/clips/%s/packets" % handle, path, params=params)
+        return self.shark.conn.download(self.uri_prefix + "/clips/%s/packets" % handle, path, params=params, **kwargs)
         
     def get_config(self, handle, as_json=True, timestamp_format=APITimestampFormat.NANOSECOND):
         """ Retrieves configuration information about a trace clip """
@@ -410,11 +412,11 @@ class Files(API4Group):
             path = path[1:]
         return self.shark.conn.upload(self.uri_prefix + "/fs/%s" % path, local_file_ref, extra_headers=headers)
     
-    def download(self, path, local_path=None):
+    def download(self, path, local_path=None, **kwargs):
         """Convenience function to download a file."""
         if path[0] == '/':
             path = path[1:]
-        return self.shark.conn.download(self.uri_prefix + "/fs/%s/download" % path, path=local_path)
+        return self.shark.conn.download(self.uri_prefix + "/fs/%s/download" % path, path=local_path, **kwargs)
         
     def delete(self, path):
         """Delete a file from the system."""
@@ -512,17 +514,17 @@ class Files(API4Group):
             path = path[1:]
         return self._xjtrans("/fs/%s/exports/%s" % (path, export_id), "DELETE", None, True, APITimestampFormat.NANOSECOND)
 
-    def get_packets_from_export(self, path, export_id, local_path=None):
+    def get_packets_from_export(self, path, export_id, local_path=None, **kwargs):
         """ Fetch packets from export ID """
         if path[0] == '/':
             path = path[1:]
-        return self.shark.conn.download(self.uri_prefix + "/fs/%s/exports/%s/packets" % (path, export_id), local_path)
+        return self.shark.conn.download(self.uri_prefix + "/fs/%s/exports/%s/packets" % (path, export_id), local_path, **kwargs)
 
-    def get_packets(self, path, local_path=None,  params=None):
+    def get_packets(self, path, local_path=None,  params=None, **kwargs):
         """ Directly fetch packets from file on server, with optional parameters """
         if path[0] == '/':
             path = path[1:]
-        return self.shark.conn.download(self.uri_prefix + "/fs/%s/packets" % path, local_path, params=params)
+        return self.shark.conn.download(self.uri_prefix + "/fs/%s/packets" % path, local_path, params=params, **kwargs)
         
 class Users(API4Group):
     def get(self, as_json=True, timestamp_format=APITimestampFormat.NANOSECOND):
@@ -623,6 +625,12 @@ class Views(API4Group):
         """Return the output for the given view"""
         return self._xjtrans("/views/%s/data/%s" % (handle, output), "GET", None, as_json, timestamp_format, params)
 
+    def iter_data(self, handle, output, timestamp_format=APITimestampFormat.NANOSECOND, **params):
+        """Return an iterator over the samples of the given view output,
+        decoded as they are received"""
+        return self._xjtrans("/views/%s/data/%s" % (handle, output), "GET", None, True, timestamp_format, params,
+                             stream='samples')
+
     def get_stats(self, handle, as_json=True, timestamp_format=APITimestampFormat.NANOSECOND):
         """Return the statistics for the given view"""
         return self._xjtrans("/views/%s/stats" % handle, "GET", None, as_json, timestamp_format)
@@ -14,6 +14,7 @@ from __future__ import absolute_import
 
 import os
 
+from rvbd.common.scheduler import PollOperation, wait_for
 from rvbd.shark._exceptions import SharkException
 from rvbd.shark._interfaces import loaded, _InputSource
 import datetime
@@ -407,12 +408,15 @@ class File4(_FSResource, _InputSource):
         clss = cls._get_child_class(data)
         return clss(shark, data)
 
-    def download(self, local_path):
+    def download(self, local_path, **kwargs):
         """Download a trace file. 'local_path' is the local file path
+
+        The keyword arguments are passed to Connection.download(), see
+        its documentation for parallel and resumable downloads.
         """
         assert self.shark is not None
 
-        self.shark.api.fs.download(self.data["id"], local_path)
+        self.shark.api.fs.download(self.data["id"], local_path, **kwargs)
 
     @property
     @loaded
@@ -528,6 +532,8 @@ class TraceFile4(File4):
     timeskew_val = 0
     description = ""
     type_list = ['PCAP_FILE', 'PCAPNG_FILE', 'ERF_FILE']
+    # index statuses containing these words mean the index cannot be built
+    INDEX_ERRORS = ['ERROR', 'FAIL', 'ABORT']
 
     def __repr__(self):
         assert self.data is not None
@@ -562,8 +568,13 @@ class TraceFile4(File4):
         new_path = file_dir + shark._file_separator + file_name
         return TraceFile4(shark, {'id':new_path})
 
-    def create_index(self):
+    def create_index(self, wait=False, timeout=None):
         """Create an index on the trace file
+
+        If `wait` is True, return only once the index is ready, raising
+        rvbd.common.exceptions.CompletionTimeout if this takes longer
+        than `timeout` seconds, or SharkException if the appliance
+        fails to build it.
         """
         error_msg = "An error occurred creating an index on the trace file "
         assert self.shark is not None
@@ -575,8 +586,34 @@ class TraceFile4(File4):
             msg = error_msg + self.data["id"] + ": " + str(e)
             raise SharkException(msg)
 
+        if wait:
+            wait_for([self.index_completion(timeout=timeout)])
+
         self._update_details(self.data["id"])
 
+    def index_completion(self, timeout=None, on_progress=None, on_done=None):
+        """Return an operation that completes when the index of the
+        trace file is ready, to be waited for with
+        rvbd.common.scheduler.wait_for() or a CompletionScheduler.
+        The operation fails with a SharkException if the index status
+        is an error.
+        """
+        def poll():
+            info = self.shark.api.fs.index_info(self.data["id"])
+            status = info["status"]
+            if isinstance(status, dict):
+                status = status.get("state")
+            if status == "OK":
+                return True, None, None
+            if any(word in str(status).upper() for word in self.INDEX_ERRORS):
+                raise SharkException("An error occurred creating an index on "
+                                     "the trace file %s: %s"
+                                     % (self.data["id"], status))
+            return False, None, None
+
+        return PollOperation(poll, self.data["id"], timeout=timeout,
+                             on_progress=on_progress, on_done=on_done)
+
     def remove_index(self):
         """Remove the index associated with the trace file
         """
@@ -116,6 +116,22 @@ class View(object):
         
         return outputs[0].get_data(*args, **kwargs)
 
+    def get_columnar(self, *args, **kwargs):
+        """ Returns the data from the output in this view as NumPy arrays.
+        Shorthand for `all_outputs()[0].get_columnar()`.
+
+        Raises a LookupError if the view has more than one output.
+
+        For a full description of the function arguments and the
+        return value, refer to the method Output.get_columnar().
+        """
+        outputs = self.all_outputs()
+        if len(outputs) != 1:
+            raise LookupError('This view has more than one output. You have to call get_columnar'
+                              'on an Output object directly')
+
+        return outputs[0].get_columnar(*args, **kwargs)
+
     def get_legend(self):
         """ Returns the legend from the output in this view.
         Shorthand for `all_outputs()[0].get_legend()`.
@@ -142,11 +158,122 @@ class View(object):
         self._ensure_output()
         return self._outputs[id]
 
+class Sample(object):
+    """ One sample of view output data.
+
+    `t` is the sample time, `vals` is a list with one row of values
+    for each key of the view (a single row for views without keys),
+    `p` and `u` are the counts of processed and unprocessed packets.
+    `gap_start` and `gap_end` are only set on samples that mark a gap
+    in the data, `value_count` and `value_sum` only on aggregated
+    samples.
+
+    For compatibility with scripts written against the raw samples
+    returned by the REST API, fields can be read either as attributes
+    (`sample.t`) or as items (`sample['t']`), and unset optional fields
+    behave as missing keys (`'gap_start' in sample`).  Samples are not
+    dictionaries though: `to_dict()` returns one, e.g. to serialize
+    them with `json.dumps()`.
+
+    The sample time can be stored unconverted together with a
+    conversion function, in which case it is converted the first
+    time `t` is accessed.
+    """
+    __slots__ = ('_t', '_convert', 'vals', 'p', 'u',
+                 'gap_start', 'gap_end', 'value_count', 'value_sum')
+
+    _fields = ('t', 'vals', 'p', 'u',
+               'gap_start', 'gap_end', 'value_count', 'value_sum')
+
+    def __init__(self, t, vals, p=None, u=None, gap_start=None, gap_end=None,
+                 value_count=None, value_sum=None, convert=None):
+        self._t = t
+        self._convert = convert
+        self.vals = vals
+        self.p = p
+        self.u = u
+        self.gap_start = gap_start
+        self.gap_end = gap_end
+        self.value_count = value_count
+        self.value_sum = value_sum
+
+    def _get_t(self):
+        if self._convert is not None:
+            self._t = self._convert(self._t)
+            self._convert = None
+        return self._t
+
+    def _set_t(self, t):
+        self._t = t
+        self._convert = None
+
+    t = property(_get_t, _set_t)
+
+    # names used by samples of viewutils.OutputMixer in earlier releases
+    processed_pkts = property(lambda self: self.p)
+    unprocessed_pkts = property(lambda self: self.u)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None and key not in ('t', 'vals'):
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [k for k in self._fields if k in self]
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def to_dict(self):
+        """ Return the fields that are set as a dictionary, in the
+        format of the samples returned by the REST API """
+        return dict(self.items())
+
+    def __repr__(self):
+        return '<Sample t=%s vals=%s>' % (self.t, self.vals)
+
+
 class Output(object):
     def get_data(self, start=None, end=None, delta=None,
                  aggregated=False,
                  sortby=None, sorttype="descending",
-                 fromentry=0, toentry=0,):
+                 fromentry=0, toentry=0, **kwargs):
         """
         Get the data for this view. This function downloads the whole
         dataset before returning it, so it's useful when random access to the
@@ -157,7 +284,7 @@ class Output(object):
         of all arguments and their meanings.
         """
         it = self.get_iterdata(start, end, delta, aggregated,
-                               sortby, sorttype, fromentry, toentry)
+                               sortby, sorttype, fromentry, toentry, **kwargs)
         data = list()
         for row in it:
             data.append(row)
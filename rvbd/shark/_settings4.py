@@ -9,6 +9,7 @@ import functools
 import warnings
 
 from rvbd.common.jsondict import JsonDict
+from rvbd.common.scheduler import PollOperation, wait_for
 import json
 import copy
 import time
@@ -407,21 +408,27 @@ class Update(NoBulk, BasicSettingsFunctionality):
 
 class Storage(NoBulk, BasicSettingsFunctionality):
 
-    def reinitialize(self, wait=True):
+    def reinitialize(self, wait=True, timeout=None):
         """Reinitializes the packet storage
 
         If `wait` is True it will wait for the packet storage to be back again
-        before returning
+        before returning, raising rvbd.common.exceptions.CompletionTimeout
+        if this takes longer than `timeout` seconds
 
         WARNING: This operation will lose all packets in every job
         """
         self._api.reinitialize()
 
-        res = self.get(force=True)
+        if not wait:
+            return self.get(force=True)
 
-        while res['state'] == 'INITIALIZING':
-            time.sleep(5)
+        def poll():
             res = self.get(force=True)
+            return res['state'] != 'INITIALIZING', None, None
+
+        wait_for([PollOperation(poll, 'storage reinitialization', timeout=timeout)],
+                 min_interval=1, max_interval=5)
+        res = self.get()
 
         if res['state'] != 'OK':
             raise SystemError('Server returned error while reinitializing packet storage')
@@ -159,12 +159,16 @@ class Clip4(_interfaces.Clip):
         """
         pass
 
-    def download(self, path=None):
+    def download(self, path=None, **kwargs):
         """Download the Clip packets to a file.
         If path is None packets will be exported to a temporary file.
         A file object that contains the packets is returned.
+
+        Large captures can be downloaded faster with the `parallel`,
+        `resume` and `progress` keyword arguments, which are passed to
+        Connection.download().
         """
-        return open(self._api.get_packets(self.id, path), 'rb')
+        return open(self._api.get_packets(self.id, path, **kwargs), 'rb')
 
 class Job4(_interfaces.Job):
     """A capture job packet source. These objects are normally not
@@ -418,12 +422,16 @@ class Job4(_interfaces.Job):
         """
         return Clip4.add(self.shark, self, filters, description, locked)
 
-    def download(self, path=None):
+    def download(self, path=None, **kwargs):
         """Download the Job packets to a path.
         If path is None packets will be exported to a temporary file.
         A file object that contains the packets is returned.
+
+        Large captures can be downloaded faster with the `parallel`,
+        `resume` and `progress` keyword arguments, which are passed to
+        Connection.download().
         """
-        return open(self._api.get_packets(self.id, path), 'rb')
+        return open(self._api.get_packets(self.id, path, **kwargs), 'rb')
         
     def get_state(self):
         """Return the state of the job (e.g. RUNNING, STOPPED)"""
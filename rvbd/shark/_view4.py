@@ -6,13 +6,22 @@
 # This software is distributed "AS IS" as set forth in the License.
 
 
+import sys
 import time
 import json
+import socket
+import struct
 import logging
+import threading
+from itertools import izip
+from collections import deque, namedtuple
 
 from rvbd.common import timeutils
 from rvbd.common.utils import DictObject
+from rvbd.common.exceptions import RvbdHTTPException
+from rvbd.common.scheduler import Operation, CompletionScheduler, wait_for
 from rvbd.shark import _interfaces
+from rvbd.shark._interfaces import Sample
 from rvbd.shark._class_mapping import path_to_class
 from rvbd.shark._api_helpers import APITimestampFormat
 
@@ -60,8 +69,227 @@ def _to_native(string, legend_entry):
 
     return string
 
+
+def _compile_decoder(legend_entry, time_mode='datetime'):
+    """ Return a function that converts a value string to the native
+    type given by `legend_entry`.
+
+    The result is equivalent to calling `_to_native(string, legend_entry)`
+    but the legend entry is inspected only once, so the returned function
+    can be applied to every cell of a column without re-parsing the
+    `calculation`, `type` and `base` fields each time.
+
+    If `time_mode` is 'ns', absolute times are converted to integer
+    nanoseconds rather than `datetime` objects.
+    """
+    ltype = legend_entry['type']
+    avg = legend_entry['calculation'] == 'AVG'
+
+    if ltype.startswith('INT') or ltype.startswith('UINT') \
+      or ltype in ('TCP_PORT', 'UDP_PORT'):
+        if legend_entry['base'] == 'DEC':
+            baseval = 10
+        elif legend_entry['base'] == 'HEX':
+            baseval = 16
+        else:
+            def decode(string):
+                raise ValueError('do not know how to handle integer base %s' %
+                                 legend_entry['base'])
+            return decode
+
+        if avg:
+            def decode(string):
+                num, den = string.split(':', 1)
+                return int(num, baseval) / int(den)
+        elif baseval == 10:
+            decode = int
+        else:
+            def decode(string):
+                return int(string, 16)
+        return decode
+
+    if ltype in ('DOUBLE', 'RELATIVE_TIME'):
+        if avg:
+            def decode(string):
+                num, den = string.split(':', 1)
+                return float(num) / int(den)
+        else:
+            decode = float
+        return decode
+
+    if ltype == 'BOOLEAN':
+        def to_bool(string):
+            s = string.lower()
+            if s == 'false' or s == '0':
+                return 0
+            elif s == 'true' or s == '1':
+                return 1
+            else:
+                # Booleans can be a count of successes
+                return int(string)
+        if avg:
+            def decode(string):
+                return to_bool(string.split(':', 1)[0])
+            return decode
+        return to_bool
+
+    if ltype == 'ABSOLUTE_TIME':
+        if time_mode == 'ns':
+            convert = int
+        else:
+            convert = timeutils.nsec_string_to_datetime
+        if avg:
+            def decode(string):
+                return convert(string.split(':', 1)[0])
+            return decode
+        return convert
+
+    if avg:
+        def decode(string):
+            return string.split(':', 1)[0]
+        return decode
+
+    return None
+
+
+def _compile_row_decoder(legend, time_mode='datetime'):
+    """ Return a function that converts a whole row of value strings
+    (one `vals` vector of a sample) according to `legend`.
+
+    Each column gets its decoder from `_compile_decoder()`; columns that
+    need no conversion (e.g. strings and addresses) are passed through
+    untouched.
+    """
+    decoders = [_compile_decoder(entry, time_mode) for entry in legend]
+
+    if not any(decoders):
+        return list
+
+    decoders = [d or (lambda string: string) for d in decoders]
+
+    def decode_row(vec):
+        return [d(v) for d, v in izip(decoders, vec)]
+    return decode_row
+
+TIME_MODES = ('datetime', 'ns', 'lazy')
+
+
+class _Fetch(threading.Thread):
+    """ Run `fn(arg)` in a background thread.  The result (or the
+    exception raised by `fn`) is returned by `get()`. """
+    def __init__(self, fn, arg):
+        super(_Fetch, self).__init__()
+        self.daemon = True
+        self._fn = fn
+        self._arg = arg
+        self._result = None
+        self._exc_info = None
+        self.start()
+
+    def run(self):
+        try:
+            self._result = self._fn(self._arg)
+        except:
+            self._exc_info = sys.exc_info()
+
+    def get(self):
+        self.join()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+def _iter_fetched(fn, args, prefetch=True):
+    """ Yield `fn(arg)` for each of `args` in order.
+
+    If `prefetch` is True, the call for the next argument is issued
+    in a background thread while the caller consumes the current
+    result, so at most two results are held in memory at once.
+    """
+    args = iter(args)
+    if not prefetch:
+        for arg in args:
+            yield fn(arg)
+        return
+
+    try:
+        pending = _Fetch(fn, next(args))
+    except StopIteration:
+        return
+
+    while pending is not None:
+        result = pending.get()
+        try:
+            pending = _Fetch(fn, next(args))
+        except StopIteration:
+            pending = None
+        yield result
+
+
+# numpy dtype names used by Output4.get_columnar(), keyed by legend type.
+# Any type not listed here is returned in an object array.
+_COLUMNAR_DTYPES = {
+    'INT8': 'int8', 'INT16': 'int16', 'INT32': 'int32', 'INT64': 'int64',
+    'UINT8': 'uint8', 'UINT16': 'uint16', 'UINT32': 'uint32',
+    'UINT64': 'uint64',
+    'TCP_PORT': 'uint16', 'UDP_PORT': 'uint16',
+    'DOUBLE': 'float64', 'FLOAT': 'float64', 'RELATIVE_TIME': 'float64',
+    # booleans can be a count of successes, see _to_native()
+    'BOOLEAN': 'int64',
+    'IPv4': 'uint32',
+    'ABSOLUTE_TIME': 'int64',
+}
+
+
+def _ipv4_to_int(string):
+    return struct.unpack('!I', socket.inet_aton(string))[0]
+
+
+def _compile_columnar_decoder(legend_entry):
+    """ Return a tuple (dtype, decoder) describing how the column
+    described by `legend_entry` is stored by `Output4.get_columnar()`.
+
+    Decoded values are the same as `_compile_decoder()` except that
+    absolute times are kept as integer nanoseconds and IPv4 addresses
+    are converted to unsigned integers.
+    """
+    ltype = legend_entry['type']
+    dtype = _COLUMNAR_DTYPES.get(ltype, 'object')
+
+    if ltype == 'IPv4':
+        if legend_entry['calculation'] == 'AVG':
+            def decode(string):
+                return _ipv4_to_int(string.split(':', 1)[0])
+            return dtype, decode
+        return dtype, _ipv4_to_int
+
+    return dtype, _compile_decoder(legend_entry, time_mode='ns')
+
+
+class _ViewCompletion(Operation):
+    """ Waits for a view on a non-live source to process all of its packets """
+    def __init__(self, view, **kwargs):
+        super(_ViewCompletion, self).__init__(view.handle, **kwargs)
+        self.view = view
+
+    def poll(self):
+        view = self.view
+        stats = view.shark.api.view.get_stats(view.handle, timestamp_format=view.timestamp_format)
+        if stats['state'] == 'DONE':
+            return True, 1.0, 0
+        if stats.get('input_size'):
+            return False, float(stats['processed_size']) / stats['input_size'], None
+        return False, None, None
+
+
+# one of the results of View4._create_batch(), `error` is the exception
+# raised while creating or waiting for the view of `source`
+ViewResult = namedtuple('ViewResult', ['source', 'view', 'error'])
+
+
 class View4(_interfaces.View):
-    def __init__(self, shark, handle, config=None, source=None):
+    def __init__(self, shark, handle, config=None, source=None,
+                 time_mode='datetime'):
         super(View4, self).__init__()
         
         self.shark = shark
@@ -70,6 +298,19 @@ class View4(_interfaces.View):
         self._outputs = {}
         self.timestamp_format = APITimestampFormat.NANOSECOND
 
+        # CachedResults of the view if it was created with a cache,
+        # when it was served from the cache the handle is None
+        self._cached = None
+
+        # ViewPool sharing the view, see rvbd.shark.viewpool
+        self._pool = None
+
+        # how sample times are returned by the outputs of this view,
+        # see Output4.get_iterdata()
+        if time_mode not in TIME_MODES:
+            raise ValueError('invalid time mode %s' % time_mode)
+        self.time_mode = time_mode
+
         if config is None:
             self.config = shark.api.view.get_config(handle, timestamp_format=self.timestamp_format)
         else:
@@ -111,7 +352,8 @@ class View4(_interfaces.View):
     @classmethod
     def _create(cls, shark, source, columns, filters, sync=True, name=None,
                 cfg_params=None, template=None, charts=None, sampling_time_msec=None,
-                timestamp_format=APITimestampFormat.NANOSECOND):
+                timestamp_format=APITimestampFormat.NANOSECOND, time_mode='datetime',
+                cache=None):
 
         parsed_columns = list()
         for column in columns:
@@ -143,12 +385,122 @@ class View4(_interfaces.View):
         if name is not None:
             template['info']['title'] = name
 
+        # only complete views on sources that do not change are cached
+        key = None
+        if cache is not None and sync and not source.is_live():
+            key = cache.make_key(shark, source, template, timestamp_format)
+
+        if key is not None:
+            cached = cache.lookup(key)
+            if cached is not None:
+                config = dict(cached.config)
+                config['info'] = template['info']
+                view = cls(shark, None, config, source, time_mode=time_mode)
+                view._cached = cached
+                view._postapply()
+                return view
+
+        pool = getattr(shark, 'view_pool', None)
+        if pool is not None:
+            fingerprint = pool.fingerprint(template, time_mode)
+            view = pool.acquire(fingerprint)
+            if view is not None:
+                try:
+                    if sync:
+                        if not source.is_live():
+                            view._poll_completion()
+                        view._ensure_output()
+                    else:
+                        view.is_ready()
+                    return view
+                except Exception, e:
+                    if not isinstance(e, RvbdHTTPException) or e.status != 404:
+                        # the caller never gets the view to close it
+                        pool.release(view)
+                        raise
+                    # closed on the appliance by someone else
+                    logger.info('pooled view %s no longer exists' % view.handle)
+                    pool.discard(view)
+
         res = shark.api.view.add(template, timestamp_format=timestamp_format)
 
         handle = res.get('id')
 
-        view = cls(shark, handle, template, source)
-        return cls._process_view(view, source, sync)
+        view = cls(shark, handle, template, source, time_mode=time_mode)
+        view = cls._process_view(view, source, sync)
+        if key is not None:
+            view._cached = cache.add(key, view)
+        if pool is not None:
+            pool.add(fingerprint, view)
+        return view
+
+    @classmethod
+    def _create_batch(cls, shark, sources, columns, filters, max_in_flight=4,
+                      timeout=None, **kwargs):
+        """ Generator creating the same view on each of `sources`, with at
+        most `max_in_flight` of them open at the same time, and yielding
+        a ViewResult for each source in completion order.  A view is
+        closed when the next result is requested. """
+        sources = iter(sources)
+        scheduler = CompletionScheduler()
+        ready = deque()
+        # views created and not closed yet
+        open_views = []
+
+        def submit():
+            while len(open_views) < max_in_flight:
+                source = next(sources, None)
+                if source is None:
+                    return
+                try:
+                    view = cls._create(shark, source, columns, filters,
+                                       sync=False, **kwargs)
+                except Exception, e:
+                    ready.append(ViewResult(source, None, e))
+                    continue
+
+                shark._add_view(view)
+                open_views.append(view)
+                if source.is_live():
+                    ready.append(ViewResult(source, view, None))
+                else:
+                    op = view.completion(timeout=timeout)
+                    op.source = source
+                    scheduler.add(op)
+
+        def close(view):
+            open_views.remove(view)
+            try:
+                view.close()
+            except Exception, e:
+                logger.warning('failed to close view %s: %s' % (view.handle, e))
+
+        try:
+            while True:
+                submit()
+                if ready:
+                    result = ready.popleft()
+                else:
+                    op = scheduler.wait_next()
+                    if op is None:
+                        break
+                    result = ViewResult(op.source, op.view, op.error)
+                    if result.error is None:
+                        try:
+                            result.view._ensure_output()
+                        except Exception, e:
+                            result = ViewResult(op.source, op.view, e)
+                    if result.error is not None:
+                        close(result.view)
+                        result = ViewResult(op.source, None, result.error)
+
+                yield result
+
+                if result.view is not None:
+                    close(result.view)
+        finally:
+            for view in list(open_views):
+                close(view)
 
     @staticmethod
     def _format_columns(columns):
@@ -192,6 +544,9 @@ class View4(_interfaces.View):
     def _get_timeinfo(self):
         """Return the timeinfo exactly as it comes from shark
         """
+        if self._cached is not None:
+            return DictObject(self._cached.timeinfo)
+
         # check three times before giving up
         count = 0
         timeinfo = None
@@ -205,13 +560,29 @@ class View4(_interfaces.View):
                 time.sleep(0.5)
         return DictObject(timeinfo)
 
-    def _poll_completion(self):
-        while True:
-            res = self.shark.api.view.get_stats(self.handle, timestamp_format=self.timestamp_format)
-            status = res.get('state')
-            if status == "DONE":
-                break
-            time.sleep(0.5)
+    def _poll_completion(self, timeout=None):
+        wait_for([self.completion(timeout=timeout)])
+
+    def completion(self, timeout=None, on_progress=None, on_done=None):
+        """ Return an operation that completes when the view has
+        processed all the packets of its source, to be waited for with
+        rvbd.common.scheduler.wait_for() or a CompletionScheduler.
+
+        The `progress` of the operation is the fraction of the packet
+        source that has been processed.  `timeout`, `on_progress` and
+        `on_done` are described in rvbd.common.scheduler.Operation.
+        """
+        return _ViewCompletion(self, timeout=timeout,
+                               on_progress=on_progress, on_done=on_done)
+
+    def _ensure_handle(self):
+        """Apply the view on the appliance if it was served from the cache
+        """
+        if self.handle is None:
+            res = self.shark.api.view.add(self.config, timestamp_format=self.timestamp_format)
+            self.handle = res.get('id')
+            self.shark._add_view(self)
+            self._poll_completion()
 
     def _postapply(self):
         for processor in self.config['processors']:
@@ -221,7 +592,14 @@ class View4(_interfaces.View):
 
     def close(self):
         """Close this view on the server (which permanently deletes
-        the view plus any associated configuration and output data)."""
+        the view plus any associated configuration and output data).
+
+        If the view is shared through a ViewPool, it is only released,
+        and closed by the pool when no longer in use."""
+        if self._pool is not None:
+            return self._pool.release(self)
+        if self.handle is None:
+            return None
         return self.shark.api.view.close(self.handle)
 
     def is_ready(self):
@@ -230,6 +608,9 @@ class View4(_interfaces.View):
         False, the view data is still being computed, its progress
         can be followed with the method get_progress().
         """
+        if self.handle is None:
+            return True
+
         stats = self.shark.api.view.get_stats(self.handle, timestamp_format=self.timestamp_format)
 
         return stats['state'] == 'DONE'
@@ -241,6 +622,9 @@ class View4(_interfaces.View):
         Output data is not available on the view until this value reaches
         100% """
 
+        if self.handle is None:
+            return 100
+
         stats = self.shark.api.view.get_stats(self.handle, timestamp_format=self.timestamp_format)
         if stats['state'] == 'DONE' or stats['input_size'] == 0:
             return 100
@@ -249,12 +633,19 @@ class View4(_interfaces.View):
         
 
 class Output4(_interfaces.Output):
-    def __init__(self, view, ouid):
+    def __init__(self, view, ouid, time_mode=None):
         super(Output4, self).__init__()
         
         self.view = view
         self.id = ouid
         self._legend = self.get_legend()
+        self._row_decoders = {}
+        self._convert_sample_time = self._get_time_converter()
+
+        # None means use the time mode of the view
+        if time_mode is not None and time_mode not in TIME_MODES:
+            raise ValueError('invalid time mode %s' % time_mode)
+        self.time_mode = time_mode
 
     def get_legend(self):
         """ Return the legend for this output.  The legend consists of
@@ -275,6 +666,9 @@ class Output4(_interfaces.Output):
         * `base`
         * `dimension`
         """
+        cached = getattr(self.view, '_cached', None)
+        if cached is not None:
+            return cached.legends[self.id]
         return self.view.shark.api.view.get_legend(self.view.handle, self.id, timestamp_format=self.view.timestamp_format)
 
     def _get_time_resolution(self):
@@ -289,17 +683,49 @@ class Output4(_interfaces.Output):
         else:
             raise ValueError('invalid time format %s' % str(view.timestamp_format))
     
-    def _convert_sample_time(self, sample_timestamp):
+    def _get_time_mode(self, time_mode=None):
+        time_mode = time_mode or self.time_mode or getattr(self.view, 'time_mode', None)
+        if time_mode is None:
+            return 'datetime'
+        if time_mode not in TIME_MODES:
+            raise ValueError('invalid time mode %s' % time_mode)
+        return time_mode
+
+    def _get_row_decoder(self, time_mode):
+        """ Return the row decoder for `time_mode`, compiling it on
+        first use """
+        # absolute time columns are only affected by the 'ns' mode
+        key = 'ns' if time_mode == 'ns' else 'datetime'
+        try:
+            return self._row_decoders[key]
+        except KeyError:
+            decoder = _compile_row_decoder(self._legend, key)
+            self._row_decoders[key] = decoder
+            return decoder
+
+    def _get_time_to_nsec(self):
+        """ Return the multiplier that converts sample timestamps
+        to nanoseconds for the timestamp format of this view """
+        return 10**9 / self._get_time_resolution()
+
+    def _get_time_converter(self):
+        """ Return the function used to convert sample timestamps
+        for the timestamp format of this view """
         if self.view.timestamp_format == APITimestampFormat.SECOND:
-            return timeutils.sec_string_to_datetime(sample_timestamp)
+            return timeutils.sec_string_to_datetime
         elif self.view.timestamp_format == APITimestampFormat.MILLISECOND:
-            return timeutils.msec_string_to_datetime(sample_timestamp)
+            return timeutils.msec_string_to_datetime
         elif self.view.timestamp_format == APITimestampFormat.MICROSECOND:
-            return timeutils.usec_string_to_datetime(sample_timestamp)
+            return timeutils.usec_string_to_datetime
         elif self.view.timestamp_format == APITimestampFormat.NANOSECOND:
-            return timeutils.nsec_string_to_datetime(sample_timestamp)
+            return timeutils.nsec_string_to_datetime
         else:
-            raise ValueError('invalid time format %s' % str(view.timestamp_format))
+            raise ValueError('invalid time format %s' % str(self.view.timestamp_format))
+
+    def _timedelta_to_units(self, td):
+        """ Convert the `datetime.timedelta` `td` to the time units
+        used by the timestamp format of this view """
+        return ((td.days * 24 * 3600) + td.seconds) * self._get_time_resolution()
 
     def _parse_output_params(self, start=None, end=None, delta=None,
                              aggregated=False, sortby=None,
@@ -336,7 +762,7 @@ class Output4(_interfaces.Output):
 
         if hasattr(delta, 'seconds'):
             # looks like a timedelta
-            delta = ((delta.days * 24 * 3600) + delta.seconds) * self._get_time_resolution()
+            delta = self._timedelta_to_units(delta)
 
         if delta is None:
             #default value = 1s
@@ -370,14 +796,67 @@ class Output4(_interfaces.Output):
 
         return params
 
+    def _get_windows(self, params, window):
+        """ Split the time range of the output parameters `params`
+        into consecutive requests covering at most `window` each.
+        The window is rounded down to a multiple of the sampling delta
+        so that no sample straddles two requests. """
+        start = params['start']
+        end = params['end']
+        delta = params['delta']
+
+        if hasattr(window, 'seconds'):
+            window = self._timedelta_to_units(window)
+        window = max(window - window % delta, delta)
+
+        windows = []
+        while start <= end:
+            p = dict(params)
+            p['start'] = start
+            p['end'] = min(start + window - delta, end)
+            windows.append(p)
+            start += window
+        return windows
+
+    def _get_samples(self, params, stream=False):
+        """ Return the samples for the request parameters `params`.
+
+        If `stream` is True, return an iterator that decodes the samples
+        as the response is received instead of a list, unless the view
+        is cached, in which case the samples are needed to fill the cache.
+        """
+        cached = getattr(self.view, '_cached', None)
+        if cached is not None:
+            try:
+                return cached.get_samples(self.id, params)
+            except KeyError:
+                self.view._ensure_handle()
+
+        # aggregated debug
+        logger.debug('get_data params: %s' % params)
+
+        api = self.view.shark.api.view
+        if stream and cached is None:
+            return api.iter_data(self.view.handle, self.id, timestamp_format=self.view.timestamp_format, **params)
+
+        res = api.get_data(self.view.handle, self.id, timestamp_format=self.view.timestamp_format, **params)
+
+        samples = res.get('samples')
+        if cached is not None:
+            cached.put_samples(self.id, params, samples)
+        return samples
+
     def get_iterdata(self, start=None, end=None, delta=None,
                      aggregated=False,
                      sortby=None, sorttype="descending",
-                     fromentry=0, toentry=0):
+                     fromentry=0, toentry=0,
+                     window=None, prefetch=True, time_mode=None):
         """
         Returns an iterator to the output data. This function is ideal for
         sequential parsing of the view data, because it downloads the
-        dataset incrementally as it is accessed.
+        dataset incrementally as it is accessed: samples are decoded
+        as the response is received, so the whole response is never
+        held in memory.
 
         `start` and `end` are `datetime.datetime` objects representing
         the earliest and latest packets that should be considered.
@@ -409,27 +888,137 @@ class Output4(_interfaces.Output):
 
         The `toentry` parameter represent the last sorted item we want to
         appear in the output.  0 means all of them.
+
+        `window` is an optional `datetime.timedelta` object.  If it is
+        specified, the time range is retrieved with one request per
+        `window` (rounded down to a multiple of `delta`) instead of a
+        single request, which bounds the size of each response.  It
+        cannot be combined with `aggregated` or `sortby`.
+
+        If `prefetch` is True (the default) and `window` is specified, the
+        next window is downloaded in a background thread while the samples
+        of the current one are being consumed.  In that case each window
+        is decoded as a whole before its samples are returned.
+
+        `time_mode` selects how timestamps are returned, overriding the
+        `time_mode` of this output or of its view:
+        * `datetime` (the default): sample times and absolute time
+          columns are timezone aware `datetime.datetime` objects
+        * `ns`: sample times and absolute time columns are integer
+          nanoseconds since the Unix epoch
+        * `lazy`: like `datetime`, but the sample time is converted
+          to a `datetime.datetime` only when it is first accessed
+
+        Samples are returned as `Sample` objects, see its documentation
+        for details.
         """
+        time_mode = self._get_time_mode(time_mode)
+
         params = self._parse_output_params(start, end, delta, aggregated, sortby, sorttype, fromentry, toentry)
 
-        res = self.view.shark.api.view.get_data(self.view.handle, self.id, timestamp_format=self.view.timestamp_format, **params)
-        
-        samples = res.get('samples')
+        if window is None:
+            pages = [self._get_samples(params, stream=True)]
+        else:
+            if aggregated or sortby:
+                raise ValueError('window cannot be used with aggregated or sorted requests')
 
-        # aggregated debug
-        logger.debug('get_data params: %s' % params)
+            if start is None or end is None:
+                ti = self.view.get_timeinfo()
+                params = self._parse_output_params(start or ti.start, end or ti.end,
+                                                   delta, aggregated, sortby, sorttype,
+                                                   fromentry, toentry)
 
-        if samples is None:
-            return
+            windows = self._get_windows(params, window)
+            if prefetch:
+                pages = _iter_fetched(self._get_samples, windows)
+            else:
+                pages = (self._get_samples(p, stream=True) for p in windows)
 
-        for sample in samples:
-            if 'vals' not in sample or sample['p'] == 0:
+        for sample in self._iter_samples(pages, time_mode):
+            yield sample
+
+    def _iter_samples(self, pages, time_mode='datetime'):
+        """ Decode and yield the samples of each list in `pages` """
+        decode_row = self._get_row_decoder(time_mode)
+        convert_time = self._convert_sample_time
+        to_nsec = self._get_time_to_nsec()
+        for samples in pages:
+            if samples is None:
                 continue
-            
-            sample['t'] = self._convert_sample_time(sample['t'])
 
-            def convert_one(vec):
-                return [ _to_native(v, self._legend[i])
-                         for i, v in enumerate(vec) ]
-            sample['vals'] = [ convert_one(v) for v in sample['vals']]
-            yield sample
+            for sample in samples:
+                if 'vals' not in sample or sample['p'] == 0:
+                    continue
+
+                get = sample.get
+                t = sample['t']
+                convert = None
+                if time_mode == 'datetime':
+                    t = convert_time(t)
+                elif time_mode == 'ns':
+                    t = int(t) * to_nsec
+                else:
+                    convert = convert_time
+
+                yield Sample(t, [decode_row(v) for v in sample['vals']],
+                             sample['p'], get('u'), get('gap_start'),
+                             get('gap_end'), get('value_count'),
+                             get('value_sum'), convert)
+
+    def get_columnar(self, start=None, end=None, delta=None,
+                     aggregated=False,
+                     sortby=None, sorttype="descending",
+                     fromentry=0, toentry=0):
+        """
+        Get the data for this output as NumPy arrays, one per column,
+        instead of a list of samples.  This requires the `numpy` package.
+
+        Returns a tuple `(t, columns)`:
+
+        * `t` is an `int64` array with the sample time of every row,
+          in nanoseconds since the Unix epoch.  Samples of keyed
+          views contain several rows, each of them gets the time of
+          its sample.
+        * `columns` is a list with one array per legend entry, in legend
+          order.  The array dtype is chosen from the legend `type`:
+          integer types map to the matching signed/unsigned dtype,
+          `DOUBLE` and `RELATIVE_TIME` to `float64`, `BOOLEAN` to
+          `int64`, `IPv4` addresses to `uint32` and `ABSOLUTE_TIME`
+          to `int64` nanoseconds.  Strings and any other type are
+          returned in `object` arrays.
+
+        The arguments have the same meanings as corresponding arguments
+        to get_iterdata(), see its documentation for a full explanation
+        of all arguments and their meanings.
+        """
+        import numpy
+
+        params = self._parse_output_params(start, end, delta, aggregated, sortby, sorttype, fromentry, toentry)
+
+        samples = self._get_samples(params) or []
+        samples = [s for s in samples if 'vals' in s and s['p'] != 0]
+
+        nrows = sum(len(s['vals']) for s in samples)
+        to_nsec = self._get_time_to_nsec()
+
+        t = numpy.empty(nrows, dtype='int64')
+        decoders = []
+        columns = []
+        for entry in self._legend:
+            dtype, decode = _compile_columnar_decoder(entry)
+            columns.append(numpy.empty(nrows, dtype=dtype))
+            decoders.append(decode)
+
+        converters = [(column, decode or (lambda string: string), i)
+                      for i, (column, decode) in enumerate(izip(columns, decoders))]
+
+        row = 0
+        for sample in samples:
+            ts = int(sample['t']) * to_nsec
+            for vec in sample['vals']:
+                t[row] = ts
+                for column, decode, i in converters:
+                    column[row] = decode(vec[i])
+                row += 1
+
+        return t, columns
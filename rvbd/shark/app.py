@@ -21,7 +21,8 @@ class SharkApp(Application):
 
         self.shark = rvbd.shark.Shark(self.args[0], port=self.options.port,
                                       auth=self.auth,
-                                      force_version=self.options.api_version)
+                                      force_version=self.options.api_version,
+                                      session_cache=self.session_cache)
 
     def validate_args(self):
         if len(self.args) < 1:
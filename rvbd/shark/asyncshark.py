@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Asynchronous interface to a Shark appliance, for scripts that work
+with many Sharks at the same time:
+
+    from rvbd.common.futures import wait_all
+
+    sharks = wait_all([AsyncShark.connect(host, auth=auth) for host in hosts])
+    views = wait_all([s.create_view(s.service.get_file(path), columns)
+                      for s in sharks])
+    data = wait_all([s.get_data(v) for s, v in zip(sharks, views)])
+
+Requests are run by a shared pool of worker threads, and views are
+waited for by a single background thread, so the number of threads
+does not grow with the number of appliances.
+"""
+
+from __future__ import absolute_import
+
+from rvbd.common.service import AsyncService
+from rvbd.common.scheduler import default_scheduler
+from rvbd.shark.shark import Shark
+
+__all__ = ['AsyncShark']
+
+
+class AsyncShark(AsyncService):
+    """Asynchronous interface to a Shark, all methods return a
+    rvbd.common.futures.Future.  Use `AsyncShark.connect()` to create
+    the Shark object without blocking, the Shark itself is available
+    as `service`.
+    """
+    service_class = Shark
+
+    def __init__(self, shark, executor=None, scheduler=None):
+        super(AsyncShark, self).__init__(shark, executor=executor)
+        self.scheduler = scheduler or default_scheduler()
+
+    def create_view(self, src, columns, filters=None, timeout=None, **kwargs):
+        """Create a new view, see Shark.create_view() for the arguments.
+
+        The returned future completes with the view once it has
+        processed its packet source, or fails if this takes longer
+        than `timeout` seconds, in which case the view is closed.
+        """
+        kwargs['sync'] = False
+
+        def created(view):
+            if src.is_live():
+                future = self._submit(view._ensure_output)
+            else:
+                op = view.completion(timeout=timeout)
+                future = self.scheduler.submit(op).then(
+                    lambda op: self._submit(view._ensure_output))
+
+            def cleanup(f):
+                if f.exception() is not None:
+                    self._submit(view.close)
+
+            future.add_done_callback(cleanup)
+            return future.then(lambda res: view)
+
+        return self._submit(self.service.create_view, src, columns, filters,
+                            **kwargs).then(created)
+
+    def get_data(self, obj, *args, **kwargs):
+        """Return the data of `obj`, a view or an output, see
+        Output.get_data() for the arguments."""
+        return self._submit(obj.get_data, *args, **kwargs)
+
+    def get_columnar(self, obj, *args, **kwargs):
+        """Return the data of `obj`, a view or an output, as NumPy
+        arrays, see Output.get_columnar() for the arguments."""
+        return self._submit(obj.get_columnar, *args, **kwargs)
+
+    def close_view(self, view):
+        """Close `view` on the Shark"""
+        return self._submit(view.close)
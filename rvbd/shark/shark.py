@@ -51,7 +51,7 @@ class Shark(Service):
     trace clips, and to query and modify the appliance settings.
     """
     def __init__(self, host, port=None, auth=None,
-                 force_version=None):
+                 force_version=None, session_cache=None):
         """Establishes a connection to a Shark appliance.
 
         `host` is the name or IP address of the Shark to connect to
@@ -68,6 +68,10 @@ class Shark(Service):
                  if unspecified, this will use the latest version supported
                  by both this implementation and the Shark appliance.
 
+        `session_cache` is an optional rvbd.common.sessioncache.SessionCache
+                 used to reuse the session of a previous process.  Cached
+                 sessions are left open on logout.
+
         See the base [Service](common.html#service) class for more information
         about additional functionality supported.
         """
@@ -81,7 +85,8 @@ class Shark(Service):
                        [APIVersion(v) for v in SharkAPIVersions.LEGACY]
 
         super(Shark, self).__init__("shark", host, port=port, auth=auth,
-                                    versions=versions)
+                                    versions=versions,
+                                    session_cache=session_cache)
 
         self.api = API_TABLE[str(self.api_version)](self)
         self.classes = CLASS_TABLE[str(self.api_version)]()
@@ -91,10 +96,12 @@ class Shark(Service):
         except NotImplementedError:
             self.settings = Classes()
 
-        # Get the server info
-        self.serverinfo = self.get_serverinfo()
+        # the server info is fetched on first access
+        self._serverinfo = None
 
         self.views = {}
+        # optional rvbd.shark.viewpool.ViewPool used by create_view()
+        self.view_pool = None
         self._interfaces = None
         self.xtfields = {}
 
@@ -144,13 +151,13 @@ class Shark(Service):
         return [APIVersion(tree.get('Version'))]
 
     def logout(self):
-        if self.conn:
+        if self.conn and self.session_cache is None:
             try:
                 self.api.common.logout()
             except AttributeError:
                 pass
 
-            super(Shark, self).logout()
+        super(Shark, self).logout()
 
     def _detect_auth_methods(self):
         if self.api_version >= APIVersion("4.0"):
@@ -177,8 +184,9 @@ class Shark(Service):
 
     def _add_view(self, viewobj):
         """ add ``viewobj`` to the internal cache of view objects """
-        # No handle if view hasn't yet been applied
-        if not hasattr(viewobj, 'handle'):
+        # No handle if view hasn't yet been applied, or if it
+        # has been served from a ViewCache
+        if getattr(viewobj, 'handle', None) is None:
             return
         self.views[viewobj.handle] = viewobj
 
@@ -235,7 +243,8 @@ class Shark(Service):
     def create_view(self, src, columns, filters=None,
                     start_time=None, end_time=None,
                     name=None, charts=None, sync=True,
-                    sampling_time_msec=None):
+                    sampling_time_msec=None, time_mode='datetime',
+                    cache=None):
         """ Create a new view on this Shark.
 
         `src` identifies the source of packets to be analyzed.
@@ -249,6 +258,19 @@ class Shark(Service):
         to limit which packets from the packet source are processed
         by this view.
 
+        `time_mode` selects how the outputs of the view return
+        timestamps: 'datetime' (the default), 'ns' or 'lazy'.  See
+        Output.get_iterdata() for details.
+
+        `cache` is an optional rvbd.shark.viewcache.ViewCache.  If it is
+        specified, `sync` is True and `src` is a trace file or a trace
+        clip, the output of the view is saved in the cache, and a view
+        that is already in the cache is returned without being applied
+        on the appliance.
+
+        If `view_pool` is set to a rvbd.shark.viewpool.ViewPool, an
+        identical view that is already open is returned instead of
+        creating a new one.
         """
        
         if start_time is not None or end_time is not None:
@@ -263,10 +285,47 @@ class Shark(Service):
             filterobjs.extend([filt.bind(self) for filt in filters])
 
         view = self.classes.View._create(self, src, columns, filterobjs, name=name,
-                                         sync=sync, sampling_time_msec=sampling_time_msec)
+                                         sync=sync, sampling_time_msec=sampling_time_msec,
+                                         time_mode=time_mode, cache=cache)
         self._add_view(view)
         return view
 
+    def create_views(self, sources, columns, filters=None,
+                     start_time=None, end_time=None, max_in_flight=4,
+                     timeout=None, sampling_time_msec=None,
+                     time_mode='datetime'):
+        """ Create the same view on each of the packet sources in
+        `sources`, and return an iterator over the results.
+
+        At most `max_in_flight` views are open on the Shark at the same
+        time, and all the views being computed are waited for together.
+        Each result is a named tuple `(source, view, error)` and results
+        are returned as soon as each view is complete, which may differ
+        from the order of `sources`.  A view is closed when the next
+        result is requested, so its data must be read before moving on.
+
+        If creating the view on a source fails, or the view is not
+        complete after `timeout` seconds, `view` is None and `error`
+        is the exception that was raised.  Other sources are not affected.
+
+        The other arguments are the same as for `create_view()`.
+        """
+        if start_time is not None or end_time is not None:
+            if start_time is None or end_time is None:
+                raise ValueError('must specify both start and end times')
+            filters = list(filters or [])
+            filters.append(TimeFilter(start_time, end_time))
+
+        filterobjs = []
+        if filters is not None:
+            filterobjs.extend([filt.bind(self) for filt in filters])
+
+        return self.classes.View._create_batch(self, sources, columns, filterobjs,
+                                               max_in_flight=max_in_flight,
+                                               timeout=timeout,
+                                               sampling_time_msec=sampling_time_msec,
+                                               time_mode=time_mode)
+
     def create_job(self, interface, name,
              packet_retention_size_limit,
              packet_retention_packet_limit=None,
@@ -517,6 +576,15 @@ class Shark(Service):
         '''
         return self.api.system.get_info()
 
+    @property
+    def serverinfo(self):
+        '''The Shark appliance overall info, as returned by
+        `get_serverinfo()` the first time it is accessed.
+        '''
+        if self._serverinfo is None:
+            self._serverinfo = self.get_serverinfo()
+        return self._serverinfo
+
     def get_stats(self):
         '''Get the Shark appliance storage info
         '''
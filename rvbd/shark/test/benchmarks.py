@@ -0,0 +1,352 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the 
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").  
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Micro benchmarks for the client side processing of Shark view data.
+None of these need a Shark appliance, the data is synthetic.
+
+Run all of them with:
+
+    python -m rvbd.shark.test.benchmarks
+
+or just some of them by passing their names on the command line.
+"""
+
+import gc
+import sys
+import time
+import random
+import datetime
+
+from rvbd.common.utils import DictObject
+from rvbd.common.timeutils import tzutc
+from rvbd.shark import _view4
+from rvbd.shark._interfaces import Sample
+from rvbd.shark.test.fakes import make_output
+
+
+def timeit(fn, repeat=3):
+    """ Return the best wall clock time of `repeat` runs of `fn` """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, baseline, optimized):
+    print '%-30s baseline %8.3fs  optimized %8.3fs  speedup %5.2fx' % \
+          (name, baseline, optimized, baseline / optimized)
+
+
+DECODER_LEGEND = [
+    {'type': 'INT32', 'calculation': 'SUM', 'base': 'DEC'},
+    {'type': 'UINT64', 'calculation': 'SUM', 'base': 'DEC'},
+    {'type': 'UINT16', 'calculation': 'MAX', 'base': 'HEX'},
+    {'type': 'DOUBLE', 'calculation': 'MIN', 'base': 'DEC'},
+    {'type': 'ABSOLUTE_TIME', 'calculation': 'NONE', 'base': 'DEC'},
+    {'type': 'UINT64', 'calculation': 'AVG', 'base': 'DEC'},
+    {'type': 'DOUBLE', 'calculation': 'AVG', 'base': 'DEC'},
+    ]
+
+
+def make_rows(nrows):
+    rnd = random.Random(0)
+    t0 = 1365000000000000000
+    rows = []
+    for i in xrange(nrows):
+        rows.append([unicode(rnd.randint(-1000, 1000)),
+                     unicode(rnd.randint(0, 10 ** 12)),
+                     u'%x' % rnd.randint(0, 65535),
+                     unicode(rnd.random() * 1000),
+                     unicode(t0 + i * 1000000000),
+                     u'%d:%d' % (rnd.randint(0, 10 ** 6), rnd.randint(1, 100)),
+                     u'%f:%d' % (rnd.random(), rnd.randint(1, 100))])
+    return rows
+
+
+def bench_decoders(nrows=200000):
+    """ Compare per-cell `_to_native` with the precompiled row decoder """
+    legend = DECODER_LEGEND
+    rows = make_rows(nrows)
+
+    def baseline():
+        for vec in rows:
+            [_view4._to_native(v, legend[i]) for i, v in enumerate(vec)]
+
+    decode_row = _view4._compile_row_decoder(legend)
+
+    def optimized():
+        for vec in rows:
+            decode_row(vec)
+
+    report('decoders (%d cells)' % (nrows * len(legend)),
+           timeit(baseline), timeit(optimized))
+
+
+def bench_time_modes(nsamples=1000000):
+    """ Compare the 'datetime', 'ns' and 'lazy' time modes """
+    legend = [{'type': 'UINT64', 'calculation': 'SUM', 'base': 'DEC'}]
+    t0 = 1365000000000000000
+
+    def make_samples():
+        return [{'t': t0 + i * 1000000000, 'p': 1, 'vals': [[u'1']]}
+                for i in xrange(nsamples)]
+
+    output = make_output(legend, make_samples)
+
+    def run(time_mode):
+        def fn():
+            for s in output.get_iterdata(time_mode=time_mode):
+                pass
+        return fn
+
+    # building the synthetic samples is part of every run, measure it
+    # separately so it can be discounted
+    overhead = timeit(make_samples)
+    baseline = timeit(run('datetime')) - overhead
+    for time_mode in ('ns', 'lazy'):
+        report('time mode %s (%d samples)' % (time_mode, nsamples),
+               baseline, timeit(run(time_mode)) - overhead)
+
+
+def bench_samples(nsamples=200000):
+    """ Compare the memory held by, and the objects allocated for,
+    samples kept as JSON dicts (re-wrapped by DictObject in the mixer)
+    against `Sample` records """
+    t0 = datetime.datetime(2013, 4, 3, tzinfo=tzutc())
+
+    def as_dicts():
+        return [DictObject.create_from_dict(dict(t=t0, vals=[[i, i]],
+                                                 processed_pkts=None,
+                                                 unprocessed_pkts=None))
+                for i in xrange(nsamples)]
+
+    def as_samples():
+        return [Sample(t0, [[i, i]]) for i in xrange(nsamples)]
+
+    for name, fn in (('dict', as_dicts), ('Sample', as_samples)):
+        gc.collect()
+        before = len(gc.get_objects())
+        data = fn()
+        objects = len(gc.get_objects()) - before
+        size = sum(sys.getsizeof(s) for s in data) / len(data)
+        print '%-30s %5d bytes per sample  %6.2f gc objects per sample' % \
+              ('samples as %s' % name, size, float(objects) / nsamples)
+        del data
+
+    report('samples (%d created)' % nsamples,
+           timeit(as_dicts), timeit(as_samples))
+
+
+class FakeMixerOutput(object):
+    def __init__(self, legend, samples):
+        self.legend = legend
+        self.samples = samples
+
+    def get_legend(self):
+        return self.legend
+
+    def get_iterdata(self, *args, **kwargs):
+        return iter(self.samples)
+
+
+def min_index_mix(outputs, threshold=datetime.timedelta(seconds=1)):
+    """ The linear min()/list.index() merge OutputMixer used to do """
+    width = len(outputs)
+    iters = [o.get_iterdata() for o in outputs]
+    inputs = [next(i, None) for i in iters]
+    infinity = datetime.datetime(year=9999, month=12, day=31, tzinfo=tzutc())
+
+    def get_sample_time(s):
+        if s is None:
+            return infinity
+        return s.t
+
+    ms = min(inputs, key=get_sample_time)
+    sample_time = ms.t
+    vals = [None] * width
+    while ms is not None:
+        i = inputs.index(ms)
+        inputs[i] = next(iters[i], None)
+        if ms.t - sample_time >= threshold:
+            yield Sample(sample_time, [vals])
+            sample_time = ms.t
+            vals = [None] * width
+        vals[i] = ms.vals[0][0]
+        ms = min(inputs, key=get_sample_time)
+    yield Sample(sample_time, [vals])
+
+
+def bench_mixer(noutputs=50, nsamples=5000):
+    """ Merge `noutputs` one-column outputs with OutputMixer """
+    from rvbd.shark.viewutils import OutputMixer
+
+    t0 = datetime.datetime(2013, 4, 1, tzinfo=tzutc())
+    legend = [{'name': 'v', 'dimension': False}]
+    outputs = []
+    for i in xrange(noutputs):
+        samples = [Sample(t0 + datetime.timedelta(seconds=n), [[n]])
+                   for n in xrange(nsamples)]
+        outputs.append(FakeMixerOutput(legend, samples))
+
+    def baseline():
+        for s in min_index_mix(outputs):
+            pass
+
+    def optimized():
+        mixer = OutputMixer()
+        for o in outputs:
+            mixer.add_source(o)
+        for s in mixer.get_iterdata():
+            pass
+
+    report('mixer (%d outputs)' % noutputs, timeit(baseline), timeit(optimized))
+
+
+def _json_stream_child(mode, url):
+    """ Retrieve the view data at `url` with `mode` and print the
+    growth of the peak resident set size in KB and the elapsed time """
+    import resource
+    from rvbd.common.connection import Connection
+
+    conn = Connection(url)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if mode == 'loads':
+        count = len(conn.json_request('GET', '/data')['samples'])
+    else:
+        count = sum(1 for s in conn.json_request('GET', '/data', stream='samples'))
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print after - before, elapsed, count
+
+
+def bench_json_stream(nsamples=500000):
+    """ Compare the peak memory of decoding a large view data response
+    served locally, as a whole and with the streaming decoder """
+    import json
+    import subprocess
+    from rvbd.common.test.test_connection import FakeServer
+
+    t0 = 1365000000000000000
+    body = json.dumps({'samples': [{'t': t0 + i * 1000000000, 'p': 1,
+                                    'vals': [[str(i), '1.5', '10.0.0.1']]}
+                                   for i in xrange(nsamples)]})
+    server = FakeServer({'/data': body})
+    try:
+        results = {}
+        for mode in ('loads', 'stream'):
+            out = subprocess.check_output([sys.executable, '-m', 'rvbd.shark.test.benchmarks',
+                                           '--json-child', mode, server.url])
+            peak, elapsed, count = out.split()
+            results[mode] = float(elapsed)
+            print '%-30s %8.1f MB peak  %8.3fs  (%s samples, %.1f MB body)' % \
+                  ('json %s' % mode, int(peak) / 1024.0, float(elapsed),
+                   count, len(body) / 2.0 ** 20)
+    finally:
+        server.stop()
+
+    report('json stream (%d samples)' % nsamples,
+           results['loads'], results['stream'])
+
+
+def _slow_appliance(delay):
+    """ Return a local HTTP server answering the requests sent while
+    connecting to a Shark after `delay` seconds, and its url """
+    import json
+    import threading
+    import BaseHTTPServer
+    from rvbd.common.test.test_connection import ThreadingHTTPServer
+
+    responses = {
+        '/api/common/1.0/services': [{'id': 'shark', 'versions': ['5.0']}],
+        '/api/common/1.0/auth_info': {'supported_methods': ['COOKIE']},
+        '/api/common/1.0/login': {},
+        '/api/shark/5.0/system/info': {'version': '10.5'},
+        }
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        wbufsize = -1
+
+        def do_GET(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            body = json.dumps(responses[self.path.split('?')[0]])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Set-Cookie', 'session=1')
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_POST = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever,
+                              kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+    return httpd, 'http://127.0.0.1:%d' % httpd.server_port
+
+
+def bench_startup(delay=0.15):
+    """ Compare the time to connect to a Shark with `delay` seconds of
+    latency per request, sending the requests one after another as
+    Shark() used to, and with concurrent discovery """
+    from rvbd.shark import Shark
+    from rvbd.common.service import UserAuth
+    from rvbd.common.connection import Connection
+
+    httpd, url = _slow_appliance(delay)
+    auth = UserAuth('admin', 'admin')
+    try:
+        def sequential():
+            conn = Connection(url)
+            conn.json_request('GET', '/api/common/1.0/services')
+            conn.json_request('GET', '/api/common/1.0/auth_info')
+            conn.json_request('POST', '/api/common/1.0/login',
+                              body={'username': 'admin', 'password': 'admin'})
+            conn.json_request('GET', '/api/shark/5.0/system/info')
+            conn.conn.close()
+
+        def concurrent():
+            shark = Shark(url, auth=auth)
+            shark.conn.conn.close()
+
+        baseline = timeit(sequential)
+        optimized = timeit(concurrent)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    report('startup (%dms latency)' % (delay * 1000), baseline, optimized)
+
+
+BENCHMARKS = ['decoders', 'time_modes', 'samples', 'mixer', 'json_stream',
+              'startup']
+
+
+def main(args):
+    if args[:1] == ['--json-child']:
+        return _json_stream_child(*args[1:])
+
+    names = args or BENCHMARKS
+    for name in names:
+        globals()['bench_' + name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,135 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+Stand-ins for a Shark appliance, its view API and its packet sources,
+shared by the tests and benchmarks that run without an appliance.
+"""
+
+from rvbd.shark import _view4
+from rvbd.shark._api_helpers import APITimestampFormat
+
+
+LEGEND = [
+    {'type': 'UINT64', 'calculation': 'SUM', 'base': 'DEC'},
+    {'type': 'INT32', 'calculation': 'MAX', 'base': 'HEX'},
+    {'type': 'TCP_PORT', 'calculation': 'NONE', 'base': 'DEC'},
+    {'type': 'DOUBLE', 'calculation': 'MIN', 'base': 'DEC'},
+    {'type': 'DOUBLE', 'calculation': 'AVG', 'base': 'DEC'},
+    {'type': 'UINT32', 'calculation': 'AVG', 'base': 'DEC'},
+    {'type': 'RELATIVE_TIME', 'calculation': 'AVG', 'base': 'DEC'},
+    {'type': 'BOOLEAN', 'calculation': 'SUM', 'base': 'DEC'},
+    {'type': 'ABSOLUTE_TIME', 'calculation': 'NONE', 'base': 'DEC'},
+    {'type': 'IPv4', 'calculation': 'NONE', 'base': 'DEC'},
+    {'type': 'STRING', 'calculation': 'AVG', 'base': 'DEC'},
+    ]
+
+ROWS = [
+    [u'123456789', u'ff', u'80', u'1.5', u'10.0:4', u'9:2', u'3.0:3',
+     u'true', u'1365000000123456789', u'10.0.0.1', u'abc:2'],
+    [u'0', u'-1a', u'65535', u'-0.25', u'0:1', u'1:3', u'7.5:1',
+     u'17', u'1365000001000000000', u'192.168.1.254', u'x:1'],
+    ]
+
+SAMPLES = [
+    {'t': 1365000000000000000, 'p': 10, 'vals': [ROWS[0]]},
+    {'t': 1365000001000000000, 'p': 0},
+    {'t': 1365000002000000000, 'p': 5, 'vals': ROWS},
+    ]
+
+
+class FakeObject(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeViewAPI(object):
+    """ Stand-in for the `shark.api.view` group, serving a fixed
+    legend and sample list.  `samples` is either the list of samples
+    or a function returning it, called for every data request.
+
+    Views are complete as soon as they are added, the handles of the
+    views added and closed are recorded.
+    """
+    def __init__(self, legend, samples):
+        self.legend = legend
+        self.samples = samples
+        self.calls = []
+        self.added = []
+        self.closed = []
+
+    def _samples(self):
+        if callable(self.samples):
+            return self.samples()
+        return self.samples
+
+    def add(self, template, timestamp_format=None):
+        self.added.append(template)
+        return {'id': str(len(self.added))}
+
+    def get_stats(self, handle, timestamp_format=None):
+        samples = self._samples()
+        return {'state': 'DONE',
+                'time_details': {'start': samples[0]['t'],
+                                 'end': samples[-1]['t'],
+                                 'delta': 10**9}}
+
+    def close(self, handle):
+        self.closed.append(handle)
+
+    def get_legend(self, handle, output, timestamp_format=None):
+        return self.legend
+
+    def get_data(self, handle, output, timestamp_format=None, **params):
+        self.calls.append(params)
+        samples = self._samples()
+        if not params.get('start') or samples is None:
+            return {'samples': samples}
+        return {'samples': [dict(s) for s in samples
+                            if params['start'] <= s['t'] <= params['end']]}
+
+    def iter_data(self, handle, output, timestamp_format=None, **params):
+        return iter(self.get_data(handle, output, timestamp_format, **params)['samples'] or [])
+
+
+def make_output(legend, samples):
+    """ Return an Output4 whose data is `samples`, see FakeViewAPI """
+    api = FakeObject(view=FakeViewAPI(legend, samples))
+    view = FakeObject(shark=FakeObject(api=api), handle='1',
+                      timestamp_format=APITimestampFormat.NANOSECOND,
+                      time_mode='datetime')
+    return _view4.Output4(view, 'OOUID')
+
+
+class FakeTraceFile(object):
+    source_path = 'fs/admin/trace.pcap'
+    source_options = {}
+
+    def __init__(self, checksum):
+        self._checksum = checksum
+
+    def is_live(self):
+        return False
+
+    def checksum(self):
+        return self._checksum
+
+
+class FakeShark(object):
+    """ Shark whose views serve LEGEND and SAMPLES """
+    host = 'shark'
+
+    def __init__(self):
+        self.api = FakeObject(view=FakeViewAPI(LEGEND, SAMPLES))
+        self.views = {}
+
+    def find_extractor_field_by_name(self, name):
+        return FakeObject(id=name, description=name)
+
+    def _add_view(self, view):
+        self.views[view.handle] = view
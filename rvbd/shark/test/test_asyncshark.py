@@ -0,0 +1,49 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import unittest
+
+from rvbd.shark import _view4
+from rvbd.shark.types import Value
+from rvbd.shark.asyncshark import AsyncShark
+from rvbd.common.futures import wait_all
+from rvbd.common.exceptions import CompletionTimeout
+from rvbd.shark.test.fakes import FakeShark, FakeTraceFile
+
+
+class FakeAsyncShark(FakeShark):
+    conn = None
+
+    def __init__(self, state='DONE'):
+        super(FakeAsyncShark, self).__init__()
+        self.api.view.get_stats = lambda handle, timestamp_format=None: {
+            'state': state, 'input_size': 0}
+
+    def create_view(self, src, columns, filters=None, sync=True, **kwargs):
+        return _view4.View4._create(self, src, columns, filters, sync=sync, **kwargs)
+
+
+class AsyncSharkTests(unittest.TestCase):
+
+    def test_create_view(self):
+        sharks = [AsyncShark(FakeAsyncShark()) for i in range(5)]
+        views = wait_all([s.create_view(FakeTraceFile('abc'), [Value('generic.bytes')])
+                          for s in sharks])
+        data = wait_all([s.get_data(v) for s, v in zip(sharks, views)])
+        self.assertEqual([len(d) for d in data], [2] * 5)
+
+    def test_create_view_timeout(self):
+        shark = FakeAsyncShark(state='RUNNING')
+        future = AsyncShark(shark).create_view(FakeTraceFile('abc'),
+                                               [Value('generic.bytes')],
+                                               timeout=0)
+        self.assertRaises(CompletionTimeout, future.result, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
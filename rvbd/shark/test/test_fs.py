@@ -0,0 +1,61 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import unittest
+
+from rvbd.shark._fs import TraceFile4
+from rvbd.shark._exceptions import SharkException
+from rvbd.common.scheduler import CompletionScheduler
+from rvbd.shark.test.fakes import FakeObject
+
+
+class FakeFSAPI(object):
+    """ Returns the index statuses in `statuses`, one per request """
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    def index_info(self, path):
+        self.requests += 1
+        return {'status': self.statuses.pop(0)}
+
+
+def make_trace_file(statuses):
+    shark = FakeObject(api=FakeObject(fs=FakeFSAPI(statuses)))
+    # skip the constructor, it fetches the details of the file
+    trace = TraceFile4.__new__(TraceFile4)
+    trace.shark = shark
+    trace.data = {'id': '/admin/trace.pcap'}
+    return trace
+
+
+class IndexCompletionTests(unittest.TestCase):
+
+    def wait(self, trace):
+        scheduler = CompletionScheduler(min_interval=0, max_interval=0)
+        scheduler._sleep = lambda seconds: None
+        scheduler.add(trace.index_completion())
+        scheduler.wait()
+
+    def test_ok(self):
+        trace = make_trace_file(['IN_PROGRESS', 'IN_PROGRESS', 'OK'])
+        self.wait(trace)
+        self.assertEqual(trace.shark.api.fs.requests, 3)
+
+    def test_error(self):
+        trace = make_trace_file(['IN_PROGRESS', 'ERROR', 'OK'])
+        self.assertRaises(SharkException, self.wait, trace)
+        self.assertEqual(trace.shark.api.fs.requests, 2)
+
+    def test_error_state(self):
+        trace = make_trace_file([{'state': 'FAILED'}])
+        self.assertRaises(SharkException, self.wait, trace)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the 
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").  
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import unittest
+import datetime
+
+from rvbd.shark import _view4
+from rvbd.shark.test.fakes import LEGEND, ROWS, SAMPLES, make_output
+
+
+class DecoderTests(unittest.TestCase):
+
+    def test_compiled_decoders_match_to_native(self):
+        for entry in LEGEND:
+            decode = _view4._compile_decoder(entry) or (lambda s: s)
+            for row in ROWS:
+                v = row[LEGEND.index(entry)]
+                self.assertEqual(decode(v), _view4._to_native(v, entry))
+
+    def test_row_decoder(self):
+        decode_row = _view4._compile_row_decoder(LEGEND)
+        for row in ROWS:
+            expected = [_view4._to_native(v, LEGEND[i])
+                        for i, v in enumerate(row)]
+            self.assertEqual(decode_row(row), expected)
+
+    def test_row_decoder_passthrough(self):
+        legend = [{'type': 'IPv4', 'calculation': 'NONE', 'base': 'DEC'}]
+        row = [u'10.0.0.1']
+        decoded = _view4._compile_row_decoder(legend)(row)
+        self.assertEqual(decoded, row)
+        self.assertFalse(decoded is row)
+
+    def test_bad_base(self):
+        entry = {'type': 'INT16', 'calculation': 'SUM', 'base': 'OCT'}
+        decode = _view4._compile_decoder(entry)
+        self.assertRaises(ValueError, decode, u'10')
+
+
+class ColumnarTests(unittest.TestCase):
+
+    def test_get_columnar(self):
+        output = make_output(LEGEND, SAMPLES)
+        t, columns = output.get_columnar()
+
+        self.assertEqual(list(t), [1365000000000000000,
+                                   1365000002000000000,
+                                   1365000002000000000])
+        self.assertEqual(len(columns), len(LEGEND))
+        self.assertEqual(str(columns[0].dtype), 'uint64')
+        self.assertEqual(str(columns[1].dtype), 'int32')
+        self.assertEqual(str(columns[4].dtype), 'float64')
+        self.assertEqual(str(columns[9].dtype), 'uint32')
+        self.assertEqual(str(columns[10].dtype), 'object')
+
+        self.assertEqual(list(columns[0]), [123456789, 123456789, 0])
+        self.assertEqual(list(columns[1]), [255, 255, -26])
+        self.assertEqual(list(columns[4]), [2.5, 2.5, 0.0])
+        self.assertEqual(list(columns[5]), [4, 4, 0])
+        self.assertEqual(list(columns[7]), [1, 1, 17])
+        self.assertEqual(list(columns[8]), [1365000000123456789,
+                                            1365000000123456789,
+                                            1365000001000000000])
+        self.assertEqual(list(columns[9]), [167772161, 167772161, 3232236030])
+        self.assertEqual(list(columns[10]), [u'abc', u'abc', u'x'])
+
+    def test_get_columnar_empty(self):
+        output = make_output(LEGEND, None)
+        t, columns = output.get_columnar()
+        self.assertEqual(len(t), 0)
+        self.assertEqual([len(c) for c in columns], [0] * len(LEGEND))
+
+
+
+class WindowTests(unittest.TestCase):
+
+    T0 = 1365000000000000000
+    SEC = 1000000000
+
+    def setUp(self):
+        samples = [{'t': self.T0 + i * self.SEC, 'p': 1,
+                    'vals': [[unicode(i)]]}
+                   for i in range(10)]
+        legend = [{'type': 'UINT64', 'calculation': 'SUM', 'base': 'DEC'}]
+        self.output = make_output(legend, samples)
+        self.api = self.output.view.shark.api.view
+
+    def _check(self, prefetch):
+        data = list(self.output.get_iterdata(start=self.T0,
+                                             end=self.T0 + 10 * self.SEC,
+                                             window=datetime.timedelta(seconds=3),
+                                             prefetch=prefetch))
+        self.assertEqual([s['vals'][0][0] for s in data], range(10))
+        self.assertEqual([(c['start'], c['end']) for c in self.api.calls],
+                         [(self.T0 + i * self.SEC, self.T0 + (i + 2) * self.SEC)
+                          for i in (0, 3, 6)] +
+                         [(self.T0 + 9 * self.SEC, self.T0 + 9 * self.SEC)])
+
+    def test_windows(self):
+        self._check(prefetch=False)
+
+    def test_windows_prefetch(self):
+        self._check(prefetch=True)
+
+    def test_window_rounded_to_delta(self):
+        list(self.output.get_iterdata(start=self.T0,
+                                      end=self.T0 + 4 * self.SEC,
+                                      delta=datetime.timedelta(seconds=2),
+                                      window=datetime.timedelta(seconds=3)))
+        self.assertEqual([(c['start'], c['end']) for c in self.api.calls],
+                         [(self.T0, self.T0), (self.T0 + 2 * self.SEC,
+                                               self.T0 + 2 * self.SEC)])
+
+    def test_window_aggregated(self):
+        it = self.output.get_iterdata(start=self.T0, end=self.T0 + self.SEC,
+                                      aggregated=True,
+                                      window=datetime.timedelta(seconds=3))
+        self.assertRaises(ValueError, list, it)
+
+    def test_prefetch_error(self):
+        def fail(arg):
+            if arg == 2:
+                raise RuntimeError(arg)
+            return arg
+        it = _view4._iter_fetched(fail, range(4))
+        self.assertEqual(next(it), 0)
+        self.assertEqual(next(it), 1)
+        self.assertRaises(RuntimeError, next, it)
+
+
+class TimeModeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.legend = [LEGEND[0], LEGEND[8]]
+        self.rows = [[r[0], r[8]] for r in ROWS]
+
+    def _samples(self):
+        return [{'t': 1365000000000000000, 'p': 1, 'vals': [self.rows[0]]},
+                {'t': 1365000001000000000, 'p': 1, 'vals': [self.rows[1]]}]
+
+    def test_datetime(self):
+        output = make_output(self.legend, self._samples())
+        data = output.get_data()
+        self.assertEqual(data[0]['t'],
+                         _view4.timeutils.nsec_to_datetime(1365000000000000000))
+        self.assertEqual(data[1]['vals'][0][1],
+                         _view4.timeutils.nsec_to_datetime(1365000001000000000))
+
+    def test_ns(self):
+        output = make_output(self.legend, self._samples())
+        data = output.get_data(time_mode='ns')
+        self.assertEqual([s['t'] for s in data],
+                         [1365000000000000000, 1365000001000000000])
+        self.assertEqual(data[0]['vals'][0], [123456789, 1365000000123456789])
+
+    def test_lazy(self):
+        output = make_output(self.legend, self._samples())
+        output.time_mode = 'lazy'
+        data = output.get_data()
+        self.assertTrue(isinstance(data[0], _view4.Sample))
+        self.assertEqual(data[0]._t, 1365000000000000000)
+        expected = _view4.timeutils.nsec_to_datetime(1365000000000000000)
+        self.assertEqual(data[0].t, expected)
+        self.assertEqual(data[0]['t'], expected)
+        self.assertEqual(data[0].p, 1)
+        self.assertEqual(data[0]['vals'], data[0].vals)
+        self.assertFalse('gap_start' in data[0])
+
+    def test_view_time_mode(self):
+        output = make_output(self.legend, self._samples())
+        output.view.time_mode = 'ns'
+        self.assertEqual(output.get_data()[0]['t'], 1365000000000000000)
+
+    def test_invalid(self):
+        output = make_output(self.legend, self._samples())
+        self.assertRaises(ValueError, list, output.get_iterdata(time_mode='s'))
+
+
+if __name__ == '__main__':
+    unittest.main()
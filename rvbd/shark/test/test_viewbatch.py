@@ -0,0 +1,75 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import unittest
+
+from rvbd.shark import _view4
+from rvbd.shark.types import Value
+from rvbd.common.exceptions import RvbdException
+from rvbd.shark.test.fakes import FakeShark, FakeTraceFile
+
+
+class FakeSource(FakeTraceFile):
+    def __init__(self, path):
+        super(FakeSource, self).__init__(path)
+        self.source_path = path
+
+
+class FakeBatchShark(FakeShark):
+    def __init__(self):
+        super(FakeBatchShark, self).__init__()
+        api = self.api.view
+        add = api.add
+        self.max_open = 0
+
+        def checked_add(template, timestamp_format=None):
+            if template['input_source']['path'] == 'bad':
+                raise RvbdException('no such file')
+            res = add(template, timestamp_format)
+            self.max_open = max(self.max_open, len(api.added) - len(api.closed))
+            return res
+        api.add = checked_add
+
+
+class BatchTests(unittest.TestCase):
+
+    def test_batch(self):
+        shark = FakeBatchShark()
+        sources = [FakeSource('f%d' % i) for i in range(10)]
+        sources.insert(3, FakeSource('bad'))
+
+        results = _view4.View4._create_batch(shark, sources, [Value('generic.bytes')],
+                                             None, max_in_flight=3)
+        done = []
+        for result in results:
+            if result.source.source_path == 'bad':
+                self.assertEqual(result.view, None)
+                self.assertTrue(isinstance(result.error, RvbdException))
+            else:
+                self.assertEqual(result.error, None)
+                self.assertTrue(result.view.get_data())
+            done.append(result.source)
+
+        self.assertEqual(sorted(done), sorted(sources))
+        self.assertEqual(len(shark.api.view.added), 10)
+        self.assertEqual(len(shark.api.view.closed), 10)
+        self.assertTrue(shark.max_open <= 3)
+
+    def test_early_exit_closes_views(self):
+        shark = FakeBatchShark()
+        sources = [FakeSource('f%d' % i) for i in range(10)]
+        results = _view4.View4._create_batch(shark, sources, [Value('generic.bytes')],
+                                             None, max_in_flight=4)
+        next(results)
+        results.close()
+        self.assertEqual(len(shark.api.view.added), 4)
+        self.assertEqual(len(shark.api.view.closed), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rvbd.shark import _view4
+from rvbd.shark.types import Value
+from rvbd.shark.filters import SharkFilter
+from rvbd.shark.viewcache import ViewCache
+from rvbd.shark.test.fakes import FakeShark, FakeTraceFile, SAMPLES
+
+
+class ViewCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ViewCache(directory=self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def create(self, shark, source, filters=None):
+        columns = [Value('generic.bytes')]
+        view = _view4.View4._create(shark, source, columns, filters,
+                                    cache=self.cache)
+        return view
+
+    def test_hit(self):
+        source = FakeTraceFile('abc')
+        shark = FakeShark()
+        view = self.create(shark, source, [SharkFilter('ip.address="10.0.0.1"')])
+        data = [(s.t, s.vals) for s in view.get_data()]
+        self.assertEqual(len(shark.api.view.calls), 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        # a new view with the same definition does not contact the appliance
+        shark = FakeShark()
+        view = self.create(shark, source, [SharkFilter('ip.address="10.0.0.1"')])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(view.handle, None)
+        self.assertEqual([(s.t, s.vals) for s in view.get_data()], data)
+        self.assertEqual(view.get_timeinfo().start, SAMPLES[0]['t'])
+        self.assertEqual(shark.api.view.added, [])
+        self.assertEqual(shark.api.view.calls, [])
+        view.close()
+
+    def test_miss_on_different_definition(self):
+        self.create(FakeShark(), FakeTraceFile('abc')).get_data()
+        self.create(FakeShark(), FakeTraceFile('def')).get_data()
+        self.create(FakeShark(), FakeTraceFile('abc'), [SharkFilter('tcp')]).get_data()
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_new_request_applies_view(self):
+        source = FakeTraceFile('abc')
+        self.create(FakeShark(), source).get_data()
+
+        shark = FakeShark()
+        view = self.create(shark, source)
+        data = view.get_data(start=SAMPLES[1]['t'], end=SAMPLES[2]['t'] + 10**9)
+        self.assertEqual(len(shark.api.view.added), 1)
+        self.assertEqual(view.handle, '1')
+        self.assertEqual([s.t for s in data],
+                         [_view4.timeutils.nsec_to_datetime(SAMPLES[2]['t'])])
+
+    def test_corrupt_entry(self):
+        source = FakeTraceFile('abc')
+        data = [(s.t, s.vals) for s in self.create(FakeShark(), source).get_data()]
+
+        # truncate every item, as if the script had been interrupted
+        for root, dirs, files in os.walk(self.dir):
+            for name in files:
+                with open(os.path.join(root, name), 'r+b') as f:
+                    f.truncate(3)
+
+        shark = FakeShark()
+        view = self.create(shark, source)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(len(shark.api.view.added), 1)
+        self.assertEqual([(s.t, s.vals) for s in view.get_data()], data)
+
+    def test_eviction(self):
+        self.cache = ViewCache(max_size=1, directory=self.dir)
+        self.create(FakeShark(), FakeTraceFile('abc')).get_data()
+        self.assertEqual(self.cache._store.size(), 0)
+
+        self.create(FakeShark(), FakeTraceFile('abc')).get_data()
+        self.assertEqual(self.cache.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
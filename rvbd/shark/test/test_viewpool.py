@@ -0,0 +1,138 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import json
+import time
+import unittest
+
+from rvbd.shark import _view4
+from rvbd.shark.types import Value
+from rvbd.shark.filters import SharkFilter
+from rvbd.shark.viewpool import ViewPool
+from rvbd.common.exceptions import RvbdException, RvbdHTTPException
+from rvbd.shark.test.fakes import FakeObject, FakeShark, FakeTraceFile
+
+
+class FakePoolShark(FakeShark):
+    def __init__(self):
+        super(FakePoolShark, self).__init__()
+        self.view_pool = ViewPool(self, idle_timeout=60, reap=False)
+        self.now = 0
+        self.view_pool._clock = lambda: self.now
+
+
+def not_found():
+    result = FakeObject(status_code=404, reason='Not Found',
+                        headers={'Content-type': 'application/json'})
+    data = json.dumps({'error_id': 'RESOURCE_NOT_FOUND',
+                       'error_text': 'view not found'})
+    return RvbdHTTPException(result, data, 'GET', '/view')
+
+
+class ViewPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.shark = FakePoolShark()
+        self.pool = self.shark.view_pool
+        self.api = self.shark.api.view
+
+    def create(self, filters=None, **kwargs):
+        columns = [Value('generic.bytes')]
+        return _view4.View4._create(self.shark, FakeTraceFile('abc'),
+                                    columns, filters, **kwargs)
+
+    def test_reuse(self):
+        v1 = self.create()
+        v2 = self.create()
+        v3 = self.create([SharkFilter('tcp')])
+        self.assertTrue(v1 is v2)
+        self.assertFalse(v1 is v3)
+        self.assertEqual(len(self.api.added), 2)
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(self.pool.misses, 2)
+        self.assertAlmostEqual(self.pool.hit_rate(), 1 / 3.0)
+
+    def test_refcount_and_idle_timeout(self):
+        v1 = self.create()
+        self.create()
+        v1.close()
+        v1.close()
+        self.assertEqual(self.api.closed, [])
+
+        # an idle view is reused
+        self.shark.now = 30
+        self.assertTrue(self.create() is v1)
+        v1.close()
+
+        self.shark.now = 89
+        self.pool.expire()
+        self.assertEqual(self.api.closed, [])
+        self.shark.now = 90
+        self.pool.expire()
+        self.assertEqual(self.api.closed, ['1'])
+
+        self.assertFalse(self.create() is v1)
+        self.assertEqual(len(self.api.added), 2)
+
+    def test_close_pool(self):
+        v1 = self.create()
+        self.pool.close()
+        self.assertEqual(self.api.closed, ['1'])
+        self.assertEqual(v1._pool, None)
+
+    def test_time_mode(self):
+        v1 = self.create()
+        v2 = self.create(time_mode='ns')
+        self.assertFalse(v1 is v2)
+        self.assertEqual(v2.time_mode, 'ns')
+        self.assertTrue(self.create(time_mode='ns') is v2)
+
+    def test_reaper(self):
+        pool = ViewPool(self.shark, idle_timeout=0.05)
+        self.shark.view_pool = pool
+        v1 = self.create()
+        v1.close()
+        for i in range(100):
+            if self.api.closed:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.api.closed, ['1'])
+        self.assertEqual(pool._entries, {})
+        pool.close()
+
+    def test_view_closed(self):
+        v1 = self.create()
+        v1.close()
+
+        def get_stats(handle, timestamp_format=None):
+            raise not_found()
+        self.api.get_stats = get_stats
+
+        # the view closed on the appliance is replaced by a new one
+        v2 = self.create(sync=False)
+        self.assertFalse(v2 is v1)
+        self.assertEqual(len(self.api.added), 2)
+        self.assertEqual(v1._pool, None)
+
+    def test_error(self):
+        v1 = self.create()
+        v1.close()
+
+        def get_stats(handle, timestamp_format=None):
+            raise RvbdException('timeout')
+        self.api.get_stats = get_stats
+
+        self.assertRaises(RvbdException, self.create, sync=False)
+        # the reference taken by the failed call is released
+        self.shark.now = 60
+        self.pool.expire()
+        self.assertEqual(self.api.closed, ['1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the 
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").  
+# This software is distributed "AS IS" as set forth in the License.
+
+
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+import datetime
+
+from rvbd.common.utils import DictObject
+from rvbd.common.timeutils import tzutc
+from rvbd.shark._interfaces import Sample
+from rvbd.shark.viewutils import OutputMixer, write_csv
+
+
+T0 = datetime.datetime(2013, 4, 3, 12, 0, 0, tzinfo=tzutc())
+
+
+def sec(n):
+    return T0 + datetime.timedelta(seconds=n)
+
+
+class FakeOutput(object):
+    """ An output with a fixed legend and list of samples """
+    def __init__(self, legend, samples):
+        self.legend = [DictObject(f) for f in legend]
+        self.samples = samples
+
+    def get_legend(self):
+        return self.legend
+
+    def get_iterdata(self, *args, **kwargs):
+        return iter(self.samples)
+
+
+class SampleTests(unittest.TestCase):
+
+    def test_access(self):
+        s = Sample(T0, [[1, 2]], p=10)
+        self.assertEqual(s.t, T0)
+        self.assertEqual(s['t'], T0)
+        self.assertEqual(s['vals'], [[1, 2]])
+        self.assertEqual(s.p, 10)
+        self.assertEqual(s.processed_pkts, 10)
+        self.assertTrue('p' in s)
+        self.assertFalse('gap_start' in s)
+        self.assertFalse('foo' in s)
+        self.assertEqual(s.get('gap_end', 0), 0)
+        self.assertRaises(KeyError, lambda: s['u'])
+        self.assertEqual(sorted(s.keys()), ['p', 't', 'vals'])
+
+        s['u'] = 3
+        self.assertEqual(s.u, 3)
+        self.assertRaises(AttributeError, setattr, s, 'foo', 1)
+
+    def test_mapping(self):
+        s = Sample(5, [[1, 2]], p=10)
+        self.assertEqual(s.items(), [('t', 5), ('vals', [[1, 2]]), ('p', 10)])
+        self.assertEqual(s.values(), [5, [[1, 2]], 10])
+        self.assertEqual(dict(s.iteritems()), {'t': 5, 'vals': [[1, 2]], 'p': 10})
+        self.assertEqual(json.loads(json.dumps(s.to_dict())),
+                         {'t': 5, 'vals': [[1, 2]], 'p': 10})
+
+    def test_deferred_time(self):
+        calls = []
+
+        def convert(t):
+            calls.append(t)
+            return sec(t)
+
+        s = Sample(5, [], convert=convert)
+        self.assertEqual(calls, [])
+        self.assertEqual(s.t, sec(5))
+        self.assertEqual(s['t'], sec(5))
+        self.assertEqual(calls, [5])
+
+        s.t = 7
+        self.assertEqual(s.t, 7)
+
+
+class OutputMixerTests(unittest.TestCase):
+
+    def test_mix(self):
+        legend = [{'name': 'bytes', 'dimension': False}]
+        o1 = FakeOutput(legend, [Sample(sec(0), [[1]]), Sample(sec(1), [[2]])])
+        o2 = FakeOutput(legend, [Sample(sec(0), [[10]]), Sample(sec(2), [[30]])])
+
+        mixer = OutputMixer()
+        mixer.add_source(o1, 'a')
+        mixer.add_source(o2, 'b')
+        self.assertEqual([f.name for f in mixer.get_legend()], ['abytes', 'bbytes'])
+
+        data = list(mixer.get_iterdata())
+        self.assertTrue(all(isinstance(s, Sample) for s in data))
+        self.assertEqual([(s.t, s.vals) for s in data],
+                         [(sec(0), [[1, 10]]),
+                          (sec(1), [[2, None]]),
+                          (sec(2), [[None, 30]])])
+
+    def test_mix_ns(self):
+        legend = [{'name': 'bytes', 'dimension': False}]
+        o1 = FakeOutput(legend, [Sample(0, [[1]]), Sample(10**9, [[2]])])
+        o2 = FakeOutput(legend, [Sample(5 * 10**8, [[10]]), Sample(2 * 10**9, [[30]])])
+
+        mixer = OutputMixer()
+        mixer.add_source(o1, 'a')
+        mixer.add_source(o2, 'b')
+        data = list(mixer.get_iterdata(time_mode='ns'))
+        self.assertEqual([(s.t, s.vals) for s in data],
+                         [(0, [[1, 10]]),
+                          (10**9, [[2, None]]),
+                          (2 * 10**9, [[None, 30]])])
+
+        data = list(mixer.get_iterdata(time_mode='ns',
+                                       time_thresh=datetime.timedelta(seconds=2)))
+        self.assertEqual([(s.t, s.vals) for s in data],
+                         [(0, [[2, 10]]), (2 * 10**9, [[None, 30]])])
+
+    def test_mix_empty(self):
+        legend = [{'name': 'bytes', 'dimension': False}]
+        mixer = OutputMixer()
+        mixer.add_source(FakeOutput(legend, []))
+        self.assertEqual(list(mixer.get_iterdata()), [])
+
+    def test_mix_many(self):
+        legend = [{'name': 'v', 'dimension': False}]
+        mixer = OutputMixer()
+        for i in range(20):
+            samples = [Sample(sec(n), [[i * 100 + n]])
+                       for n in range(i % 3, 10, 3)]
+            mixer.add_source(FakeOutput(legend, samples))
+
+        data = list(mixer.get_iterdata())
+        self.assertEqual([s.t for s in data], [sec(n) for n in range(10)])
+        for n, s in enumerate(data):
+            expected = [i * 100 + n if (n - i) % 3 == 0 else None
+                        for i in range(20)]
+            self.assertEqual(s.vals, [expected])
+
+    def test_mix_keyed(self):
+        legend_bytes = [{'name': 'host', 'field': 'ip.src', 'dimension': True},
+                        {'name': 'bytes', 'field': 'generic.bytes', 'dimension': False}]
+        legend_pkts = [{'name': 'pkts', 'field': 'generic.packets', 'dimension': False},
+                       {'name': 'host', 'field': 'ip.src', 'dimension': True}]
+        o1 = FakeOutput(legend_bytes,
+                        [Sample(sec(0), [['a', 100], ['b', 200]]),
+                         Sample(sec(1), [['a', 300]])])
+        o2 = FakeOutput(legend_pkts,
+                        [Sample(sec(0), [[2, 'b'], [5, 'c']]),
+                         Sample(sec(1), [[3, 'a']])])
+
+        mixer = OutputMixer()
+        mixer.add_source(o1, 'b_')
+        mixer.add_source(o2, 'p_')
+        self.assertEqual([f.name for f in mixer.get_legend()],
+                         ['host', 'b_bytes', 'p_pkts'])
+        self.assertEqual([f.id for f in mixer.get_legend()], ['x0', 'x1', 'x2'])
+
+        data = list(mixer.get_iterdata())
+        self.assertEqual([(s.t, s.vals) for s in data],
+                         [(sec(0), [['a', 100, None], ['b', 200, 2], ['c', None, 5]]),
+                          (sec(1), [['a', 300, 3]])])
+
+    def test_mix_different_keys(self):
+        mixer = OutputMixer()
+        mixer.add_source(FakeOutput([{'name': 'host', 'field': 'ip.src',
+                                      'dimension': True}], []))
+        self.assertRaises(NotImplementedError, mixer.add_source,
+                          FakeOutput([{'name': 'v', 'field': 'generic.bytes',
+                                       'dimension': False}], []))
+
+
+class WriteCsvTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_csv(self):
+        legend = [DictObject({'name': 'bytes'})]
+        stream = [Sample(sec(0), [[1]]),
+                  Sample(sec(1), [[2]], gap_start=1, gap_end=2),
+                  {'t': sec(2), 'vals': [[3]]}]
+        fname = os.path.join(self.dir, 'out.csv')
+        write_csv(fname, legend, stream)
+
+        with open(fname) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['Time', 'bytes'])
+        # gap samples are written like the others
+        self.assertEqual([r[1] for r in rows[1:]], ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+The output of a view applied to a trace file or to a trace clip only
+depends on the packets of the source and on the definition of the view,
+so it can be saved and reused instead of having the Shark appliance
+process the packets again.
+
+A ViewCache is passed to `Shark.create_view()` to enable this:
+
+    cache = ViewCache()
+    view = shark.create_view(tracefile, columns, filters, cache=cache)
+
+The first time a view is created, its output is saved on disk (in the
+flyscript directory) as it is retrieved.  Afterwards, the same view
+on the same source is served from the cache without contacting the
+appliance, as long as the same output data is requested.
+"""
+
+import json
+import hashlib
+import logging
+
+from rvbd.common._fs import FlyscriptCache
+from rvbd.common.connection import Connection
+from rvbd.shark._interfaces import Clip
+
+__all__ = ['ViewCache']
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCache(object):
+    """ On-disk cache of the output of views applied to trace files
+    and trace clips.
+
+    `max_size` is the size of the cache in bytes, when it is exceeded
+    the least recently used views are removed.
+
+    `directory` overrides the location of the cache, by default it
+    is in the flyscript directory of the user.
+    """
+    DEFAULT_SIZE = 256 * 2**20
+
+    def __init__(self, max_size=DEFAULT_SIZE, directory=None):
+        self._store = FlyscriptCache('Shark', 'views', max_size=max_size,
+                                     directory=directory)
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """ Remove all the views from the cache """
+        self._store.clear()
+
+    def _source_id(self, source):
+        """ Return a value identifying the packets of `source`, or None
+        if the source cannot be cached """
+        if source.is_live():
+            return None
+        if isinstance(source, Clip):
+            return source.source_path
+        if hasattr(source, 'checksum'):
+            # trace files can be replaced by uploading a new file
+            # with the same name, so they are identified by content
+            return [source.source_path, source.checksum()]
+        return None
+
+    def make_key(self, shark, source, template, timestamp_format):
+        """ Return the key of the view defined by `template` on `source`,
+        or None if it cannot be cached. """
+        source_id = self._source_id(source)
+        if source_id is None:
+            return None
+
+        definition = {
+            'host': shark.host,
+            'source': source_id,
+            'processors': template['processors'],
+            'parameters': template['parameters'],
+            'input_source': template['input_source'],
+            'timestamp_format': timestamp_format,
+            }
+        # the filters are objects, encode them the same way they
+        # are sent to the appliance
+        s = json.dumps(definition, sort_keys=True, cls=Connection.JsonEncoder)
+        return hashlib.sha1(s).hexdigest()
+
+    def lookup(self, key):
+        """ Return the cached results of the view `key`, or None """
+        if self._store.has(key):
+            try:
+                meta = self._store.get(key, 'view.pcl')
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                logger.debug('view cache hit for %s' % key)
+                return CachedResults(self, key, meta)
+
+        self.misses += 1
+        return None
+
+    def add(self, key, view):
+        """ Save the configuration of `view`, which must have been
+        applied and be complete, and return its CachedResults. """
+        # normalize the configuration so that no filter objects are pickled
+        config = json.loads(json.dumps(view.config, cls=Connection.JsonEncoder))
+        meta = {
+            'config': config,
+            'timeinfo': dict(view._get_timeinfo()),
+            'legends': dict((ouid, output._legend)
+                            for ouid, output in view._outputs.iteritems()),
+            }
+        self._store.put(key, 'view.pcl', meta)
+        return CachedResults(self, key, meta)
+
+
+class CachedResults(object):
+    """ The results of one view stored in a ViewCache """
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.config = meta['config']
+        self.timeinfo = meta['timeinfo']
+        self.legends = meta['legends']
+
+    def _name(self, ouid, params):
+        s = json.dumps([ouid, params], sort_keys=True, default=str)
+        return 'data-%s.pcl' % hashlib.sha1(s).hexdigest()
+
+    def get_samples(self, ouid, params):
+        """ Return the samples of output `ouid` for the request parameters
+        `params`, raises KeyError if they are not in the cache. """
+        return self.cache._store.get(self.key, self._name(ouid, params))
+
+    def put_samples(self, ouid, params, samples):
+        self.cache._store.put(self.key, self._name(ouid, params), samples)
@@ -0,0 +1,195 @@
+# Copyright (c) 2013 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the
+# MIT License set forth at:
+#   https://github.com/riverbed/flyscript/blob/master/LICENSE ("License").
+# This software is distributed "AS IS" as set forth in the License.
+
+
+"""
+A ViewPool lets identical views be shared instead of being created
+on the Shark appliance each time.  To enable it on a Shark object:
+
+    shark.view_pool = ViewPool(shark, idle_timeout=300)
+
+From then on `Shark.create_view()` returns the view already open for
+the same source, columns, filters and sampling time if there is one.
+Every call to `create_view()` must be matched by a call to `close()`
+on the view: a pooled view is kept open on the appliance while it is
+in use, and closed once it has not been used for `idle_timeout`
+seconds.  Idle views are closed by a background timer, and whenever
+the pool is used; `ViewPool.close()` should be called before the
+script exits to close the views that are still open.
+
+Reference counts are kept in this process only, so only the views
+created through the pool are shared: views opened on the appliance by
+other scripts could be closed by their owner while in use.  If a
+pooled view has been closed on the appliance in the meantime, a new
+view is created instead.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from rvbd.common.connection import Connection
+
+__all__ = ['ViewPool']
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolEntry(object):
+    def __init__(self, view):
+        self.view = view
+        self.refs = 1
+        self.idle_since = None
+
+
+class ViewPool(object):
+    """ Reference counted pool of the open views of a Shark appliance.
+
+    `idle_timeout` is the number of seconds a view is kept open after
+    it is released by its last user.
+
+    If `reap` is True, a timer closes the views that have been idle
+    for `idle_timeout` seconds, otherwise they are only closed when
+    the pool is used.
+    """
+    def __init__(self, shark, idle_timeout=300, reap=True):
+        self.shark = shark
+        self.idle_timeout = idle_timeout
+        self.reap = reap
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._clock = time.time
+        self._reaper = None
+
+    def fingerprint(self, config, time_mode='datetime'):
+        """ Return the fingerprint of the view configuration `config`,
+        which only depends on the packets the view processes, on the
+        data it computes and on the `time_mode` of its outputs. """
+        definition = {
+            'processors': config['processors'],
+            'parameters': config.get('parameters'),
+            'input_source': config['input_source'],
+            'time_mode': time_mode,
+            }
+        s = json.dumps(definition, sort_keys=True, cls=Connection.JsonEncoder)
+        return hashlib.sha1(s).hexdigest()
+
+    def hit_rate(self):
+        """ Return the fraction of acquire() calls that reused a view """
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return float(self.hits) / total
+
+    def acquire(self, fingerprint):
+        """ Return the open view with `fingerprint`, incrementing its
+        reference count, or None if there is no such view. """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.idle_since is None:
+                entry.refs += 1
+            else:
+                entry.refs = 1
+                entry.idle_since = None
+            self.hits += 1
+            return entry.view
+
+    def add(self, fingerprint, view):
+        """ Add `view`, just created with `fingerprint`, to the pool,
+        with a reference count of one. """
+        with self._lock:
+            self._entries[fingerprint] = _PoolEntry(view)
+            view._pool = self
+
+    def release(self, view):
+        """ Decrement the reference count of `view`, the view is closed
+        once it has been unused for `idle_timeout` seconds. """
+        with self._lock:
+            for entry in self._entries.itervalues():
+                if entry.view is view:
+                    break
+            else:
+                return
+
+            if entry.refs > 0:
+                entry.refs -= 1
+            if entry.refs == 0 and entry.idle_since is None:
+                entry.idle_since = self._clock()
+            self._expire()
+            self._schedule_reaper()
+
+    def discard(self, view):
+        """ Remove `view` from the pool without closing it, when it no
+        longer exists on the appliance. """
+        with self._lock:
+            for fingerprint, entry in self._entries.items():
+                if entry.view is view:
+                    del self._entries[fingerprint]
+                    view._pool = None
+
+    def expire(self):
+        """ Close the views that have been idle for longer than
+        `idle_timeout`. """
+        with self._lock:
+            self._expire()
+
+    def close(self):
+        """ Remove all the views from the pool, closing them whether
+        they are in use or not. """
+        with self._lock:
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+            entries = self._entries.values()
+            self._entries = {}
+            for entry in entries:
+                self._close(entry)
+
+    def _schedule_reaper(self):
+        if not self.reap or self._reaper is not None:
+            return
+        idle = [entry.idle_since for entry in self._entries.itervalues()
+                if entry.idle_since is not None]
+        if not idle:
+            return
+        delay = max(min(idle) + self.idle_timeout - self._clock(), 0)
+        self._reaper = threading.Timer(delay, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _reap(self):
+        with self._lock:
+            self._reaper = None
+            self._expire()
+            self._schedule_reaper()
+
+    def _close(self, entry):
+        entry.view._pool = None
+        try:
+            entry.view.close()
+        except Exception, e:
+            logger.warning('failed to close view %s: %s' % (entry.view.handle, e))
+
+    def _expire(self):
+        now = self._clock()
+        for fingerprint, entry in self._entries.items():
+            if (entry.idle_since is not None and
+                    now - entry.idle_since >= self.idle_timeout):
+                logger.debug('closing idle view %s' % entry.view.handle)
+                del self._entries[fingerprint]
+                self._close(entry)
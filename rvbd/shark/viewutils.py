@@ -14,12 +14,14 @@ This is a set of utility functions for working with views.
 from __future__ import absolute_import
 
 import csv
+import heapq
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 from collections import namedtuple
 
 from rvbd.common.utils import DictObject
-from rvbd.common.timeutils import tzutc, max_width
+from rvbd.common.timeutils import max_width
+from rvbd.shark._interfaces import Sample
 
 
 class OutputMixer(object):
@@ -30,41 +32,69 @@ class OutputMixer(object):
     outputs for bytes and packets, this class can be used to create
     a single output stream with bytes and packets columns.
 
-    Mixing is only supported on simple time-based views that do
-    not include any keys (e.g., bandwidth over time, etc.)
+    Outputs are merged in time order.  Samples whose times are within
+    `time_thresh` of the first sample of a bucket are combined into a
+    single sample.  `time_thresh` is a timedelta, converted to
+    nanoseconds when the outputs return times as integers
+    (`time_mode='ns'`).
+
+    If the outputs include keys (e.g., bytes and packets per host), all
+    of them must have the same key fields.  The mixed legend then starts
+    with the key columns, followed by the value columns of each output,
+    and within each time bucket rows from different outputs that have
+    the same keys are joined into a single row.  Values missing from
+    an output are None.
 
     See examples/shark/readview.py for typical usage.
     """
 
-    sourceobj = namedtuple('sourceobj', ['output', 'prefix', 'offset'])
+    sourceobj = namedtuple('sourceobj', ['output', 'prefix', 'offset',
+                                         'key_index', 'value_index'])
     
     def __init__(self):
         """
         """
         self._sources = []
         self._legend = []
+        self._keys = None
 
     def add_source(self, src, prefix=None):
         """ Add new source to mixer
 
-            `src` is time-based view object
+            `src` is a view output object.  Raises NotImplementedError
+            if its key fields differ from those of the sources already
+            added.
         """
         if prefix is None:
             prefix = 'o%d' % len(self._sources)
 
-        obj = self.sourceobj(output=src, prefix=prefix, offset=len(self._legend))
+        legend = [DictObject(field) for field in src.get_legend()]
+        key_index = [i for i, f in enumerate(legend) if f.get('dimension')]
+        value_index = [i for i, f in enumerate(legend) if not f.get('dimension')]
+        keys = [legend[i].get('field') for i in key_index]
+
+        if self._keys is None:
+            self._keys = keys
+            # key columns come first and are shared by all the sources
+            for i in key_index:
+                self._add_entry(legend[i], '')
+        elif keys != self._keys:
+            raise NotImplementedError('cannot mix outputs with different keys')
+
+        obj = self.sourceobj(output=src, prefix=prefix, offset=len(self._legend),
+                             key_index=key_index, value_index=value_index)
         self._sources.append(obj)
 
-        for field in src.get_legend():
-            if field.dimension:
-                raise NotImplementedError()
-            
-            # create a new record overriding some fields
-            entry = DictObject(field)
-            entry.id = 'x%d' % len(self._legend)
-            entry.name = prefix + entry.name
+        for i in value_index:
+            self._add_entry(legend[i], prefix)
+
+    def _add_entry(self, field, prefix):
+        # create a new record overriding some fields
+        entry = DictObject(field)
+        entry.id = 'x%d' % len(self._legend)
+        entry.name = prefix + entry.name
 
-            self._legend.append(entry)
+        self._legend.append(entry)
         
     def get_legend(self):
         """ Return the legend for each of the source objects
@@ -79,51 +109,100 @@ class OutputMixer(object):
             threshold = kwargs['time_thresh']
             del kwargs['time_thresh']
 
-        template = [None] * len(self._legend)
         iters = [s.output.get_iterdata(*args, **kwargs) for s in self._sources]
-        inputs = [next(i, None) for i in iters]
-
-        # XXX
-        infinity = datetime(year=9999, month=12, day=31, tzinfo=tzutc())
-
-        def get_sample_time(s):
-            if s is None:
-                return infinity
-            return s.t
-
-        def min_sample():
-            return min(inputs, key=get_sample_time)
-
-        ms = min_sample()
-        sample_time = ms.t
-        vals = list(template)
-        while ms is not None:
-            i = inputs.index(ms)
-            inputs[i] = next(iters[i], None)
-
-            delta = ms.t - sample_time
-            if delta >= threshold:
-                yield DictObject.create_from_dict(dict(t=sample_time,
-                                                       vals=[vals],
-                                                       processed_pkts=None,
-                                                       unprocessed_pkts=None))
-                
-                sample_time = ms.t
-                vals = list(template)
-
-            assert len(ms.vals) == 1
-
-            V = ms.vals[0]
-            off = self._sources[i].offset
-            for j in range(len(V)):
-                vals[off + j] = V[j]
-                
-            ms = min_sample()
-
-        yield DictObject.create_from_dict(dict(t=sample_time,
-                                               processed_pkts=None,
-                                               unprocessed_pkts=None,
-                                               vals=[vals]))
+
+        # the heap holds the next sample of each source, the source
+        # index breaks ties between samples with the same time
+        heap = []
+        for i, it in enumerate(iters):
+            sample = next(it, None)
+            if sample is not None:
+                heap.append((sample.t, i, sample))
+        heapq.heapify(heap)
+
+        if not heap:
+            return
+
+        if isinstance(threshold, timedelta) and isinstance(heap[0][0], (int, long)):
+            # the outputs return integer times in nanoseconds
+            threshold = ((threshold.days * 86400 + threshold.seconds) * 10**9 +
+                         threshold.microseconds * 1000)
+
+        if self._keys:
+            bucket = _KeyedBucket(len(self._legend), len(self._keys))
+        else:
+            bucket = _Bucket(len(self._legend))
+
+        sample_time = heap[0][0]
+        while heap:
+            t, i, sample = heap[0]
+            following = next(iters[i], None)
+            if following is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (following.t, i, following))
+
+            if t - sample_time >= threshold:
+                yield Sample(sample_time, bucket.pop())
+                sample_time = t
+
+            bucket.add(self._sources[i], sample.vals)
+
+        yield Sample(sample_time, bucket.pop())
+
+
+class _Bucket(object):
+    """ Combines the samples of outputs without keys into a single row """
+    def __init__(self, width):
+        self.template = [None] * width
+        self.vals = list(self.template)
+
+    def add(self, source, vals):
+        assert len(vals) == 1
+
+        V = vals[0]
+        off = source.offset
+        for j in source.value_index:
+            self.vals[off] = V[j]
+            off += 1
+
+    def pop(self):
+        vals = [self.vals]
+        self.vals = list(self.template)
+        return vals
+
+
+class _KeyedBucket(object):
+    """ Joins the rows of outputs with keys, matching rows by key """
+    def __init__(self, width, nkeys):
+        self.width = width
+        self.nkeys = nkeys
+        self.rows = {}
+        self.order = []
+
+    def add(self, source, vals):
+        rows = self.rows
+        key_index = source.key_index
+        value_index = source.value_index
+        for V in vals:
+            key = tuple([V[j] for j in key_index])
+            try:
+                row = rows[key]
+            except KeyError:
+                row = list(key) + [None] * (self.width - self.nkeys)
+                rows[key] = row
+                self.order.append(key)
+
+            off = source.offset
+            for j in value_index:
+                row[off] = V[j]
+                off += 1
+
+    def pop(self):
+        vals = [self.rows[key] for key in self.order]
+        self.rows = {}
+        self.order = []
+        return vals
 
 
 def print_data(legend, stream, timeformat='%Y/%m/%d %H:%M:%S.%f',
@@ -243,17 +322,23 @@ class Cursor(object):
         self.output = output
         self._last_end = 0
 
-    def get_data(self):
-
-        source = self.output.view.source
+    def get_iterdata(self, **kwargs):
+        """ Return an iterator over the `Sample` objects added to the
+        output since the previous call.  Keyword arguments are passed
+        to the `get_iterdata()` method of the output. """
         view = self.output.view
 
         ti = view.get_timeinfo()
         
         start = self._last_end
     
-        data = self.output.get_data(start=start, end=ti.end)
+        data = self.output.get_iterdata(start=start, end=ti.end, **kwargs)
         
         self._last_end = ti.end
         
         return data
+
+    def get_data(self, **kwargs):
+        """ Return the list of `Sample` objects added to the
+        output since the previous call. """
+        return list(self.get_iterdata(**kwargs))